@@ -8,6 +8,7 @@ import cv2
 from fastapi import FastAPI, Body, Header, Query
 from fastapi.responses import StreamingResponse, Response
 
+from .clients.http_client import http_stats
 from .runtimes.camera_runtime import CameraRuntime
 from .services.enroll_service import EnrollmentService
 from .runtimes.attendance_runtime import AttendanceRuntime
@@ -16,6 +17,9 @@ from .utils import draw_enroll_hud
 
 from .enroll2_auto.service import EnrollmentAutoService2
 from .enroll2_auto.hud import draw_enroll2_auto_hud
+from .vision.model_registry import get_registry
+from .vision.jpeg_cache import JpegCache
+from .vision.roi import Roi
 
 # add imports near top
 import json
@@ -35,21 +39,44 @@ app = FastAPI(title="AI Camera API", version="1.4")
 # --------------------------------------------------
 camera_rt = CameraRuntime()
 
+
+def _templates_saved(company_id: Optional[str]) -> None:
+    # new templates are matched right away instead of after GALLERY_REFRESH_S
+    rec_worker.refresh_gallery(company_id)
+
+
+# one JPEG encode per frame and stream variant, shared by all viewers
+jpeg_cache = JpegCache()
+
 enroller = EnrollmentService(
     camera_rt=camera_rt,
     use_gpu=False,
+    on_saved=_templates_saved,
 )
 
-attendance_rt = AttendanceRuntime(
+# also used by the worker processes of RECOGNITION_MODE=process
+ATTENDANCE_KWARGS = dict(
     use_gpu=False,
     similarity_threshold=0.35,
     cooldown_s=10,
     stable_hits_required=3,
 )
 
-rec_worker = RecognitionWorker(camera_rt=camera_rt, attendance_rt=attendance_rt)
+# process mode: recognition, FAS, journal and ERP outbox live in the worker
+# processes; this runtime keeps the camera config and syncs the gallery for them
+attendance_rt = AttendanceRuntime(
+    **ATTENDANCE_KWARGS,
+    role="pool_main" if os.getenv("RECOGNITION_MODE", "thread").strip().lower() == "process" else "standalone",
+)
 
-enroller2_auto = EnrollmentAutoService2(camera_rt=camera_rt)
+rec_worker = RecognitionWorker(
+    camera_rt=camera_rt, attendance_rt=attendance_rt, runtime_kwargs=ATTENDANCE_KWARGS
+)
+
+# Same use_gpu as the other recognizers so all three share one registry model
+enroller2_auto = EnrollmentAutoService2(
+    camera_rt=camera_rt, use_gpu=False, on_saved=_templates_saved
+)
 
 
 # --------------------------------------------------
@@ -92,30 +119,128 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/models")
+def models_status():
+    # shared model registry: load time, RAM growth and per-sub-model latency
+    return {"ok": True, "models": get_registry().stats()}
+
+
+@app.get("/http/stats")
+def http_client_stats():
+    # backend / ERP request latency per endpoint (this process; workers under
+    # /recognition/stats -> pool.processes[].http)
+    return {"ok": True, "endpoints": http_stats()}
+
+
+@app.post("/erp/retry-dead")
+def erp_retry_dead():
+    # put dead-lettered ERP punches (ERP_MAX_ATTEMPTS reached / rejected) back in the outbox
+    if not attendance_rt.erp_enabled:
+        return {"ok": False, "error": "ERP push disabled (ERP_BASE_URL not set)"}
+    return {"ok": True, **rec_worker.erp_retry_dead()}
+
+
+@app.get("/gallery/stats")
+def gallery_stats():
+    # per-company gallery snapshot: version (max updatedAt), size, age, sync timings
+    return {"ok": True, "companies": rec_worker.runtime_stats("gallery")}
+
+
+@app.get("/recognition/stats")
+def recognition_stats():
+    return {
+        "ok": True,
+        **rec_worker.stats(),
+        "embeddings": rec_worker.runtime_stats("embeddings"),
+        # per-camera detector input size / mode and detection latency
+        "detection": rec_worker.runtime_stats("detection"),
+    }
+
+
+@app.api_route("/recognition/det-size", methods=["GET", "POST"])
+def recognition_det_size(
+    camera_id: str,
+    mode: Optional[str] = None,
+    size: Optional[int] = None,
+    tiles: Optional[str] = None,
+):
+    # mode: fixed | auto | tiled; size: detector input (px); tiles: "3x2" (tiled mode)
+    try:
+        cfg = attendance_rt.det_policy.set(camera_id, mode=mode, size=size, tiles=tiles)
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": True, "camera_id": camera_id, **cfg}
+
+
+@app.get("/recognition/tracks")
+def recognition_tracks(camera_id: str):
+    # live tracks with the confidence of their aggregated (mean) embedding
+    return {"ok": True, "camera_id": camera_id, "tracks": rec_worker.track_stats(camera_id)}
+
+
 # --------------------------------------------------
 # Camera control
 # --------------------------------------------------
 @app.api_route("/camera/start", methods=["GET", "POST"])
-def start_camera(camera_id: str, rtsp_url: str, mode: str = "direct"):
+def start_camera(
+    camera_id: str,
+    rtsp_url: str,
+    mode: str = "direct",
+    main_url: Optional[str] = None,
+    roi: Optional[str] = None,
+):
     mode = (mode or "direct").strip().lower()
     if mode not in ("direct", "relay"):
         return {"ok": False, "error": "mode must be 'direct' or 'relay'"}
 
+    # roi: JSON list of normalized rects {x0,y0,x1,y1} / polygons {points}; empty = full frame
+    attendance_rt.set_roi(camera_id, Roi.parse(roi or ""))
+
     if mode == "relay":
         # NEW: register camera in runtime, but do NOT open RTSP
         started_now = camera_rt.start_relay(camera_id)
     else:
-        started_now = camera_rt.start(camera_id, rtsp_url)
+        # rtsp_url = substream (detection/display), main_url = optional high-res stream
+        started_now = camera_rt.start(camera_id, rtsp_url, main_url=main_url)
 
     return {
         "ok": True,
         "startedNow": bool(started_now),
         "camera_id": camera_id,
         "rtsp_url": rtsp_url,
+        "main_url": main_url,
         "mode": mode,
+        "roi": _roi_json(camera_id),
     }
 
 
+def _roi_json(camera_id: str):
+    r = attendance_rt.get_roi(camera_id)
+    return None if r is None else r.to_json()
+
+
+@app.get("/camera/roi")
+def get_camera_roi(camera_id: str):
+    return {"ok": True, "camera_id": camera_id, "roi": _roi_json(camera_id)}
+
+
+@app.post("/camera/roi")
+def set_camera_roi(camera_id: str, payload: dict = Body(default={})):
+    # live update from the camera config; {"roi": null} or [] clears it
+    raw = payload.get("roi")
+    parsed = Roi.parse(raw) if raw else None
+    if raw and parsed is None:
+        return {"ok": False, "error": "invalid roi"}
+    attendance_rt.set_roi(camera_id, parsed)
+    return {"ok": True, "camera_id": camera_id, "roi": _roi_json(camera_id)}
+
+
+
+@app.get("/camera/stats")
+def camera_stats():
+    # source + decode pipeline counters per camera (frames grabbed vs decoded)
+    return {"ok": True, "cameras": camera_rt.stats(), "jpeg_cache": jpeg_cache.stats()}
+
 
 @app.api_route("/camera/stop", methods=["GET", "POST"])
 def stop_camera(camera_id: str):
@@ -124,6 +249,7 @@ def stop_camera(camera_id: str):
 
     # Stop recognition worker (if any)
     rec_worker.stop(camera_id)
+    jpeg_cache.drop(camera_id)
 
     # If enrollment session is tied to this camera, stop it safely
     s = enroller.status()
@@ -214,17 +340,17 @@ async def ws_ingest(ws: WebSocket):
 # Snapshot
 # --------------------------------------------------
 @app.get("/camera/snapshot/{camera_id}")
-def camera_snapshot(camera_id: str):
-    frame = camera_rt.get_frame(camera_id)
+def camera_snapshot(camera_id: str, width: Optional[int] = None):
+    frame = camera_rt.get_latest(camera_id)
     if frame is None:
         return Response(content=b"No frame yet", status_code=503)
 
-    ok, jpg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
-    if not ok:
+    jpg = jpeg_cache.get(camera_id, "snapshot", frame, 85, width=width)
+    if jpg is None:
         return Response(content=b"Encode failed", status_code=500)
 
     return Response(
-        content=jpg.tobytes(),
+        content=jpg,
         media_type="image/jpeg",
         headers={
             "Cache-Control": "no-cache, no-store, must-revalidate",
@@ -238,7 +364,7 @@ def camera_snapshot(camera_id: str):
 # RAW MJPEG stream (no recognition)
 # Shows enrollment HUD when enrollment session is active for this camera
 # --------------------------------------------------
-def mjpeg_generator_raw(camera_id: str):
+def mjpeg_generator_raw(camera_id: str, width: Optional[int] = None):
     # Wait for frames
     for _ in range(60):
         if camera_rt.get_frame(camera_id) is not None:
@@ -248,13 +374,15 @@ def mjpeg_generator_raw(camera_id: str):
     # Cache enrollment status (avoid calling every frame)
     last_s_check = 0.0
     cached_s = None
+    last_seq = 0
 
     try:
         while True:
-            frame = camera_rt.get_frame(camera_id)
+            # one part per new frame (no re-sending the same picture)
+            frame = camera_rt.wait_for_frame(camera_id, after_seq=last_seq, timeout=1.0)
             if frame is None:
-                time.sleep(0.03)
                 continue
+            last_seq = frame.seq
 
             now = time.time()
             if (now - last_s_check) > 0.2:  # check 5 times/sec only
@@ -264,36 +392,47 @@ def mjpeg_generator_raw(camera_id: str):
                     cached_s = None
                 last_s_check = now
 
-            if (
+            hud_s = (
                 cached_s
+                if cached_s
                 and getattr(cached_s, "status", None) == "running"
                 and getattr(cached_s, "camera_id", None) == camera_id
-            ):
+                else None
+            )
+
+            def _hud(img, s=hud_s):
                 try:
-                    frame = draw_enroll_hud(frame, cached_s, enroller.cfg.angles)
+                    return draw_enroll_hud(img, s, enroller.cfg.angles)
                 except Exception:
-                    pass
-
-            ok, jpg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-            if not ok:
+                    return img
+
+            b = jpeg_cache.get(
+                camera_id,
+                "raw",
+                frame,
+                70,
+                width=width,
+                # the session repr covers everything the HUD shows
+                tag=None if hud_s is None else repr(hud_s),
+                render=None if hud_s is None else _hud,
+            )
+            if b is None:
                 continue
 
-            b = jpg.tobytes()
             yield (
                 b"--frame\r\n"
                 b"Content-Type: image/jpeg\r\n"
                 b"Content-Length: " + str(len(b)).encode() + b"\r\n\r\n" + b + b"\r\n"
             )
-            time.sleep(0.01)
 
     except GeneratorExit:
         return
 
 
 @app.get("/camera/stream/{camera_id}")
-def camera_stream(camera_id: str):
+def camera_stream(camera_id: str, width: Optional[int] = None):
     return StreamingResponse(
-        mjpeg_generator_raw(camera_id),
+        mjpeg_generator_raw(camera_id, width=width),
         media_type="multipart/x-mixed-replace; boundary=frame",
         headers={
             "Cache-Control": "no-cache, no-store, must-revalidate",
@@ -321,19 +460,25 @@ def mjpeg_generator_recognition(camera_id: str, camera_name: str, ai_fps: float)
             break
         time.sleep(0.05)
 
+    last_sent: Optional[bytes] = None
     try:
         while True:
             jpg_bytes = rec_worker.get_latest_jpeg(camera_id)
 
             if jpg_bytes is None:
-                raw = camera_rt.get_frame(camera_id)
+                # no overlay yet: same cached JPEG as the raw stream
+                raw = camera_rt.get_latest(camera_id)
                 if raw is None:
                     time.sleep(0.02)
                     continue
-                ok, jpg = cv2.imencode(".jpg", raw, [int(cv2.IMWRITE_JPEG_QUALITY), 65])
-                if not ok:
+                jpg_bytes = jpeg_cache.get(camera_id, "raw", raw, 70)
+                if jpg_bytes is None:
                     continue
-                jpg_bytes = jpg.tobytes()
+
+            if jpg_bytes is last_sent:
+                time.sleep(0.01)
+                continue
+            last_sent = jpg_bytes
 
             yield (
                 b"--frame\r\n"
@@ -391,12 +536,15 @@ def mjpeg_generator_enroll2_auto(camera_id: str):
             break
         time.sleep(0.05)
 
+    last_seq = 0
     try:
         while True:
-            frame = camera_rt.get_frame(camera_id)
+            frame = camera_rt.wait_for_frame(camera_id, after_seq=last_seq, timeout=1.0)
             if frame is None:
-                time.sleep(0.03)
                 continue
+            last_seq = frame.seq
+            tag = None
+            render = None
 
             # draw overlay if enroll2_auto session is running for this camera
             st = enroller2_auto.overlay_state()
@@ -423,19 +571,22 @@ def mjpeg_generator_enroll2_auto(camera_id: str):
                     "msg": str(st.get("message") or ""),
                     "roi_faces": str(st.get("roi_faces") or 0),
                 }
-                frame = draw_enroll2_auto_hud(frame, roi, primary, hud)
+                tag = (roi, primary, tuple(sorted(hud.items())))
 
-            ok, jpg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-            if not ok:
+                def _draw(img, roi=roi, primary=primary, hud=hud):
+                    return draw_enroll2_auto_hud(img, roi, primary, hud)
+
+                render = _draw
+
+            b = jpeg_cache.get(camera_id, "enroll2", frame, 70, tag=tag, render=render)
+            if b is None:
                 continue
-            b = jpg.tobytes()
 
             yield (
                 b"--frame\r\n"
                 b"Content-Type: image/jpeg\r\n"
                 b"Content-Length: " + str(len(b)).encode() + b"\r\n\r\n" + b + b"\r\n"
             )
-            time.sleep(0.01)
 
     except GeneratorExit:
         return
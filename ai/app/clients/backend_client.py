@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import os
 
+import numpy as np
 from dotenv import load_dotenv
 
 from .http_client import HttpClient
+from .template_codec import decode_templates_bin
 
 # Load ai/.env automatically
 load_dotenv()
@@ -19,12 +21,16 @@ class BackendClient:
     Example:
       BACKEND_BASE_URL=http://127.0.0.1:3001
       BACKEND_API_PREFIX=/api/v1
+
+    Instances are cheap: clients for different companies only differ in the
+    X-Company-Id header and share the keep-alive pools of HttpClient.
+    Attendance writes use the "hot" pool, gallery / bulk traffic "bulk".
     """
 
     def __init__(
         self,
         base_url: Optional[str] = None,
-        timeout_s: float = 10.0,
+        timeout_s: Optional[float] = None,
         company_id: Optional[str] = None,
     ):
         resolved = (
@@ -46,9 +52,15 @@ class BackendClient:
             prefix=api_prefix,
             timeout_s=timeout_s,
             default_headers=default_headers,
+            # express.json() inflates gzip bodies (template uploads, bulk attendance)
+            gzip_min_bytes=int(os.getenv("HTTP_GZIP_MIN_BYTES", "16384")),
         )
         self._company_id = company_id.strip() if company_id else None
 
+    @property
+    def company_id(self) -> Optional[str]:
+        return self._company_id
+
     def set_company_id(self, company_id: Optional[str]) -> None:
         cid = str(company_id or "").strip()
         if not cid:
@@ -58,7 +70,7 @@ class BackendClient:
 
     # ---- Health
     def health(self) -> Dict[str, Any]:
-        return self.http.get("/health")
+        return self.http.get("/health", pool="hot")
 
     # ---- Employees
     def upsert_employee(
@@ -73,8 +85,19 @@ class BackendClient:
         return self.http.get("/employees")
 
     # ---- Gallery templates
-    def list_templates(self) -> List[Dict[str, Any]]:
-        return self.http.get("/gallery/templates")
+    def list_templates(self, updated_since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """All templates, or only those with updatedAt >= updated_since (ISO) when given."""
+        params = {"updatedSince": updated_since} if updated_since else None
+        return self.http.get("/gallery/templates", params=params)
+
+    def list_templates_bin(
+        self, updated_since: Optional[str] = None, dtype: str = "f32"
+    ) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Same rows as list_templates() (without "embedding") + a (N, D) embedding matrix."""
+        params: Dict[str, Any] = {"dtype": dtype}
+        if updated_since:
+            params["updatedSince"] = updated_since
+        return decode_templates_bin(self.http.get_bytes("/gallery/templates.bin", params=params))
 
     def upsert_template(
         self,
@@ -91,6 +114,7 @@ class BackendClient:
                 "embedding": embedding,
                 "modelName": model_name,
             },
+            pool="bulk",
         )
 
     # ---- Attendance
@@ -113,6 +137,14 @@ class BackendClient:
             },
         )
 
+    def create_attendance_bulk(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        events: [{idempotencyKey, employeeId, timestamp, cameraId, confidence}]
+        -> {inserted, duplicates, rejected: [{idempotencyKey, error}]}
+        An event whose idempotencyKey is already stored counts as a duplicate.
+        """
+        return self.http.post("/attendance/bulk", {"events": events}, pool="bulk")
+
     # ✅ Enrollment v2 Auto uses SAME endpoint/table as v1
     def upsert_template_enroll2_auto(
         self,
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict
+from typing import Any, Dict, List, Sequence, Tuple
 
 from .http_client import HttpClient
 
@@ -41,3 +41,22 @@ class ERPClient:
             "inLocation": in_location,
         }
         return self.http.post("/Attendance/manual-attendance", payload)
+
+    def manual_attendance_batch(
+        self, items: Sequence[Tuple[str, str, str, str]], path: str
+    ) -> Any:
+        """
+        items: (attendance_date, emp_id, in_time, in_location) tuples, POSTed
+        as one JSON array of manual-attendance payloads to `path`
+        (ERP_BATCH_PATH, for ERP builds that accept batches).
+        """
+        payload: List[Dict[str, Any]] = [
+            {
+                "attendanceDate": attendance_date,
+                "empId": emp_id,
+                "inTime": in_time,
+                "inLocation": in_location,
+            }
+            for attendance_date, emp_id, in_time, in_location in items
+        ]
+        return self.http.post(path, payload)
@@ -1,7 +1,170 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+import bisect
+import gzip
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+class HttpError(RuntimeError):
+    """Non-2xx response (status_code) or transport failure (status_code None)."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# -------------------------
+# Connection pools
+# -------------------------
+# "hot": small latency-critical writes (attendance); "bulk": gallery reads,
+# template uploads, batched shipping. Separate pools so a 30 s gallery
+# download never holds the connection an attendance POST is waiting for.
+
+
+def _timeouts() -> Dict[str, Tuple[float, float]]:
+    connect = _env_float("HTTP_CONNECT_TIMEOUT_S", 3.0)
+    return {
+        "hot": (connect, _env_float("HTTP_HOT_TIMEOUT_S", 5.0)),
+        "bulk": (connect, _env_float("HTTP_BULK_TIMEOUT_S", 60.0)),
+    }
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose sockets send TCP keep-alive probes (idle NAT/firewall drops)."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        opts = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1), (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        idle = _env_int("HTTP_KEEPALIVE_IDLE_S", 30)
+        if idle > 0 and hasattr(socket, "TCP_KEEPIDLE"):
+            opts += [
+                (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle),
+                (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, idle // 3)),
+                (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3),
+            ]
+        kwargs["socket_options"] = opts
+        super().init_poolmanager(*args, **kwargs)
+
+
+_sessions: Dict[Tuple[str, str], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _session_for(base_url: str, pool: str) -> requests.Session:
+    """One pooled keep-alive Session per (scheme://host, pool), shared by all clients."""
+    parts = urlsplit(base_url)
+    key = (f"{parts.scheme}://{parts.netloc}", pool)
+    with _sessions_lock:
+        s = _sessions.get(key)
+        if s is None:
+            s = requests.Session()
+            adapter = _KeepAliveAdapter(
+                pool_connections=1,
+                pool_maxsize=max(1, _env_int("HTTP_POOL_MAXSIZE", 16)),
+                max_retries=0,  # retries are the caller's policy (journal, ERP outbox)
+            )
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            _sessions[key] = s
+        return s
+
+
+# -------------------------
+# Latency histograms
+# -------------------------
+_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKETS_MS) + 1)
+        self.n = 0
+        self.errors = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float, ok: bool) -> None:
+        self.counts[bisect.bisect_left(_BUCKETS_MS, ms)] += 1
+        self.n += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        if not ok:
+            self.errors += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile."""
+        if self.n == 0:
+            return None
+        target, seen = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return float(_BUCKETS_MS[i]) if i < len(_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.n,
+            "errors": self.errors,
+            "avg_ms": round(self.sum_ms / self.n, 1) if self.n else None,
+            "max_ms": round(self.max_ms, 1),
+            "p50_le_ms": self.quantile(0.50),
+            "p95_le_ms": self.quantile(0.95),
+            "p99_le_ms": self.quantile(0.99),
+            "buckets_ms": {
+                (f"le_{b}" if i < len(_BUCKETS_MS) else "inf"): c
+                for i, (b, c) in enumerate(zip(list(_BUCKETS_MS) + [None], self.counts))
+                if c
+            },
+        }
+
+
+_hist: Dict[str, _Histogram] = {}
+_hist_lock = threading.Lock()
+
+
+def _observe(endpoint: str, ms: float, ok: bool) -> None:
+    with _hist_lock:
+        h = _hist.get(endpoint)
+        if h is None:
+            h = _hist[endpoint] = _Histogram()
+        h.add(ms, ok)
+
+
+def http_stats() -> Dict[str, Any]:
+    """Per-endpoint request latency ("METHOD host/path [pool]") of this process."""
+    with _hist_lock:
+        return {k: h.snapshot() for k, h in sorted(_hist.items())}
+
+
+def _json(res: requests.Response) -> Any:
+    return res.json()
+
+
+def _content(res: requests.Response) -> bytes:
+    return res.content
 
 
 class HttpClient:
@@ -13,14 +176,20 @@ class HttpClient:
     - Optional prefix (e.g. /api/v1)
     - GET/POST helpers
     - Consistent error formatting
+    - Connection pools shared per host and call class (pool="hot" | "bulk"),
+      each with its own (connect, read) timeout budget; timeout_s overrides
+      the read timeout of both
+    - Request bodies of gzip_min_bytes or more are gzip-compressed (0 = off)
+    - Latency histogram per endpoint (http_stats())
     """
 
     def __init__(
         self,
         base_url: str,
         prefix: str = "",
-        timeout_s: float = 10.0,
+        timeout_s: Optional[float] = None,
         default_headers: Optional[Dict[str, str]] = None,
+        gzip_min_bytes: int = 0,
     ):
         self.base_url = (base_url or "").rstrip("/")
         self.prefix = (prefix or "").strip()
@@ -29,17 +198,18 @@ class HttpClient:
             self.prefix = "/" + self.prefix
         self.prefix = self.prefix.rstrip("/")
 
-        self.timeout_s = timeout_s
+        self.timeouts = _timeouts()
+        if timeout_s is not None:
+            self.timeouts = {k: (c, float(timeout_s)) for k, (c, _) in self.timeouts.items()}
+        self.gzip_min_bytes = int(gzip_min_bytes)
 
-        self.session = requests.Session()
-        self.session.headers.update(
-            {
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            }
-        )
+        # sessions are shared, so per-client headers travel with each request
+        self.headers: Dict[str, str] = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
         if default_headers:
-            self.session.headers.update(default_headers)
+            self.headers.update(default_headers)
 
     def url(self, path: str) -> str:
         p = (path or "").strip()
@@ -47,25 +217,52 @@ class HttpClient:
             p = "/" + p
         return f"{self.base_url}{self.prefix}{p}"
 
-    def get(self, path: str) -> Any:
-        url = self.url(path)
-        res: Optional[requests.Response] = None
-        try:
-            res = self.session.get(url, timeout=self.timeout_s)
-            res.raise_for_status()
-            return res.json()
-        except requests.RequestException as e:
-            self._raise(url, res, e)
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None, pool: str = "bulk") -> Any:
+        return self._request("GET", path, pool, _json, params=params)
+
+    def get_bytes(self, path: str, params: Optional[Dict[str, Any]] = None, pool: str = "bulk") -> bytes:
+        return self._request(
+            "GET", path, pool, _content, params=params, headers={"Accept": "application/octet-stream"}
+        )
 
-    def post(self, path: str, payload: Dict[str, Any]) -> Any:
+    def post(self, path: str, payload: Any, pool: str = "hot") -> Any:
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        headers: Dict[str, str] = {}
+        if self.gzip_min_bytes and len(body) >= self.gzip_min_bytes:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return self._request("POST", path, pool, _json, data=body, headers=headers)
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        pool: str,
+        parse: Callable[[requests.Response], Any],
+        headers: Optional[Dict[str, str]] = None,
+        **kw,
+    ) -> Any:
         url = self.url(path)
         res: Optional[requests.Response] = None
+        t0 = time.perf_counter()
+        ok = False
         try:
-            res = self.session.post(url, json=payload, timeout=self.timeout_s)
+            res = _session_for(self.base_url, pool).request(
+                method,
+                url,
+                headers={**self.headers, **(headers or {})},
+                timeout=self.timeouts.get(pool, self.timeouts["hot"]),
+                **kw,
+            )
             res.raise_for_status()
-            return res.json()
+            out = parse(res)
+            ok = True
+            return out
         except requests.RequestException as e:
             self._raise(url, res, e)
+        finally:
+            ms = (time.perf_counter() - t0) * 1000.0
+            _observe(f"{method} {urlsplit(url).netloc}{urlsplit(url).path} [{pool}]", ms, ok)
 
     def _raise(self, url: str, res: Optional[requests.Response], err: Exception):
         if res is not None:
@@ -73,10 +270,10 @@ class HttpClient:
                 detail: Any = res.json()
             except Exception:
                 detail = res.text
-            raise RuntimeError(f"[HttpClient] {res.status_code} {url} → {detail}") from err
-        raise RuntimeError(f"[HttpClient] Request failed → {url}") from err
+            raise HttpError(f"[HttpClient] {res.status_code} {url} → {detail}", res.status_code) from err
+        raise HttpError(f"[HttpClient] Request failed → {url}") from err
 
     def set_default_headers(self, headers: Optional[Dict[str, str]]) -> None:
         if not headers:
             return
-        self.session.headers.update(headers)
+        self.headers.update(headers)
@@ -0,0 +1,82 @@
+"""
+Binary template transport (backend GET /gallery/templates.bin).
+
+Layout (little-endian):
+  0  "FTPL" | u16 version | u8 dtype (0=f32, 1=f16) | u8 reserved
+  8  u32 dim | u32 count | u32 header_len
+  20 UTF-8 JSON header (column lists: ids, employeeIds, employeeNames,
+     angles, modelNames, updatedAt), zero-padded to a 4-byte boundary
+  .. count x dim matrix, row-major
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+MAGIC = b"FTPL"
+VERSION = 1
+_FIXED = struct.Struct("<4sHBBIII")
+_DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f2")}
+
+
+def decode_templates_bin(buf: bytes) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    Returns (rows, matrix). rows carry the same keys as the JSON endpoint minus
+    "embedding"; matrix is (count, dim) and, for float32 payloads, a read-only
+    view into buf (no copy).
+    """
+    if len(buf) < _FIXED.size:
+        raise ValueError("template blob too short")
+    magic, version, dtype_code, _, dim, count, header_len = _FIXED.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError(f"bad template blob magic {magic!r}")
+    if version != VERSION:
+        raise ValueError(f"unsupported template blob version {version}")
+    dtype = _DTYPES.get(dtype_code)
+    if dtype is None:
+        raise ValueError(f"unsupported template dtype {dtype_code}")
+
+    header_end = _FIXED.size + header_len
+    header = json.loads(bytes(buf[_FIXED.size:header_end]).decode("utf-8"))
+    offset = header_end + (-header_end % 4)
+
+    matrix = np.frombuffer(buf, dtype=dtype, count=count * dim, offset=offset)
+    matrix = matrix.reshape(count, dim)
+
+    cols = {
+        "id": header.get("ids") or [],
+        "employeeId": header.get("employeeIds") or [],
+        "employeeName": header.get("employeeNames") or [],
+        "angle": header.get("angles") or [],
+        "modelName": header.get("modelNames") or [],
+        "updatedAt": header.get("updatedAt") or [],
+    }
+    rows = [{k: (v[i] if i < len(v) else None) for k, v in cols.items()} for i in range(count)]
+    return rows, matrix
+
+
+def encode_templates_bin(
+    rows: Sequence[Dict[str, Any]], matrix: np.ndarray, dtype: str = "f32"
+) -> bytes:
+    """Python mirror of the backend encoder (benchmarks, fixtures)."""
+    half = dtype == "f16"
+    matrix = np.asarray(matrix, dtype="<f2" if half else "<f4")
+    count, dim = (int(matrix.shape[0]), int(matrix.shape[1])) if matrix.ndim == 2 else (0, 0)
+    header = json.dumps(
+        {
+            "ids": [r.get("id") for r in rows],
+            "employeeIds": [r.get("employeeId") for r in rows],
+            "employeeNames": [r.get("employeeName") for r in rows],
+            "angles": [r.get("angle") for r in rows],
+            "modelNames": [r.get("modelName") for r in rows],
+            "updatedAt": [r.get("updatedAt") for r in rows],
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    fixed = _FIXED.pack(MAGIC, VERSION, 1 if half else 0, 0, dim, count, len(header))
+    pad = b"\0" * (-(len(fixed) + len(header)) % 4)
+    return fixed + header + pad + matrix.tobytes()
@@ -2,12 +2,13 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
-from typing import List, Tuple, Optional
+from typing import List, Sequence, Tuple, Optional
 
 import numpy as np
 from insightface.app import FaceAnalysis
 
 from ..utils import l2_normalize
+from ..vision.recognizer import DEFAULT_MODULES, _pick_modules, shared_face_analysis
 
 
 def _env_bool(name: str, default: bool) -> bool:
@@ -168,6 +169,7 @@ class FaceRecognizerAuto:
         min_face_size: int = 40,
         det_size: tuple[int, int] = (640, 640),
         min_det_score: float = 0.25,  # lower than recognition pipeline for enrollment
+        allowed_modules: Optional[Sequence[str]] = DEFAULT_MODULES,
     ):
         use_gpu = _env_bool("USE_GPU", use_gpu)
 
@@ -178,16 +180,26 @@ class FaceRecognizerAuto:
         self.min_face_size = int(min_face_size)
         self.min_det_score = _clamp(_env_float("MIN_FACE_DET_SCORE", min_det_score), 0.0, 1.0)
 
-        providers = _pick_providers(use_gpu)
-        ctx_id = 0 if use_gpu else -1
-
-        self.app = FaceAnalysis(name=model_name, providers=providers)
-        self.app.prepare(ctx_id=ctx_id, det_size=det_size)
-
-        print(
-            f"[FaceRecognizerAuto] USE_GPU={int(use_gpu)} ORT_PROVIDER={_env_str('ORT_PROVIDER','auto')} "
-            f"providers={providers} ctx_id={ctx_id} det_size={det_size} min_det_score={self.min_det_score}"
-        )
+        self.model_name = model_name
+        self.use_gpu = use_gpu
+        self.det_size = det_size
+        # detector 5-pt kps are enough for pose; 106/68-pt landmarks only if requested
+        self.modules = _pick_modules(allowed_modules)
+
+        print(f"[FaceRecognizerAuto] min_det_score={self.min_det_score}")
+
+        # Same registry entry as FaceRecognizer when pack/providers/det_size/modules match
+        self._app: Optional[FaceAnalysis] = None
+        if not _env_bool("AI_LAZY_MODELS", True):
+            _ = self.app
+
+    @property
+    def app(self) -> FaceAnalysis:
+        if self._app is None:
+            self._app = shared_face_analysis(
+                "FaceRecognizerAuto", self.model_name, self.use_gpu, self.det_size, self.modules
+            )
+        return self._app
 
     def detect_and_embed(self, frame_bgr: np.ndarray) -> List[FaceDet]:
         """
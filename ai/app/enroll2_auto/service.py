@@ -4,7 +4,7 @@ from __future__ import annotations
 import time
 import threading
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 import cv2
@@ -22,15 +22,13 @@ from .utils_auto import (
 )
 
 from .config import Enroll2AutoConfig
+from ..vision.roi import Roi, detect_in_roi
 
 
-def _roi_rect(h: int, w: int, cfg: Enroll2AutoConfig) -> Tuple[int, int, int, int]:
-    return (
-        int(cfg.roi_x0 * w),
-        int(cfg.roi_y0 * h),
-        int(cfg.roi_x1 * w),
-        int(cfg.roi_y1 * h),
-    )
+def _roi(cfg: Enroll2AutoConfig) -> Roi:
+    # pad the crop by half the largest accepted face so faces on the ROI border stay whole
+    pad = 0.5 * cfg.max_face_w_frac / max(1e-3, cfg.roi_x1 - cfg.roi_x0)
+    return Roi.rect(cfg.roi_x0, cfg.roi_y0, cfg.roi_x1, cfg.roi_y1, pad=pad)
 
 
 def _instruction_text(step: str) -> str:
@@ -123,12 +121,16 @@ class EnrollmentAutoService2:
         camera_rt: CameraRuntime,
         model_name: str = "buffalo_l",
         min_face_size: int = 40,
+        use_gpu: bool = True,
+        on_saved: Optional[Callable[[Optional[str]], None]] = None,
     ):
         self.camera_rt = camera_rt
         self.cfg = Enroll2AutoConfig()
+        # called with the company id after templates were saved (gallery refresh)
+        self.on_saved = on_saved
 
         self.rec = FaceRecognizer(
-            model_name=model_name, use_gpu=True, min_face_size=min_face_size
+            model_name=model_name, use_gpu=use_gpu, min_face_size=min_face_size
         )
 
         self.client = BackendClient()
@@ -500,24 +502,17 @@ class EnrollmentAutoService2:
             time.sleep(period)
     def _select_primary(self, frame_bgr):
         h, w = frame_bgr.shape[:2]
-        roi = _roi_rect(h, w, self.cfg)
         min_w = self.cfg.min_face_w_frac * w
         max_w = self.cfg.max_face_w_frac * w
 
-        dets = self.rec.detect_and_embed(frame_bgr)
+        # crop -> detect -> remap, faces centered inside the ROI (shared with attendance)
+        dets = detect_in_roi(self.rec.detect_and_embed, frame_bgr, _roi(self.cfg))
         if not dets:
             return None, 0, False
 
-        x0, y0, x1, y1 = roi
         in_roi = []
         for d in dets:
-            bx0, by0, bx1, by1 = d.bbox.astype(int).tolist()
-            cx = (bx0 + bx1) * 0.5
-            cy = (by0 + by1) * 0.5
-            bw = (bx1 - bx0)
-
-            if not (x0 <= cx <= x1 and y0 <= cy <= y1):
-                continue
+            bw = float(d.bbox[2] - d.bbox[0])
             if bw < min_w or bw > max_w:
                 continue
             in_roi.append(d)
@@ -555,6 +550,8 @@ class EnrollmentAutoService2:
                     self._session.status = "saved"
                     self._session.last_message = "Enrollment saved ✅"
                     self._session.last_update_at = now_iso()
+            if self.on_saved is not None:
+                self.on_saved(self.client.company_id)
         except Exception as e:
             with self._lock:
                 if self._session:
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass
-from typing import Optional, Sequence, Tuple
+from typing import List, Optional, Sequence, Tuple
 import numpy as np
 import cv2
 
@@ -10,8 +11,14 @@ try:
 except Exception:
     ort = None
 
+from ..vision.model_registry import get_registry, ort_session_options
+
 BBox = Tuple[int, int, int, int]
 
+# ImageNet normalization folded into uint8 space: (x / 255 - mean) / std == (x - 255 mean) / (255 std)
+_MEAN_255 = (255.0 * np.array([0.485, 0.456, 0.406], dtype=np.float32)).reshape(1, 3, 1, 1)
+_INV_STD_255 = (1.0 / (255.0 * np.array([0.229, 0.224, 0.225], dtype=np.float32))).reshape(1, 3, 1, 1)
+
 
 @dataclass
 class FASResult:
@@ -26,6 +33,10 @@ class AntiSpoofONNX:
       - Input:  [1, 3, 112, 112] float
       - Output: [1, 2] logits => [spoof_logit, live_logit]
       - We apply softmax and use probs[1] as LIVE probability.
+
+    predict_batch() scores many crops in one session run (FAS_BATCH_MAX rows
+    per run) from a preallocated NCHW buffer. Models exported with a fixed
+    batch of 1 still work: the buffer is then run one row at a time.
     """
 
     def __init__(
@@ -43,8 +54,38 @@ class AntiSpoofONNX:
         self.input_size = (int(input_size[0]), int(input_size[1]))  # (W,H) for cv2.resize
 
         self.providers = list(providers) if providers else ["CPUExecutionProvider"]
-        self.sess = ort.InferenceSession(self.onnx_path, providers=self.providers)
-        self.in_name = self.sess.get_inputs()[0].name
+
+        # Session comes from the shared registry, loaded on first predict()
+        # (AI_LAZY_MODELS=0 loads it right away)
+        self._sess = None
+        self._in_name: Optional[str] = None
+        self._fixed_batch: Optional[int] = None  # static batch dim of the model input, if any
+        self.batch_max = max(1, int(os.getenv("FAS_BATCH_MAX", "32")))
+        self._buf = np.empty((0, 3, self.input_size[1], self.input_size[0]), dtype=np.float32)
+        if str(os.getenv("AI_LAZY_MODELS", "1")).strip().lower() not in ("1", "true", "yes", "on"):
+            _ = self.sess
+
+    @property
+    def sess(self):
+        if self._sess is None:
+            key = f"onnx:{os.path.abspath(self.onnx_path)}:{'+'.join(self.providers)}"
+            self._sess = get_registry().get_or_load(
+                key,
+                lambda: ort.InferenceSession(
+                    self.onnx_path, sess_options=ort_session_options(), providers=self.providers
+                ),
+            )
+            inp = self._sess.get_inputs()[0]
+            self._in_name = inp.name
+            dim0 = inp.shape[0] if inp.shape else None
+            self._fixed_batch = dim0 if isinstance(dim0, int) and dim0 > 0 else None
+        return self._sess
+
+    @property
+    def in_name(self) -> str:
+        if self._in_name is None:
+            _ = self.sess
+        return str(self._in_name)
 
     @staticmethod
     def _clip_bbox(b: BBox, w: int, h: int) -> BBox:
@@ -79,6 +120,28 @@ class AntiSpoofONNX:
         return img
 
 
+    def _batch_buffer(self, n: int) -> np.ndarray:
+        if self._buf.shape[0] < n:
+            self._buf = np.empty((n, 3, self.input_size[1], self.input_size[0]), dtype=np.float32)
+        return self._buf[:n]
+
+    def _run(self, blob: np.ndarray) -> np.ndarray:
+        """(n, k) logits for an (n, 3, H, W) blob."""
+        sess = self.sess
+        if self._fixed_batch == 1 and blob.shape[0] > 1:
+            outs = [sess.run(None, {self.in_name: blob[i : i + 1]})[0] for i in range(blob.shape[0])]
+            return np.concatenate([np.asarray(o).reshape(1, -1) for o in outs], axis=0)
+        try:
+            out = sess.run(None, {self.in_name: blob})
+        except Exception:
+            if blob.shape[0] == 1:
+                raise
+            # dynamic batch declared but the graph only runs batch 1 (reshape nodes)
+            print("[FAS] batched run failed, falling back to batch 1")
+            self._fixed_batch = 1
+            return self._run(blob)
+        return np.asarray(out[0]).reshape(blob.shape[0], -1)
+
     @staticmethod
     def _softmax(x: np.ndarray) -> np.ndarray:
         x = x.astype(np.float32)
@@ -96,16 +159,41 @@ class AntiSpoofONNX:
 
 
     def predict(self, frame_bgr: np.ndarray, bbox: BBox) -> FASResult:
-        h, w = frame_bgr.shape[:2]
-        x1, y1, x2, y2 = self._clip_bbox(bbox, w, h)
+        return self.predict_batch([(frame_bgr, bbox)])[0]
 
-        crop = frame_bgr[y1:y2, x1:x2]
-        if crop.size == 0:
-            return FASResult(False, 0.0, "empty_crop")
-
-        inp = self._preprocess(crop)
-        out = self.sess.run(None, {self.in_name: inp})
-        score = float(self._parse_output_score(out))
-
-        ok = score >= self.threshold
-        return FASResult(ok, score, "live" if ok else "spoof")
+    def predict_batch(
+        self,
+        items: Sequence[Tuple[np.ndarray, BBox]],
+        thresholds: Optional[Sequence[float]] = None,
+    ) -> List[FASResult]:
+        """
+        Score (frame, bbox) pairs, FAS_BATCH_MAX crops per session run.
+        Same preprocessing as _preprocess(), written straight into the NCHW buffer.
+        """
+        results: List[Optional[FASResult]] = [None] * len(items)
+        crops: List[Tuple[int, np.ndarray]] = []
+        for i, (frame_bgr, bbox) in enumerate(items):
+            h, w = frame_bgr.shape[:2]
+            x1, y1, x2, y2 = self._clip_bbox(bbox, w, h)
+            crop = frame_bgr[y1:y2, x1:x2]
+            if crop.size == 0:
+                results[i] = FASResult(False, 0.0, "empty_crop")
+            else:
+                crops.append((i, crop))
+
+        for start in range(0, len(crops), self.batch_max):
+            chunk = crops[start : start + self.batch_max]
+            blob = self._batch_buffer(len(chunk))
+            for row, (_, crop) in enumerate(chunk):
+                img = cv2.resize(crop, self.input_size, interpolation=cv2.INTER_LINEAR)
+                blob[row] = img.transpose(2, 0, 1)[::-1]  # HWC BGR -> CHW RGB
+            blob -= _MEAN_255
+            blob *= _INV_STD_255
+
+            logits = self._run(blob)
+            for row, (i, _) in enumerate(chunk):
+                score = float(self._parse_output_score([logits[row]]))
+                thr = self.threshold if thresholds is None else float(thresholds[i])
+                ok = score >= thr
+                results[i] = FASResult(ok, score, "live" if ok else "spoof")
+        return results  # type: ignore[return-value]
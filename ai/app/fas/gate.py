@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Sequence, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import time
 import numpy as np
 
@@ -30,6 +30,18 @@ class GateConfig:
     cooldown_sec: float = 2.0
 
 
+@dataclass
+class FASCheck:
+    """One candidate face for check_batch()."""
+
+    camera_id: str
+    person_key: str
+    frame_bgr: np.ndarray
+    bbox: BBox
+    kps: Optional[np.ndarray]
+    frame_shape: Optional[Tuple[int, int]] = None  # full frame (h, w) when frame_bgr is a face ROI
+
+
 class FASGate:
     def __init__(
         self,
@@ -104,46 +116,79 @@ class FASGate:
         bbox: BBox,
         kps: Optional[np.ndarray],
     ) -> Tuple[bool, Dict[str, Any]]:
-        cfg = self.get_camera_cfg(camera_id)
-
-        if not cfg.enabled:
-            return True, {"fas": "disabled"}
-
+        return self.check_batch([FASCheck(camera_id, person_key, frame_bgr, bbox, kps)])[0]
+
+    def check_batch(self, checks: Sequence[FASCheck]) -> List[Tuple[bool, Dict[str, Any]]]:
+        """
+        Same decision as check() for every candidate of a frame (or a tick):
+        cooldown / heuristics per face, then one batched model run for all
+        faces still in, then the yaw-motion check in order.
+        """
         now = time.time()
-        key = f"{camera_id}:{person_key}"
-
-        last = self._last_pass.get(key, 0.0)
-        if (now - last) < cfg.cooldown_sec:
-            return False, {"fas": "cooldown"}
-
-        if cfg.use_heuristics:
-            # ✅ NEW strict rule: block "face too close" (phone near camera)
-            cr = close_face_block(
-                frame_bgr,
-                bbox,
-                max_face_area_ratio=cfg.close_face_max_area_ratio,
-                max_face_width_ratio=cfg.close_face_max_width_ratio,
+        results: List[Optional[Tuple[bool, Dict[str, Any]]]] = [None] * len(checks)
+        pending: List[int] = []
+
+        for i, c in enumerate(checks):
+            cfg = self.get_camera_cfg(c.camera_id)
+
+            if not cfg.enabled:
+                results[i] = (True, {"fas": "disabled"})
+                continue
+
+            key = f"{c.camera_id}:{c.person_key}"
+            last = self._last_pass.get(key, 0.0)
+            if (now - last) < cfg.cooldown_sec:
+                results[i] = (False, {"fas": "cooldown"})
+                continue
+
+            if cfg.use_heuristics:
+                # ✅ NEW strict rule: block "face too close" (phone near camera)
+                cr = close_face_block(
+                    c.frame_bgr,
+                    c.bbox,
+                    max_face_area_ratio=cfg.close_face_max_area_ratio,
+                    max_face_width_ratio=cfg.close_face_max_width_ratio,
+                    frame_shape=c.frame_shape,
+                )
+                if not cr.ok:
+                    results[i] = (False, {"fas": "heuristic_block", "h_score": cr.score, "h_reason": cr.reason})
+                    continue
+
+                # Existing sharpness rule
+                hr = sharpness_heuristic(c.frame_bgr, c.bbox, max_var=cfg.heuristics_max_var)
+                if not hr.ok:
+                    results[i] = (False, {"fas": "heuristic_block", "h_score": hr.score, "h_reason": hr.reason})
+                    continue
+
+            pending.append(i)
+
+        # model: one session run for every face that got this far
+        scored = []
+        if pending:
+            scored = self.model.predict_batch(
+                [(checks[i].frame_bgr, checks[i].bbox) for i in pending],
+                thresholds=[self.get_camera_cfg(checks[i].camera_id).fas_threshold for i in pending],
             )
-            if not cr.ok:
-                return False, {"fas": "heuristic_block", "h_score": cr.score, "h_reason": cr.reason}
-
-            # Existing sharpness rule
-            hr = sharpness_heuristic(frame_bgr, bbox, max_var=cfg.heuristics_max_var)
-            if not hr.ok:
-                return False, {"fas": "heuristic_block", "h_score": hr.score, "h_reason": hr.reason}
-
-        # model
-        self.model.threshold = cfg.fas_threshold
-        r = self.model.predict(frame_bgr, bbox)
-        if not r.is_live:
-            return False, {"fas": "model_spoof", "score": r.score}
-
-        # yaw motion
-        self.motion.window_sec = cfg.motion_window_sec
-        self.motion.min_yaw_range = cfg.min_yaw_range
-        m_ok, m_score = self.motion.update_and_check(key, kps)
-        if not m_ok:
-            return False, {"fas": "need_pose_change", "score": r.score, "yaw_range": m_score}
-
-        self._last_pass[key] = now
-        return True, {"fas": "ok", "score": r.score, "yaw_range": m_score}
+
+        for i, r in zip(pending, scored):
+            c = checks[i]
+            cfg = self.get_camera_cfg(c.camera_id)
+            if not r.is_live:
+                results[i] = (False, {"fas": "model_spoof", "score": r.score})
+                continue
+
+            # yaw motion
+            key = f"{c.camera_id}:{c.person_key}"
+            self.motion.window_sec = cfg.motion_window_sec
+            self.motion.min_yaw_range = cfg.min_yaw_range
+            m_ok, m_score = self.motion.update_and_check(key, c.kps)
+            if not m_ok:
+                results[i] = (False, {"fas": "need_pose_change", "score": r.score, "yaw_range": m_score})
+                continue
+            if (now - self._last_pass.get(key, 0.0)) < cfg.cooldown_sec:
+                results[i] = (False, {"fas": "cooldown"})  # same person twice in one batch
+                continue
+
+            self._last_pass[key] = now
+            results[i] = (True, {"fas": "ok", "score": r.score, "yaw_range": m_score})
+        return results  # type: ignore[return-value]
@@ -45,6 +45,7 @@ def close_face_block(
     *,
     max_face_area_ratio: float = 0.18,
     max_face_width_ratio: float = 0.60,
+    frame_shape: Optional[Tuple[int, int]] = None,
 ) -> HeuristicResult:
     """
     STRONG anti-phone-near-camera filter.
@@ -54,12 +55,13 @@ def close_face_block(
 
     - max_face_area_ratio: (bbox_area / frame_area)
     - max_face_width_ratio: (bbox_width / frame_width)
+    - frame_shape: (h, w) of the full frame when frame_bgr is only a face ROI
 
     Tune carefully:
       - If your real faces are close to camera normally, increase ratios slightly.
     """
     x1, y1, x2, y2 = map(int, bbox)
-    h, w = frame_bgr.shape[:2]
+    h, w = (frame_shape or frame_bgr.shape)[:2]
 
     bw = max(1, x2 - x1)
     bh = max(1, y2 - y1)
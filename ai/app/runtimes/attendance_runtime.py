@@ -10,15 +10,23 @@ import cv2
 import numpy as np
 
 from ..clients.backend_client import BackendClient
-from ..vision.recognizer import FaceRecognizer, match_gallery
+from ..vision.det_size import DetSizePolicy
+from ..vision.dual_stream import MainView, embed_dual
+from ..vision.motion import MotionGate
+from ..vision.recognizer import FaceDet, FaceRecognizer
+from ..vision.roi import Roi, keep_in_roi, remap_dets, roi_views
 from ..vision.tracker import SimpleTracker
-from ..utils import now_iso, l2_normalize, quality_score
+from ..utils import now_iso, quality_score
 
-from ..fas.gate import FASGate, GateConfig
+from ..fas.gate import FASCheck, FASGate, GateConfig
+from .decision_stage import DecisionStage
 
 from datetime import datetime
 from ..clients.erp_client import ERPClient, ERPClientConfig
+from ..services.attendance_journal import AttendanceJournal
 from ..services.erp_push_queue import ERPPushQueue, ERPPushJob
+from ..services.gallery_sync import GallerySync
+
 
 
 LABEL_FONT = (
@@ -48,6 +56,53 @@ class CameraScanState:
         default_factory=dict
     )  # employee_id(str) -> last_mark_ts
     frame_idx: int = 0
+    last_det_frame: int = 0  # frame_idx of the last frame that ran detection
+    coasted: int = 0  # frames drawn from track prediction only (DETECT_EVERY_N)
+
+    # detect-only fast path counters
+    embeds_computed: int = 0
+    embeds_skipped: int = 0
+
+
+@dataclass
+class AttendanceCandidate:
+    """A known, stable face the decision stage should consider marking."""
+
+    fas: FASCheck  # anti-spoofing input (substream or main-stream ROI)
+    state: CameraScanState
+    track: Any
+    company_id: str
+    camera_name: str
+    employee_id: str
+    name: str
+    frame: np.ndarray  # substream frame (or its face ROI), for the quality score
+    bbox: Tuple[int, int, int, int]
+    kps_none: bool
+    frame_shape: Optional[Tuple[int, int]] = None  # full substream (h, w) when frame is a ROI
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.fas.camera_id, self.employee_id
+
+
+def _face_crop(
+    img: np.ndarray,
+    bbox: Tuple[int, int, int, int],
+    kps: Optional[np.ndarray],
+    pad_frac: float = 0.2,
+) -> Tuple[np.ndarray, Tuple[int, int, int, int], Optional[np.ndarray], Tuple[int, int]]:
+    """
+    Own copy of the padded face ROI of a transient frame, with bbox / kps
+    shifted into it. -> (roi, bbox, kps, (h, w) of the full frame)
+    """
+    h, w = img.shape[:2]
+    x1, y1, x2, y2 = (int(v) for v in bbox)
+    pad = int(max(x2 - x1, y2 - y1) * pad_frac) + 4
+    ox, oy = max(0, x1 - pad), max(0, y1 - pad)
+    roi = img[oy : min(h, y2 + pad), ox : min(w, x2 + pad)].copy()
+    if kps is not None:
+        kps = np.asarray(kps, dtype=np.float32) - np.array([ox, oy], dtype=np.float32)
+    return roi, (x1 - ox, y1 - oy, x2 - ox, y2 - oy), kps, (h, w)
 
 
 def _put_text_white(
@@ -267,7 +322,14 @@ class AttendanceRuntime:
         gallery_refresh_s: float = 5.0,
         cooldown_s: int = 10,
         stable_hits_required: int = 3,
+        role: str = "standalone",
     ):
+        # standalone: the whole pipeline in this process (batch / thread mode)
+        # pool_main: RECOGNITION_MODE=process main process; keeps the camera
+        #   config and owns the gallery sync, no journal / ERP outbox / FAS
+        # pool_worker: recognition worker; gallery read from pool_main's disk snapshots
+        self.role = role
+        pipeline = role != "pool_main"
         self._default_company_id = (
             os.getenv("BACKEND_COMPANY_ID", "").strip()
             or os.getenv("COMPANY_ID", "").strip()
@@ -283,14 +345,38 @@ class AttendanceRuntime:
         self.strict_similarity = float(os.getenv("STRICT_SIM_THRESHOLD", "0.5"))
         self.min_att_quality = float(os.getenv("MIN_ATT_QUALITY", "18.0"))
         self.gallery_refresh_s = float(gallery_refresh_s)
+        # Stable tracks above strict_similarity skip embedding; re-verify every N seconds
+        self.embed_reverify_s = float(os.getenv("EMBED_REVERIFY_S", "2.0"))
+        # identity per track from the quality-weighted mean of its embeddings
+        self.track_min_embeds = max(1, int(os.getenv("TRACK_MIN_EMBEDS", "2")))
+        self.track_emb_reset_sim = float(os.getenv("TRACK_EMB_RESET_SIM", "0.3"))
+        # detect on every Nth recognition frame; tracks are predicted in between
+        self.detect_every_n = max(1, int(os.getenv("DETECT_EVERY_N", "1")))
         self.cooldown_s = int(cooldown_s)
         self.stable_hits_required = int(stable_hits_required)
+        # frames live in a reused buffer (process pool shared memory): candidates
+        # handed to the decision stage get their own copy of the face ROI
+        self.frames_transient = False
 
         self._company_by_camera: Dict[str, str] = {}
 
-        self._gallery_last_load_by_company: Dict[str, float] = {}
-        self._gallery_matrix_by_company: Dict[str, np.ndarray] = {}
-        self._gallery_meta_by_company: Dict[str, List[Tuple[int, str, str]]] = {}
+        # Background delta sync; the hot path only reads the current snapshot
+        self.gallery_sync = GallerySync(
+            client_for_company=self._client_for_company,
+            emp_key=self._emp_str_to_int,
+            refresh_s=self.gallery_refresh_s,
+            follow=role == "pool_worker",
+        )
+
+        # Skips detection on static scenes (MOTION_GATE)
+        self.motion_gate = MotionGate()
+        # Per-camera detector input size (DET_SIZE_MODE fixed|auto|tiled)
+        self.det_policy = DetSizePolicy(
+            default_size=self.rec.det_size[0], min_face_size=self.rec.min_face_size
+        )
+
+        # Per-camera detection regions (camera config, see vision/roi.py)
+        self._roi_by_camera: Dict[str, Roi] = {}
 
         self._cam_state: Dict[str, CameraScanState] = {}
         self._enabled_for_attendance: Dict[str, bool] = {}
@@ -320,19 +406,21 @@ class AttendanceRuntime:
         if min_yaw_range is None:
             min_yaw_range = os.getenv("FAS_MIN_MOTION_PX", "0.035")
 
-        self.fas_gate = FASGate(
-            onnx_path=fas_onnx_path,
-            providers=["CPUExecutionProvider"],
-            default_cfg=GateConfig(
-                enabled=fas_enabled,
-                fas_threshold=float(os.getenv("FAS_THRESHOLD", "0.55")),
-                motion_window_sec=float(os.getenv("FAS_MOTION_WINDOW", "1.5")),
-                min_yaw_range=float(min_yaw_range),
-                use_heuristics=(os.getenv("FAS_USE_HEURISTICS", "1") == "1"),
-                cooldown_sec=float(os.getenv("FAS_COOLDOWN_SEC", "2.0")),
-            ),
-            input_size=(112, 112),
-        )
+        self.fas_gate: Optional[FASGate] = None
+        if pipeline:
+            self.fas_gate = FASGate(
+                onnx_path=fas_onnx_path,
+                providers=["CPUExecutionProvider"],
+                default_cfg=GateConfig(
+                    enabled=fas_enabled,
+                    fas_threshold=float(os.getenv("FAS_THRESHOLD", "0.55")),
+                    motion_window_sec=float(os.getenv("FAS_MOTION_WINDOW", "1.5")),
+                    min_yaw_range=float(min_yaw_range),
+                    use_heuristics=(os.getenv("FAS_USE_HEURISTICS", "1") == "1"),
+                    cooldown_sec=float(os.getenv("FAS_COOLDOWN_SEC", "2.0")),
+                ),
+                input_size=(112, 112),
+            )
 
         # ---------------------------
         # ERP push (optional)
@@ -340,7 +428,8 @@ class AttendanceRuntime:
         self.erp_queue: Optional[ERPPushQueue] = None
 
         erp_base = os.getenv("ERP_BASE_URL", "").strip()
-        if erp_base:
+        self.erp_enabled = bool(erp_base)
+        if erp_base and pipeline:
             erp_cfg = ERPClientConfig(
                 base_url=erp_base,
                 prefix=os.getenv("ERP_PREFIX", "/api/v2"),
@@ -353,9 +442,38 @@ class AttendanceRuntime:
                 print(f"[ERP] push failed: {e} | job={job}")
 
             self.erp_queue = ERPPushQueue(erp_client, on_error=_erp_err)
-        else:
+        elif not erp_base:
             print("[ERP] ERP_BASE_URL not set, ERP push disabled.")
 
+        # Attendance events go to a local journal first and are shipped to the
+        # backend in batches (ATT_JOURNAL=0: one POST per event, inline)
+        self.journal: Optional[AttendanceJournal] = None
+        if os.getenv("ATT_JOURNAL", "1").strip() == "1" and pipeline:
+            self.journal = AttendanceJournal(client_for_company=self._client_for_company)
+
+        # FAS + quality, then the backend / ERP write, run off the recognition
+        # loop (DECISION_ASYNC): one batched FAS stage feeding parallel writers
+        self.decision: Optional[DecisionStage] = None
+        self.writer: Optional[DecisionStage] = None
+        if pipeline:
+            queue_max = int(os.getenv("DECISION_QUEUE_MAX", "64"))
+            self._fas_lock = threading.Lock()  # FASGate keeps per-person state and one input buffer
+            self.decision = DecisionStage(
+                handler=self._decide,
+                key=lambda c: c.key,
+                name="attendance-fas",
+                workers=int(os.getenv("DECISION_WORKERS", "1")),
+                queue_max=queue_max,
+                batch_max=self.fas_gate.model.batch_max,
+            )
+            self.writer = DecisionStage(
+                handler=self._write,
+                key=lambda c: c.key,
+                name="attendance-write",
+                workers=int(os.getenv("ATT_WRITE_WORKERS", "4")),
+                queue_max=queue_max,
+            )
+
     def push_voice_event(
         self,
         *,
@@ -461,6 +579,9 @@ class AttendanceRuntime:
         else:
             self._company_by_camera.pop(cid, None)
 
+    def company_for_camera(self, camera_id: str) -> Optional[str]:
+        return self._company_by_camera.get(str(camera_id))
+
     def _gallery_key(self, company_id: Optional[str]) -> str:
         cid = str(company_id or "").strip()
         return cid if cid else "__default__"
@@ -502,82 +623,365 @@ class AttendanceRuntime:
         mapping = self._int_to_emp_id_by_company.get(key, {})
         return mapping.get(int(emp_int), str(emp_int))
 
-    def _ensure_gallery(self, company_id: Optional[str]) -> None:
-        key = self._gallery_key(company_id)
-        now = time.time()
-        last_load = self._gallery_last_load_by_company.get(key, 0.0)
-        if now - last_load < self.gallery_refresh_s:
-            return
-        if not company_id:
-            self._gallery_matrix_by_company[key] = np.zeros((0, 512), dtype=np.float32)
-            self._gallery_meta_by_company[key] = []
-            self._gallery_last_load_by_company[key] = now
-            return
+    def _get_state(self, camera_id: str) -> CameraScanState:
+        cid = str(camera_id)
+        if cid not in self._cam_state:
+            st = CameraScanState()
+            # track ages count every frame, keep the same number of missed detections
+            st.tracker.max_age_frames *= self.detect_every_n
+            self._cam_state[cid] = st
+        return self._cam_state[cid]
 
-        client = self._client_for_company(company_id)
-        try:
-            templates = client.list_templates()
-        except Exception as e:
-            print(f"[GALLERY] load failed company={company_id or 'default'}: {e}")
-            self._gallery_matrix_by_company[key] = np.zeros((0, 512), dtype=np.float32)
-            self._gallery_meta_by_company[key] = []
-            self._gallery_last_load_by_company[key] = now
-            return
+    def needs_detection(self, camera_id: str) -> bool:
+        """False on the frames between two detections (DETECT_EVERY_N > 1)."""
+        state = self._get_state(camera_id)
+        return state.frame_idx + 1 - state.last_det_frame >= self.detect_every_n
 
-        embs: List[np.ndarray] = []
-        meta: List[Tuple[int, str, str]] = []
+    def process_tracks_only(self, frame_bgr: np.ndarray, camera_id: str, name: str) -> np.ndarray:
+        """
+        Frame without detection: advance the tracker clock and draw every track
+        at its predicted box. Attendance is only marked on detection frames.
+        """
+        cid = str(camera_id)
+        company_id = self._company_by_camera.get(cid) or self._default_company_id
+        state = self._get_state(cid)
+        state.frame_idx += 1
+        state.coasted += 1
 
-        for t in templates:
-            emp_id_str = str(t.get("employeeId") or t.get("employee_id") or "").strip()
-            if not emp_id_str:
-                continue
+        annotated = frame_bgr.copy()
+        _put_text_white(annotated, f"frame={state.frame_idx}", 12, 36, scale=1.05)
+        for tr in state.tracker.predict(state.frame_idx):
+            self._draw_track(annotated, company_id, tr, state.tracker.box(tr, state.frame_idx))
+        return annotated
 
-            emb_list = t.get("embedding") or []
-            if not isinstance(emb_list, list) or len(emb_list) < 10:
-                continue
+    def _draw_track(
+        self, annotated: np.ndarray, company_id: Optional[str], tr, box: np.ndarray
+    ) -> Tuple[int, int, int, int, str, str]:
+        """Box + label card of one track; returns (x1, y1, x2, y2, emp_id_str, name)."""
+        x1, y1, x2, y2 = [int(v) for v in box]
+        known = tr.employee_id != -1
+        color = ACCENT_KNOWN if known else ACCENT_UNKNOWN
 
-            emb = np.asarray(emb_list, dtype=np.float32)
-            emb = l2_normalize(emb)
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 3)
 
-            name = str(
-                t.get("employeeName")
-                or t.get("employee_name")
-                or t.get("name")
-                or emp_id_str
-            )
-            emp_int = self._emp_str_to_int(company_id, emp_id_str)
+        if known:
+            emp_id_str = self._emp_int_to_str(company_id, tr.employee_id)
+            name = tr.name
+        else:
+            emp_id_str = "-1"
+            name = "Unknown"
 
-            embs.append(emb)
-            meta.append((emp_int, emp_id_str, name))
+        label = f"{name}"
+        _draw_label_card(annotated, label, x1, max(38, y1 - 14), known, scale=0.75)
+        return x1, y1, x2, y2, emp_id_str, name
 
-        self._gallery_matrix_by_company[key] = (
-            np.stack(embs, axis=0) if embs else np.zeros((0, 512), dtype=np.float32)
+    def process_frame(
+        self,
+        frame_bgr: np.ndarray,
+        camera_id: str,
+        name: str,
+        main: Optional[MainView] = None,
+    ) -> np.ndarray:
+        """main: time-aligned main-stream frame; embeddings and FAS crops come from it."""
+        if not self.needs_detection(camera_id):
+            return self.process_tracks_only(frame_bgr, camera_id, name)
+        dets = self.detect_batch([camera_id], [frame_bgr])[0]
+        embed_dual(
+            self.rec,
+            [(frame_bgr, d, main) for d in self.select_for_embedding(camera_id, dets)],
         )
-        self._gallery_meta_by_company[key] = meta
-        self._gallery_last_load_by_company[key] = now
+        return self.process_detections(frame_bgr, camera_id, name, dets, main=main)
 
-    def _get_state(self, camera_id: str) -> CameraScanState:
+    def set_roi(self, camera_id: str, roi: Optional[Roi]) -> None:
         cid = str(camera_id)
-        if cid not in self._cam_state:
-            self._cam_state[cid] = CameraScanState()
-        return self._cam_state[cid]
+        if roi is None:
+            self._roi_by_camera.pop(cid, None)
+        else:
+            self._roi_by_camera[cid] = roi
 
-    def process_frame(
-        self, frame_bgr: np.ndarray, camera_id: str, name: str
+    def get_roi(self, camera_id: str) -> Optional[Roi]:
+        return self._roi_by_camera.get(str(camera_id))
+
+    def detect_batch(
+        self, camera_ids: List[str], frames_bgr: List[np.ndarray]
+    ) -> List[List[FaceDet]]:
+        """
+        Detection for one frame per camera, each at its camera's detector size
+        (see DetSizePolicy). Cameras with an ROI only feed their region crops to
+        the detector (crop -> detect -> remap, faces centered outside the
+        polygons are dropped). Non-tiled views share one
+        FaceRecognizer.detect_batch() call; tiled cameras are detected tile by tile.
+        """
+        rois = [self._roi_by_camera.get(str(cid)) for cid in camera_ids]
+        views: List[Tuple[int, np.ndarray, int, int]] = []  # (camera index, view, x0, y0)
+        plans = []
+        for i, (cid, frame) in enumerate(zip(camera_ids, frames_bgr)):
+            vs = roi_views(frame, rois[i])
+            views.extend((i, v, x0, y0) for v, x0, y0 in vs)
+            shape = (max(v.shape[0] for v, _, _ in vs), max(v.shape[1] for v, _, _ in vs))
+            plans.append(self.det_policy.plan(cid, shape))
+
+        found: List[List[FaceDet]] = [[] for _ in frames_bgr]
+        det_ms = [0.0] * len(frames_bgr)
+
+        flat = [k for k, (i, _, _, _) in enumerate(views) if plans[i][1] is None]
+        if flat:
+            t0 = time.perf_counter()
+            dets = self.rec.detect_batch(
+                [views[k][1] for k in flat], input_sizes=[plans[views[k][0]][0] for k in flat]
+            )
+            ms = (time.perf_counter() - t0) * 1000.0 / len(flat)
+            for k, d in zip(flat, dets):
+                i, _, x0, y0 = views[k]
+                remap_dets(d, x0, y0)
+                found[i].extend(d)
+                det_ms[i] += ms
+
+        for i, view, x0, y0 in views:
+            size, tiles = plans[i]
+            if tiles is None:
+                continue
+            t0 = time.perf_counter()
+            d = self.rec.detect_tiled(
+                view, tiles, overlap=self.det_policy.tile_overlap, input_size=size
+            )
+            det_ms[i] += (time.perf_counter() - t0) * 1000.0
+            remap_dets(d, x0, y0)
+            found[i].extend(d)
+
+        out: List[List[FaceDet]] = []
+        for i, cid in enumerate(camera_ids):
+            dets = keep_in_roi(found[i], rois[i], frames_bgr[i].shape)
+            self.det_policy.observe(cid, dets, det_ms[i])
+            out.append(dets)
+        return out
+
+    def wants_inference(self, camera_id: str, frame_bgr: np.ndarray) -> bool:
+        """
+        Motion gate in front of detection. A camera whose last detection frame
+        still had faces on live tracks is never gated (a person standing still
+        at the door keeps being recognized).
+        """
+        state = self._get_state(camera_id)
+        busy = state.last_det_frame > 0 and any(
+            tr.last_seen_frame == state.last_det_frame
+            for tr in list(state.tracker.tracks.values())
+        )
+        roi = self.get_roi(camera_id)
+        if roi is not None:
+            # motion outside the detection regions does not matter
+            boxes = roi.crop_boxes(*frame_bgr.shape[:2])
+            x0, y0 = min(b[0] for b in boxes), min(b[1] for b in boxes)
+            x1, y1 = max(b[2] for b in boxes), max(b[3] for b in boxes)
+            frame_bgr = frame_bgr[y0:y1, x0:x1]
+        return self.motion_gate.should_infer(camera_id, frame_bgr, busy=busy)
+
+    def select_for_embedding(self, camera_id: str, dets: List[FaceDet]) -> List[FaceDet]:
+        """
+        Detect-only fast path: returns the detections that still need an embedding.
+
+        A detection is NOT embedded when it lands on a known track whose identity
+        is already above strict_similarity and was verified less than
+        embed_reverify_s ago; it is tagged with that track_id instead.
+        New tracks, unknown tracks and uncertain tracks are always embedded.
+        """
+        state = self._get_state(camera_id)
+        frame_idx = state.frame_idx + 1  # process_detections() will use this index
+        now = time.time()
+
+        need: List[FaceDet] = []
+        for d in dets:
+            d.track_id = None
+            tr = state.tracker.find_track(d.bbox, frame_idx)
+            if (
+                tr is not None
+                and tr.employee_id != -1
+                and tr.similarity >= self.strict_similarity
+                and (now - tr.last_embed_ts) < self.embed_reverify_s
+            ):
+                d.track_id = tr.track_id
+                continue
+            need.append(d)
+
+        state.embeds_computed += len(need)
+        state.embeds_skipped += len(dets) - len(need)
+        return need
+
+    def embedding_stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            cid: {
+                "embeds_computed": st.embeds_computed,
+                "embeds_skipped": st.embeds_skipped,
+                "coasted_frames": st.coasted,
+            }
+            for cid, st in list(self._cam_state.items())
+        }
+
+    def _decide_track_identity(
+        self,
+        tracks: List[Any],
+        tracker_dets: List[Tuple[np.ndarray, str, int, float]],
+        det_emb_by_bbox: Dict[Tuple[int, int, int, int], Tuple[np.ndarray, float]],
+        prev_ident: Dict[int, Tuple[int, int]],
+        gallery_index,
+        gallery_meta,
+        frame_idx: int,
+    ) -> None:
+        """
+        Adds this frame's embeddings to their tracks and matches every refreshed
+        track's mean embedding against the gallery (one matrix multiply). The
+        aggregate decides name / employee / similarity; track.confidence keeps
+        the aggregate similarity. The per-detection match only seeds new tracks
+        and drives the tracker's in-frame dedup; stable_name_hits counts frames
+        the aggregate kept the same employee (prev_ident: before this update).
+        """
+        fresh = []
+        for tr in tracks:
+            if tr.det_index < 0 or tr.last_seen_frame != frame_idx:
+                continue
+            item = det_emb_by_bbox.get(tuple(int(v) for v in tracker_dets[tr.det_index][0]))
+            if item is None:
+                continue  # detect-only fast path, identity unchanged
+            tr.add_embedding(item[0], item[1], reset_sim=self.track_emb_reset_sim)
+            fresh.append((tr, prev_ident.get(tr.track_id, (-1, 0))))
+        if not fresh:
+            return
+
+        if len(gallery_index):
+            rows, sims = gallery_index.match(np.stack([tr.mean_embedding() for tr, _ in fresh]))
+        else:
+            rows, sims = [-1] * len(fresh), [-1.0] * len(fresh)
+        for (tr, (prev_emp, prev_hits)), r, sm in zip(fresh, rows, sims):
+            r, sm = int(r), float(sm)
+            if r != -1 and sm >= self.similarity_threshold and r < len(gallery_meta):
+                emp_int, _, name = gallery_meta[r]
+                emp_int = int(emp_int)
+            else:
+                emp_int, name = -1, "Unknown"
+            if emp_int != -1 and emp_int == prev_emp and tr.emb_count > 1:
+                tr.stable_name_hits = prev_hits + 1
+            else:
+                tr.stable_name_hits = 1 if emp_int != -1 else 0
+            tr.name = name
+            tr.employee_id = emp_int
+            tr.similarity = sm
+            tr.confidence = sm
+
+    def track_stats(self, camera_id: str) -> List[Dict[str, Any]]:
+        state = self._cam_state.get(str(camera_id))
+        if state is None:
+            return []
+        return [
+            {
+                "track_id": tr.track_id,
+                "name": tr.name,
+                "employee_id": tr.employee_id,
+                "confidence": round(float(tr.confidence), 4),
+                "embeddings": tr.emb_count,
+                "weight": round(float(tr.emb_weight), 3),
+                "stable_hits": tr.stable_name_hits,
+                "decision": tr.decision,
+                "age_frames": state.frame_idx - tr.last_seen_frame,
+            }
+            for tr in list(state.tracker.tracks.values())
+        ]
+
+    def _mark_attendance(
+        self,
+        state: CameraScanState,
+        company_id: str,
+        cid: str,
+        camera_name: str,
+        tr: Any,
+        emp_id_str: str,
+        name: str,
+        now: float,
+    ) -> bool:
+        try:
+            # 1) Backend attendance: durable journal (shipped in batches) or direct POST
+            if self.journal is not None:
+                self.journal.append(
+                    company_id=company_id,
+                    employee_id=emp_id_str,
+                    timestamp=now_iso(),
+                    camera_id=cid,
+                    confidence=float(tr.similarity),
+                )
+            else:
+                self._client_for_company(company_id).create_attendance(
+                    employee_id=emp_id_str,
+                    timestamp=now_iso(),
+                    camera_id=cid,
+                    confidence=float(tr.similarity),
+                    snapshot_path=None,
+                )
+
+            # 2) Mark cooldown only once the event is stored
+            state.last_mark[emp_id_str] = now
+
+            # 3) Push to ERP (non-blocking, in background)
+            if self.erp_queue is not None:
+                attendance_date = datetime.now().strftime(
+                    "%d/%m/%Y"
+                )  # "03/01/2026"
+                in_time = datetime.now().strftime("%H:%M:%S")  # "09:00:00"
+
+                job = ERPPushJob(
+                    attendance_date=attendance_date,
+                    emp_id=str(emp_id_str),  # IMPORTANT: must match ERP empId
+                    in_time=in_time,
+                    in_location=camera_name,
+                )
+
+                ok = self.erp_queue.enqueue(job)
+                print(
+                    f"[ERP] queued ok={ok} emp={job.emp_id} date={job.attendance_date} in={job.in_time}"
+                )
+
+                if ok:
+                    # Also push a voice event for this attendance
+                    self.push_voice_event(
+                        employee_id=emp_id_str,
+                        name=name,
+                        camera_id=cid,
+                        camera_name=camera_name,
+                    )
+
+                if not ok:
+                    print("[ERP] queue full, dropped attendance push")
+
+        except Exception as e:
+            print(f"[ATTENDANCE] Failed to mark emp={emp_id_str} cam={cid}: {e}")
+            return False
+        return True
+
+    def process_detections(
+        self,
+        frame_bgr: np.ndarray,
+        camera_id: str,
+        name: str,
+        dets: List[FaceDet],
+        main: Optional[MainView] = None,
+        candidates: Optional[List[AttendanceCandidate]] = None,
     ) -> np.ndarray:
+        """
+        Everything after inference: gallery match, tracking, attendance, overlay.
+        Used directly by the batched scheduler, which runs detection/embedding
+        for many cameras at once and hands each camera its own FaceDet list.
+        Attendance candidates go to the decision stage (decide()); with
+        `candidates` they are appended there and the caller submits them once
+        for all cameras of a tick.
+        """
         cid = str(camera_id)
         camera_name = str(name)
         company_id = self._company_by_camera.get(cid) or self._default_company_id
-        self._ensure_gallery(company_id)
-        gallery_key = self._gallery_key(company_id)
-        gallery_matrix = self._gallery_matrix_by_company.get(gallery_key)
-        if gallery_matrix is None:
-            gallery_matrix = np.zeros((0, 512), dtype=np.float32)
-            self._gallery_matrix_by_company[gallery_key] = gallery_matrix
-        gallery_meta = self._gallery_meta_by_company.get(gallery_key, [])
+        gallery = self.gallery_sync.get(company_id)
+        gallery_index = gallery.index
+        gallery_meta = gallery.meta
 
         state = self._get_state(cid)
         state.frame_idx += 1
+        state.last_det_frame = state.frame_idx
 
         enable_attendance = self.is_attendance_enabled(cid)
         annotated = frame_bgr.copy()
@@ -585,8 +989,6 @@ class AttendanceRuntime:
         _put_text_white(annotated, f"frame={state.frame_idx}", 12, 36, scale=1.05)
         ts_now = time.strftime("%Y-%m-%d %H:%M:%S")
 
-        dets = self.rec.detect_and_embed(frame_bgr)
-
         # remove junk detections
 
         # min_det_quality = float(os.getenv("MIN_DET_QUALITY", "8.0"))
@@ -600,16 +1002,40 @@ class AttendanceRuntime:
 
         det_list = []
         det_kps_by_bbox: Dict[Tuple[int, int, int, int], Optional[np.ndarray]] = {}
+        det_emb_by_bbox: Dict[Tuple[int, int, int, int], Tuple[np.ndarray, float]] = {}
 
-        for d in dets:
-            idx, sim = (
-                match_gallery(d.emb, gallery_matrix)
-                if gallery_matrix.size
-                else (-1, -1.0)
-            )
+        reused_tids = set()
 
+        # One matrix multiply for every embedded face of this frame
+        to_match = [i for i, d in enumerate(dets) if d.emb is not None]
+        match_by_det: Dict[int, Tuple[int, float]] = {}
+        if to_match and len(gallery_index):
+            rows, sims = gallery_index.match(np.stack([dets[i].emb for i in to_match]))
+            for i, r, sm in zip(to_match, rows, sims):
+                match_by_det[i] = (int(r), float(sm))
+
+        for di, d in enumerate(dets):
             bbox_key = tuple(int(v) for v in d.bbox)
             det_kps_by_bbox[bbox_key] = d.kps
+            if d.emb is not None:
+                # sharp, large, confident faces weigh more in the track's identity
+                q = quality_score(bbox_key, frame_bgr)
+                det_emb_by_bbox[bbox_key] = (d.emb, float(d.det_score) * (0.05 + q / 100.0))
+
+            # detect-only fast path: keep the verified identity of the track
+            reused = (
+                state.tracker.tracks.get(d.track_id)
+                if d.emb is None and d.track_id is not None
+                else None
+            )
+            if reused is not None:
+                reused_tids.add(reused.track_id)
+                det_list.append(
+                    (d.bbox, reused.name, int(reused.employee_id), float(reused.similarity))
+                )
+                continue
+
+            idx, sim = match_by_det.get(di, (-1, -1.0))
 
             if (
                 idx != -1
@@ -629,31 +1055,36 @@ class AttendanceRuntime:
             det_list, det_kps_by_bbox, iou_threshold=0.45
         )
 
+        tracker_dets = [
+            (bbox, name, emp_int, sim) for (bbox, name, emp_int, sim) in det_list
+        ]
+        prev_ident = {
+            tid: (tr.employee_id, tr.stable_name_hits)
+            for tid, tr in state.tracker.tracks.items()
+        }
         tracks = state.tracker.update(
             frame_idx=state.frame_idx,  # consistent frame counter (target ~60 fps upstream)
-            dets=[
-                (bbox, name, emp_int, sim) for (bbox, name, emp_int, sim) in det_list
-            ],
+            dets=tracker_dets,
+        )
+        self._decide_track_identity(
+            tracks, tracker_dets, det_emb_by_bbox, prev_ident,
+            gallery_index, gallery_meta, state.frame_idx,
         )
 
+        # Tracks refreshed by an embedded detection count as verified now
+        verified_at = time.time()
         for tr in tracks:
-            x1, y1, x2, y2 = [int(v) for v in tr.bbox]
-            h, w = annotated.shape[:2]
+            if tr.last_seen_frame == state.frame_idx and tr.track_id not in reused_tids:
+                tr.last_embed_ts = verified_at
 
+        pending: List[AttendanceCandidate] = [] if candidates is None else candidates
+        for tr in tracks:
+            # tracks missed this frame are drawn where the motion model expects them
+            x1, y1, x2, y2, emp_id_str, name = self._draw_track(
+                annotated, company_id, tr, state.tracker.box(tr, state.frame_idx)
+            )
+            h, w = annotated.shape[:2]
             known = tr.employee_id != -1
-            color = ACCENT_KNOWN if known else ACCENT_UNKNOWN
-
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 3)
-
-            if known:
-                emp_id_str = self._emp_int_to_str(company_id, tr.employee_id)
-                name = tr.name
-            else:
-                emp_id_str = "-1"
-                name = "Unknown"
-
-            label = f"{name}"
-            _draw_label_card(annotated, label, x1, max(38, y1 - 14), known, scale=0.75)
 
             if not enable_attendance:
                 continue
@@ -661,100 +1092,129 @@ class AttendanceRuntime:
                 continue
             if not company_id:
                 continue
-            if tr.stable_name_hits < self.stable_hits_required:
-                continue
+            # mean embedding above strict_similarity marks right away,
+            # otherwise the identity must have held for stable_hits_required frames
             if tr.similarity < self.strict_similarity:
                 continue
-
-            # Avoid partial edge faces and low-quality crops
-            if x1 <= 4 or y1 <= 4 or x2 >= (w - 4) or y2 >= (h - 4):
+            if (
+                tr.emb_count < self.track_min_embeds
+                and tr.stable_name_hits < self.stable_hits_required
+            ):
                 continue
 
-            q_score = quality_score((x1, y1, x2, y2), frame_bgr)
-            if q_score < self.min_att_quality:
+            # Avoid partial edge faces (quality is scored in the decision stage)
+            if x1 <= 4 or y1 <= 4 or x2 >= (w - 4) or y2 >= (h - 4):
                 continue
 
             last = state.last_mark.get(emp_id_str, 0.0)
-            now = time.time()
-            if now - last < self.cooldown_s:
+            if time.time() - last < self.cooldown_s:
                 continue
+            if self.decision.pending((cid, emp_id_str)) or self.writer.pending((cid, emp_id_str)):
+                continue  # still being decided
 
             bbox_key = (x1, y1, x2, y2)
 
             # ✅ IMPORTANT: nearest kps match (tracker bbox != detector bbox)
             face_kps = _nearest_kps(bbox_key, det_kps_by_bbox)
 
-            fas_ok, fas_dbg = self.fas_gate.check(
+            if main is not None:
+                # anti-spoofing on the high-res ROI of the same moment
+                fas_img, fas_box, fas_kps = main.image, main.map_bbox(bbox_key), main.map_kps(face_kps)
+            else:
+                fas_img, fas_box, fas_kps = frame_bgr, bbox_key, face_kps
+            q_img, q_box, fas_shape, q_shape = frame_bgr, bbox_key, None, None
+            if self.frames_transient:
+                # the frame buffer is reused: the decision stage only reads the face ROIs
+                fas_img, fas_box, fas_kps, fas_shape = _face_crop(fas_img, fas_box, fas_kps)
+                if main is None:
+                    q_img, q_box, q_shape = fas_img, fas_box, fas_shape
+                else:
+                    q_img, q_box, _, q_shape = _face_crop(frame_bgr, bbox_key, None)
+
+            check = FASCheck(
                 camera_id=cid,
                 person_key=emp_id_str,
-                frame_bgr=frame_bgr,
-                bbox=bbox_key,
-                kps=face_kps,
+                frame_bgr=fas_img,
+                bbox=fas_box,
+                kps=fas_kps,
+                frame_shape=fas_shape,
             )
+            pending.append(
+                AttendanceCandidate(
+                    fas=check,
+                    state=state,
+                    track=tr,
+                    company_id=company_id,
+                    camera_name=camera_name,
+                    employee_id=emp_id_str,
+                    name=name,
+                    frame=q_img,
+                    bbox=q_box,
+                    kps_none=face_kps is None,
+                    frame_shape=q_shape,
+                )
+            )
+
+        if candidates is None:
+            self.decide(pending)
+
+        return annotated
+
+    def decide(self, candidates: List[AttendanceCandidate]) -> None:
+        """Hand attendance candidates to the decision stage (never blocks)."""
+        self.decision.submit(candidates)
+
+    def decision_stats(self) -> Dict[str, Any]:
+        if self.decision is None or self.writer is None:
+            return {}  # pool_main: decided in the worker processes
+        return {
+            "fas": self.decision.stats(),
+            "write": self.writer.stats(),
+            "journal": self.journal.stats() if self.journal is not None else None,
+            "erp": self.erp_queue.stats() if self.erp_queue is not None else None,
+        }
+
+    def _decide(self, candidates: List[AttendanceCandidate]) -> None:
+        """
+        Decision stage: quality and cooldown per face, one batched FAS run for
+        the rest; those that pass go to the writer stage. The outcome goes
+        back to the track (track.decision) and the camera's cooldown.
+        """
+        now = time.time()
+        todo: List[AttendanceCandidate] = []
+        for c in candidates:
+            if now - c.state.last_mark.get(c.employee_id, 0.0) < self.cooldown_s:
+                c.track.decision = "cooldown"
+                continue
+            if quality_score(c.bbox, c.frame, c.frame_shape) < self.min_att_quality:
+                c.track.decision = "low_quality"
+                continue
+            todo.append(c)
+        if not todo:
+            return
 
+        with self._fas_lock:
+            fas_results = self.fas_gate.check_batch([c.fas for c in todo])
+        for c, (fas_ok, fas_dbg) in zip(todo, fas_results):
             print(
                 "[FAS DEBUG]",
                 "emp=",
-                emp_id_str,
+                c.employee_id,
                 "ok=",
                 fas_ok,
                 "dbg=",
                 fas_dbg,
                 "kps_none=",
-                face_kps is None,
+                c.kps_none,
             )
 
-            if not fas_ok:
-                # Optional debug overlay:
-                # _put_text_white(annotated, f"FAS BLOCK: {fas_dbg.get('fas')}", x1, y2 + 22, scale=0.7)
-                continue
+            c.track.decision = str(fas_dbg.get("fas", ""))
+            if fas_ok:
+                self.writer.submit([c])
 
-            try:
-                client = self._client_for_company(company_id)
-                # 1) Your existing backend attendance (keep as-is)
-                client.create_attendance(
-                    employee_id=emp_id_str,
-                    timestamp=now_iso(),
-                    camera_id=cid,
-                    confidence=float(tr.similarity),
-                    snapshot_path=None,
-                )
-
-                # 2) Mark cooldown only if backend success
-                state.last_mark[emp_id_str] = now
-
-                # 3) Push to ERP (non-blocking, in background)
-                if self.erp_queue is not None:
-                    attendance_date = datetime.now().strftime(
-                        "%d/%m/%Y"
-                    )  # "03/01/2026"
-                    in_time = datetime.now().strftime("%H:%M:%S")  # "09:00:00"
-
-                    job = ERPPushJob(
-                        attendance_date=attendance_date,
-                        emp_id=str(emp_id_str),  # IMPORTANT: must match ERP empId
-                        in_time=in_time,
-                        in_location=camera_name,
-                    )
-
-                    ok = self.erp_queue.enqueue(job)
-                    print(
-                        f"[ERP] queued ok={ok} emp={job.emp_id} date={job.attendance_date} in={job.in_time}"
-                    )
-
-                    if ok:
-                        # Also push a voice event for this attendance
-                        self.push_voice_event(
-                            employee_id=emp_id_str,
-                            name=name,
-                            camera_id=cid,
-                            camera_name=camera_name,
-                        )
-
-                    if not ok:
-                        print("[ERP] queue full, dropped attendance push")
-
-            except Exception as e:
-                print(f"[ATTENDANCE] Failed to mark emp={emp_id_str} cam={cid}: {e}")
-
-        return annotated
+    def _write(self, candidates: List[AttendanceCandidate]) -> None:
+        for c in candidates:
+            if self._mark_attendance(
+                c.state, c.company_id, c.fas.camera_id, c.camera_name, c.track, c.employee_id, c.name, time.time()
+            ):
+                c.track.decision = "marked"
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .camera_runtime import CameraRuntime
+from .attendance_runtime import AttendanceCandidate, AttendanceRuntime
+from ..vision.dual_stream import MainView, embed_dual
+from ..vision.frame import Frame
+from ..vision.recognizer import FaceDet
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+@dataclass
+class _CamSlot:
+    camera_id: str
+    camera_name: str
+    weight: float  # ai_fps, used as a fair-share weight
+    credit: float = 1.0  # first frame is due immediately
+    last_tick: float = 0.0
+    served: int = 0
+    last_seq: int = 0  # seq of the last frame inferred for this camera
+    stale: int = 0  # due ticks skipped because no new frame had arrived
+    gated: int = 0  # new frames skipped by the motion gate (static scene)
+    coasted: int = 0  # new frames drawn from track prediction (DETECT_EVERY_N)
+
+
+class BatchScheduler:
+    """
+    Single inference thread for all cameras:
+    - each tick picks the cameras whose fair-share credit is due
+    - runs detection for all their latest frames as one batch (each at its
+      camera's detector size, see AttendanceRuntime.detect_batch)
+    - runs ArcFace for every face crop of the tick that still needs it
+      (new/uncertain tracks, see AttendanceRuntime.select_for_embedding);
+      dual-stream cameras crop those faces from their main-stream frame
+    - hands each camera its detections (tracker/attendance/overlay); the
+      attendance candidates of all cameras go to the decision stage together
+
+    ai_fps is a weight, not a sleep: every camera earns `ai_fps` credits per
+    second and is served when it has one. When the box is saturated, all
+    cameras slow down proportionally instead of starving each other.
+
+    A frame is inferred at most once: a due camera whose latest frame seq was
+    already served keeps its credit, and the thread sleeps on
+    CameraRuntime.wait_for_any_frame() until some camera delivers a new one.
+
+    With DETECT_EVERY_N > 1 the frames between two detections only advance
+    the camera's tracks (AttendanceRuntime.process_tracks_only).
+
+    New frames of a static scene are dropped by the motion gate
+    (AttendanceRuntime.wants_inference) before detection; the raw frame is
+    published instead so viewers keep seeing live video.
+    """
+
+    def __init__(
+        self,
+        camera_rt: CameraRuntime,
+        attendance_rt: AttendanceRuntime,
+        on_result: Callable[[str, np.ndarray], None],
+        max_batch: int = 16,
+        max_burst: float = 2.0,
+    ):
+        self.camera_rt = camera_rt
+        self.attendance_rt = attendance_rt
+        self.on_result = on_result
+
+        # env override (AI_BATCH_MAX)
+        self.max_batch = max(1, _env_int("AI_BATCH_MAX", max_batch))
+        self.max_burst = float(max_burst)
+
+        self._slots: Dict[str, _CamSlot] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # counters
+        self._ticks = 0
+        self._frames = 0
+        self._faces = 0
+        self._last_tick_ms = 0.0
+
+    # -------------------------
+    # Public
+    # -------------------------
+    def add(self, camera_id: str, camera_name: str, weight: float) -> None:
+        with self._lock:
+            slot = self._slots.get(camera_id)
+            if slot is None:
+                self._slots[camera_id] = _CamSlot(
+                    camera_id=camera_id,
+                    camera_name=camera_name,
+                    weight=max(0.1, float(weight)),
+                    last_tick=time.time(),
+                )
+            else:
+                slot.camera_name = camera_name
+                slot.weight = max(0.1, float(weight))
+            self._ensure_thread()
+        self._wake.set()
+
+    def remove(self, camera_id: str) -> None:
+        with self._lock:
+            self._slots.pop(camera_id, None)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            ticks = max(1, self._ticks)
+            return {
+                "cameras": {
+                    cid: {
+                        "weight": s.weight,
+                        "served": s.served,
+                        "stale_skips": s.stale,
+                        "motion_skips": s.gated,
+                        "coasted": s.coasted,
+                        "credit": round(s.credit, 3),
+                    }
+                    for cid, s in self._slots.items()
+                },
+                "ticks": self._ticks,
+                "avg_batch_frames": self._frames / ticks,
+                "avg_batch_faces": self._faces / ticks,
+                "last_tick_ms": self._last_tick_ms,
+            }
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _ensure_thread(self) -> None:
+        # caller holds self._lock
+        if self._running and self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _pick(self, now: float) -> Tuple[List[_CamSlot], float]:
+        """
+        Returns (due slots, seconds until the next slot becomes due).
+        Most-owed cameras first; capped at max_batch per tick.
+        """
+        with self._lock:
+            if not self._slots:
+                return [], 0.1
+            next_due = 1.0
+            due: List[_CamSlot] = []
+            for s in self._slots.values():
+                s.credit = min(self.max_burst, s.credit + s.weight * max(0.0, now - s.last_tick))
+                s.last_tick = now
+                if s.credit >= 1.0:
+                    due.append(s)
+                else:
+                    next_due = min(next_due, (1.0 - s.credit) / s.weight)
+            due.sort(key=lambda s: s.credit, reverse=True)
+            due = due[: self.max_batch]
+            for s in due:
+                s.credit -= 1.0
+            return due, next_due
+
+    def _loop(self) -> None:
+        rec = self.attendance_rt.rec
+
+        while True:
+            with self._lock:
+                if not self._slots:
+                    self._running = False
+                    return
+
+            due, wait_s = self._pick(time.time())
+            if not due:
+                self._wake.wait(timeout=max(0.001, wait_s))
+                self._wake.clear()
+                continue
+
+            t0 = time.time()
+            batch: List[Tuple[_CamSlot, np.ndarray]] = []
+            mains: List[Optional[MainView]] = []
+            stale: List[_CamSlot] = []
+            gated: List[_CamSlot] = []
+            coast: List[_CamSlot] = []
+            for s in due:
+                f: Optional[Frame] = self.camera_rt.get_latest(s.camera_id)
+                if f is None or f.seq <= s.last_seq:
+                    stale.append(s)
+                    continue
+                s.last_seq = f.seq
+                if not self.attendance_rt.needs_detection(s.camera_id):
+                    # between two detections: predicted tracks only, no inference
+                    try:
+                        annotated = self.attendance_rt.process_tracks_only(
+                            f.image, s.camera_id, s.camera_name
+                        )
+                    except Exception as e:
+                        print(f"[SCHEDULER] process_tracks_only failed cam={s.camera_id}: {e}")
+                        continue
+                    self.on_result(s.camera_id, annotated)
+                    coast.append(s)
+                    continue
+                if not self.attendance_rt.wants_inference(s.camera_id, f.image):
+                    gated.append(s)
+                    self.on_result(s.camera_id, f.image)
+                    continue
+                batch.append((s, f.image))
+                mains.append(
+                    MainView.pair(f.shape, self.camera_rt.get_main_frame(s.camera_id, f.ts))
+                )
+            if stale:
+                with self._lock:
+                    for s in stale:
+                        # keep the credit: serve this camera as soon as it has a new frame
+                        s.credit = min(self.max_burst, s.credit + 1.0)
+                        s.stale += 1
+            if gated or coast:
+                with self._lock:
+                    for s in gated:
+                        s.gated += 1
+                    for s in coast:
+                        s.coasted += 1
+                    for s in gated + coast:
+                        # come back when it is due again, not after the idle timeout
+                        wait_s = min(wait_s, max(0.0, 1.0 - s.credit) / s.weight)
+            if not batch:
+                # sleep until a stale camera gets a new frame or another one is due
+                after = {s.camera_id: s.last_seq for s in stale}
+                self.camera_rt.wait_for_any_frame(after, timeout=max(0.001, wait_s))
+                continue
+
+            # Heavy work: one detector call + one embedding call for the tick
+            try:
+                dets_per_cam: List[List[FaceDet]] = self.attendance_rt.detect_batch(
+                    [s.camera_id for s, _ in batch], [f for _, f in batch]
+                )
+                embed_dual(
+                    rec,
+                    [
+                        (f, d, main)
+                        for (s, f), dets, main in zip(batch, dets_per_cam, mains)
+                        for d in self.attendance_rt.select_for_embedding(s.camera_id, dets)
+                    ],
+                )
+            except Exception as e:
+                print(f"[SCHEDULER] batch inference failed cams={len(batch)}: {e}")
+                continue
+
+            n_faces = 0
+            candidates: List[AttendanceCandidate] = []
+            for (s, frame), dets, main in zip(batch, dets_per_cam, mains):
+                n_faces += len(dets)
+                try:
+                    annotated = self.attendance_rt.process_detections(
+                        frame_bgr=frame,
+                        camera_id=s.camera_id,
+                        name=s.camera_name,
+                        dets=dets,
+                        main=main,
+                        candidates=candidates,
+                    )
+                except Exception as e:
+                    print(f"[SCHEDULER] process_detections failed cam={s.camera_id}: {e}")
+                    continue
+                self.on_result(s.camera_id, annotated)
+                s.served += 1
+
+            # attendance candidates of every camera reach the decision stage together
+            # (one batched anti-spoofing run)
+            self.attendance_rt.decide(candidates)
+
+            tick_s = time.time() - t0
+            for s, _ in batch:
+                self.attendance_rt.motion_gate.record_cost(s.camera_id, tick_s / len(batch))
+
+            with self._lock:
+                self._ticks += 1
+                self._frames += len(batch)
+                self._faces += n_faces
+                self._last_tick_ms = tick_s * 1000.0
@@ -1,31 +1,50 @@
 from __future__ import annotations
 
-from typing import Dict, Optional
+from typing import Dict, Mapping, Optional
+import os
 import threading
+import time
 import numpy as np
 
 from ..vision.capture import FrameGrabber
+from ..vision.frame import Frame
 
 
 class CameraRuntime:
     def __init__(self):
         # Direct RTSP cameras (existing workflow)
         self.cameras: Dict[str, FrameGrabber] = {}
+        # Optional high-res main stream per direct camera (cameras[] is the substream)
+        self._main: Dict[str, FrameGrabber] = {}
+        self.main_history = max(1, int(os.getenv("MAIN_STREAM_HISTORY", "8")))
+        self.main_max_skew_s = float(os.getenv("MAIN_STREAM_MAX_SKEW_S", "0.25"))
 
         # Relay-fed cameras (agent pushes frames)
         self._relay_enabled: set[str] = set()
-        self._relay_latest: Dict[str, np.ndarray] = {}
+        self._relay_latest: Dict[str, Frame] = {}
 
         self._lock = threading.Lock()
+        # notified on every new frame (direct or relay); see wait_for_frame()
+        self._frame_cond = threading.Condition()
 
     def start(
-        self, camera_id: str, rtsp_url: str, width: int = 1280, height: int = 720
+        self,
+        camera_id: str,
+        rtsp_url: str,
+        width: int = 1280,
+        height: int = 720,
+        main_url: Optional[str] = None,
     ) -> bool:
         """
         Idempotent start (direct mode):
         - If already running with same source, do nothing.
         - If source changed, restart.
 
+        Dual stream: rtsp_url is the (cheap) stream used for detection and
+        display; main_url, if given, is the camera's high-res stream. Its
+        recent frames are buffered so face ROIs can be taken from the frame
+        captured closest in time (get_main_frame()).
+
         Relay merge behavior:
         - If camera was relay, switch it to direct by clearing relay state.
 
@@ -37,17 +56,45 @@ class CameraRuntime:
                 self._relay_enabled.discard(camera_id)
                 self._relay_latest.pop(camera_id, None)
 
+            main_url = str(main_url or "").strip() or None
             existing = self.cameras.get(camera_id)
-            if existing and getattr(existing, "rtsp_url", None) == rtsp_url:
+            existing_main = self._main.get(camera_id)
+            if (
+                existing
+                and getattr(existing, "rtsp_url", None) == rtsp_url
+                and getattr(existing_main, "rtsp_url", None) == main_url
+            ):
                 return False
 
-            if existing:
+            if existing and getattr(existing, "rtsp_url", None) != rtsp_url:
                 existing.stop()
                 self.cameras.pop(camera_id, None)
+                existing = None
+            if existing_main and existing_main.rtsp_url != main_url:
+                existing_main.stop()
+                self._main.pop(camera_id, None)
+
+            if existing is None:
+                grabber = FrameGrabber(
+                    rtsp_url, width=width, height=height, on_frame=self._on_new_frame
+                )
+                grabber.start()
+                self.cameras[camera_id] = grabber
 
-            grabber = FrameGrabber(rtsp_url, width=width, height=height)
-            grabber.start()
-            self.cameras[camera_id] = grabber
+            if main_url and camera_id not in self._main:
+                # DECODE_* tune the detection stream; the main stream has to
+                # keep every frame (MAIN_STREAM_MAX_SKEW_S) at full size
+                main = FrameGrabber(
+                    main_url,
+                    width=0,
+                    height=0,
+                    history=self.main_history,
+                    decode_every_n=1,
+                    decode_keyframes_only=False,
+                    decode_width=0,
+                )
+                main.start()
+                self._main[camera_id] = main
             return True
 
     def start_relay(self, camera_id: str) -> bool:
@@ -66,6 +113,9 @@ class CameraRuntime:
             existing = self.cameras.pop(camera_id, None)
             if existing:
                 existing.stop()
+            main = self._main.pop(camera_id, None)
+            if main:
+                main.stop()
 
             self._relay_enabled.add(camera_id)
             # keep any existing latest frame if already pushed earlier
@@ -88,7 +138,10 @@ class CameraRuntime:
             if camera_id not in self._relay_enabled:
                 self._relay_enabled.add(camera_id)
 
-            self._relay_latest[camera_id] = frame
+            f = Frame.wrap(frame)
+            self._relay_latest[camera_id] = f
+
+        self._on_new_frame(f)
 
     def stop(self, camera_id: str) -> bool:
         """
@@ -102,6 +155,7 @@ class CameraRuntime:
             grabber = self.cameras.pop(camera_id, None)
             if grabber:
                 stopped_any = True
+            main = self._main.pop(camera_id, None)
 
             if camera_id in self._relay_enabled:
                 self._relay_enabled.discard(camera_id)
@@ -110,12 +164,27 @@ class CameraRuntime:
 
         if grabber:
             grabber.stop()
+        if main:
+            main.stop()
         return stopped_any
 
-    def get_frame(self, camera_id: str) -> Optional[np.ndarray]:
+    def get_main_frame(self, camera_id: str, ts: float) -> Optional[Frame]:
         """
-        Unified frame getter:
-        - Direct cameras: returns FrameGrabber.read_latest()
+        High-res main-stream frame captured closest to ts (the substream frame's
+        capture time), or None if the camera has no main stream or nothing
+        within MAIN_STREAM_MAX_SKEW_S.
+        """
+        with self._lock:
+            main = self._main.get(camera_id)
+        if main is None:
+            return None
+        main.touch()
+        return main.frame_near(ts, self.main_max_skew_s)
+
+    def get_latest(self, camera_id: str) -> Optional[Frame]:
+        """
+        Unified frame getter (shared, read-only, no copy):
+        - Direct cameras: returns FrameGrabber.read_frame()
         - Relay cameras: returns latest pushed frame
         """
         with self._lock:
@@ -124,4 +193,68 @@ class CameraRuntime:
                 return self._relay_latest.get(camera_id)
 
         # direct path (no lock while reading)
-        return grabber.read_latest()
+        grabber.touch()
+        return grabber.read_frame()
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """Per-camera source + decode counters."""
+        with self._lock:
+            grabbers = dict(self.cameras)
+            relay = {cid: self._relay_latest.get(cid) for cid in self._relay_enabled}
+        out: Dict[str, Dict[str, object]] = {}
+        with self._lock:
+            mains = dict(self._main)
+        for cid, g in grabbers.items():
+            out[cid] = {"source": "direct", **g.stats()}
+            if cid in mains:
+                out[cid]["main"] = mains[cid].stats()
+        for cid, f in relay.items():
+            out[cid] = {
+                "source": "relay",
+                "frame_size": None if f is None else [int(f.shape[1]), int(f.shape[0])],
+            }
+        return out
+
+    def wait_for_frame(
+        self, camera_id: str, after_seq: int = 0, timeout: Optional[float] = None
+    ) -> Optional[Frame]:
+        """
+        Block until the camera has a frame with seq > after_seq and return it.
+        Returns None on timeout (camera stalled/stopped). A frame is never
+        returned twice to a caller that passes back the last seq it got.
+        """
+        deadline = None if timeout is None else time.monotonic() + float(timeout)
+        with self._frame_cond:
+            while True:
+                f = self.get_latest(camera_id)
+                if f is not None and f.seq > after_seq:
+                    return f
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._frame_cond.wait(timeout=remaining)
+
+    def wait_for_any_frame(
+        self, after_seqs: Mapping[str, int], timeout: Optional[float] = None
+    ) -> bool:
+        """Block until any camera in after_seqs has a newer frame. False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + float(timeout)
+        with self._frame_cond:
+            while True:
+                for cid, seq in after_seqs.items():
+                    f = self.get_latest(cid)
+                    if f is not None and f.seq > seq:
+                        return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._frame_cond.wait(timeout=remaining)
+
+    def _on_new_frame(self, frame: Frame) -> None:
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    def get_frame(self, camera_id: str) -> Optional[np.ndarray]:
+        """Latest image as a read-only array (see get_latest); copy before drawing."""
+        f = self.get_latest(camera_id)
+        return None if f is None else f.image
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Sequence, Set
+
+import numpy as np
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _pcts(samples: Deque[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 95, 99])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+
+
+class DecisionStage:
+    """
+    Bounded work queue + worker threads between recognition and its slow
+    side effects (anti-spoofing, backend / ERP writes).
+
+    - submit() never blocks the caller: a full queue drops the item
+      (backpressure; the recognition loop offers it again next frame)
+    - an item whose key is already queued or being decided is skipped, so one
+      person in front of the camera is never decided twice in parallel
+    - workers take up to batch_max queued items at once and hand them to
+      handler(items) together (one batched FAS run); a handler may submit
+      to a next stage, whose key is taken before this stage releases it
+    - DECISION_ASYNC=0 runs handler inline in the caller (previous behaviour)
+
+    stats(): queue depth, drops and queue-wait / end-to-end latency percentiles
+    (ms) over the last DECISION_LATENCY_WINDOW items.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], None],
+        key: Callable[[Any], Hashable],
+        name: str = "decision",
+        workers: int = 1,
+        queue_max: int = 64,
+        batch_max: int = 1,
+    ):
+        self.handler = handler
+        self.key = key
+        self.name = name
+        self.batch_max = max(1, int(batch_max))
+        self.async_mode = _env_int("DECISION_ASYNC", 1) == 1
+        self.workers = max(1, int(workers))
+        self.queue_max = max(1, int(queue_max))
+
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_max)
+        self._inflight: Set[Hashable] = set()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+        window = max(10, _env_int("DECISION_LATENCY_WINDOW", 1000))
+        self._wait_ms: Deque[float] = deque(maxlen=window)
+        self._total_ms: Deque[float] = deque(maxlen=window)
+        self._submitted = 0
+        self._dropped = 0
+        self._deduped = 0
+        self._decided = 0
+        self._errors = 0
+
+    # -------------------------
+    # Producer side (hot path)
+    # -------------------------
+    def submit(self, items: Sequence[Any]) -> None:
+        if not items:
+            return
+        if not self.async_mode:
+            self._run([(time.perf_counter(), it) for it in items], time.perf_counter())
+            return
+        self._start()
+        for it in items:
+            k = self.key(it)
+            with self._lock:
+                if k in self._inflight:
+                    self._deduped += 1
+                    continue
+                self._inflight.add(k)
+            try:
+                self._q.put_nowait((time.perf_counter(), it))
+            except queue.Full:
+                with self._lock:
+                    self._inflight.discard(k)
+                    self._dropped += 1
+                continue
+            with self._lock:
+                self._submitted += 1
+
+    def pending(self, k: Hashable) -> bool:
+        with self._lock:
+            return k in self._inflight
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "async": self.async_mode,
+                "workers": self.workers if self.async_mode else 0,
+                "queue_depth": self._q.qsize(),
+                "queue_max": self.queue_max,
+                "inflight": len(self._inflight),
+                "submitted": self._submitted,
+                "dropped": self._dropped,
+                "deduped": self._deduped,
+                "decided": self._decided,
+                "errors": self._errors,
+                "queue_wait_ms": _pcts(self._wait_ms),
+                "end_to_end_ms": _pcts(self._total_ms),
+            }
+
+    # -------------------------
+    # Workers
+    # -------------------------
+    def _start(self) -> None:
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._loop, name=f"{self.name}-{i}", daemon=True)
+                self._threads.append(t)
+                t.start()
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._q.get()]
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            t_start = time.perf_counter()
+            try:
+                self._run(batch, t_start)
+            finally:
+                with self._lock:
+                    for _, it in batch:
+                        self._inflight.discard(self.key(it))
+
+    def _run(self, batch: List[Any], t_start: float) -> None:
+        try:
+            self.handler([it for _, it in batch])
+        except Exception as e:
+            print(f"[DECISION] {self.name} handler failed items={len(batch)}: {e}")
+            with self._lock:
+                self._errors += 1
+        t_end = time.perf_counter()
+        with self._lock:
+            self._decided += len(batch)
+            for t_in, _ in batch:
+                self._wait_ms.append(1000.0 * (t_start - t_in))
+                self._total_ms.append(1000.0 * (t_end - t_in))
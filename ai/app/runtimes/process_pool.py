@@ -0,0 +1,614 @@
+from __future__ import annotations
+
+import glob
+import multiprocessing as mp
+import os
+import queue
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .camera_runtime import CameraRuntime
+from .attendance_runtime import AttendanceRuntime
+from ..vision.dual_stream import MainView
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _worker_files(base: str) -> Dict[int, str]:
+    """Per-worker copies (<base>.w<index>) of a journal / outbox file, by index."""
+    out: Dict[int, str] = {}
+    for path in glob.glob(glob.escape(base) + ".w*"):
+        suffix = path[len(base) + 2 :]
+        if suffix.isdigit():
+            out[int(suffix)] = path
+    return out
+
+
+def adopt_worker_files(rt: AttendanceRuntime, keep: int = 0) -> None:
+    """
+    Pending attendance events / ERP jobs of worker slots that no longer run
+    (pool made smaller, or RECOGNITION_MODE no longer process) would never
+    ship: move the files of worker index >= keep into rt's own journal / outbox.
+    keep > 0 (pool worker 0) also takes the main process' file, unused in
+    process mode.
+    """
+    for store in (rt.journal, rt.erp_queue):
+        if store is None:
+            continue
+        base = re.sub(r"\.w\d+$", "", store.path)
+        orphans = [p for i, p in sorted(_worker_files(base).items()) if i >= keep]
+        if keep and os.path.exists(base):
+            orphans.insert(0, base)  # the pool's main process keeps no journal / outbox
+        for path in orphans:
+            if os.path.abspath(path) == os.path.abspath(store.path):
+                continue
+            try:
+                moved = store.adopt(path)
+            except Exception as e:
+                print(f"[RECOGNITION] could not adopt {path}: {e}")
+                continue
+            print(f"[RECOGNITION] adopted {moved} pending entries from {path}")
+
+
+class _Slot:
+    """
+    Shared-memory frame buffer of one camera (main process side).
+
+    Written only while the camera has no frame in flight, so the worker never
+    sees a half-written frame. Grows (new segment) when a larger frame arrives.
+    """
+
+    def __init__(self):
+        self.shm: Optional[shared_memory.SharedMemory] = None
+
+    def write(self, image: np.ndarray) -> Tuple[str, Tuple[int, ...]]:
+        if self.shm is None or self.shm.size < image.nbytes:
+            self.close()
+            self.shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        np.ndarray(image.shape, dtype=np.uint8, buffer=self.shm.buf)[...] = image
+        return self.shm.name, tuple(int(v) for v in image.shape)
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except Exception:
+            pass
+        self.shm = None
+
+
+@dataclass
+class _PoolCam:
+    camera_id: str
+    camera_name: str
+    ai_fps: float
+    worker: int
+    running: bool = True
+    ack: threading.Event = field(default_factory=threading.Event)  # set = nothing in flight
+    frame: _Slot = field(default_factory=_Slot)
+    main: _Slot = field(default_factory=_Slot)
+    thread: Optional[threading.Thread] = None
+    sent: int = 0
+    results: int = 0
+    # config last sent to the worker (see _sync_cfg)
+    sent_cfg: Optional[Tuple[Any, ...]] = None
+    sent_roi: Any = None
+    sent_det: Optional[Tuple[Any, ...]] = None
+
+
+@dataclass
+class _Proc:
+    index: int
+    process: Any = None
+    in_q: Any = None
+    cameras: Set[str] = field(default_factory=set)
+    inflight: int = 0  # frames handed over and not answered yet
+    sent: int = 0
+    results: int = 0
+    restarts: int = 0
+    snapshot: Dict[str, Any] = field(default_factory=dict)  # last stats message
+    snapshot_ts: float = 0.0
+
+
+class RecognitionProcessPool:
+    """
+    RECOGNITION_MODE=process: recognition runs in RECOGNITION_PROCS worker
+    processes (spawned), each with its own AttendanceRuntime, models and GIL.
+    Cameras are sharded to the least loaded process when they start.
+
+    - main process: one feeder thread per camera waits for a new frame (capped
+      at ai_fps), copies it into the camera's shared-memory slot and sends a
+      small ("frame", ...) message; a camera has at most one frame in flight,
+      the newest frame wins while the worker is busy
+    - worker: gate -> detect -> track -> attendance -> overlay -> JPEG, and
+      sends the JPEG bytes back on one results queue, with the attendance
+      voice events and a stats snapshot every RECOGNITION_PROC_STATS_S
+    - camera config (company, attendance on/off, ROI, detector size) lives in
+      the main process AttendanceRuntime (role pool_main) as before and is
+      forwarded to the owning worker when it changes
+    - gallery: only the main process syncs with the backend; workers reload
+      the snapshots it saves to GALLERY_CACHE_DIR (GallerySync follow mode)
+    - journal / ERP outbox / FAS exist only in the workers, one journal and
+      outbox file per worker slot (<path>.w<index>)
+
+    Each worker's ONNX / OpenMP / OpenCV thread pools are sized to its share
+    of the cores (RECOGNITION_PROC_THREADS, default cores / workers).
+
+    A worker that stops answering for RECOGNITION_PROC_TIMEOUT_S and is dead
+    is respawned and gets its cameras back.
+    """
+
+    def __init__(
+        self,
+        camera_rt: CameraRuntime,
+        attendance_rt: AttendanceRuntime,
+        runtime_kwargs: Dict[str, Any],
+        on_jpeg: Callable[[str, bytes], None],
+    ):
+        self.camera_rt = camera_rt
+        self.attendance_rt = attendance_rt
+        self.runtime_kwargs = dict(runtime_kwargs)
+        self.on_jpeg = on_jpeg
+
+        self.size = _env_int("RECOGNITION_PROCS", 0) or max(1, (os.cpu_count() or 2) // 2)
+        # each worker gets its share of the cores for ORT / OpenMP / OpenCV
+        self.threads = _env_int("RECOGNITION_PROC_THREADS", 0) or max(1, (os.cpu_count() or 2) // self.size)
+        self.timeout_s = max(1.0, _env_float("RECOGNITION_PROC_TIMEOUT_S", 10.0))
+        self.stats_s = max(0.2, _env_float("RECOGNITION_PROC_STATS_S", 1.0))
+
+        # fork would copy the ONNX thread pools / locks of this process
+        self._ctx = mp.get_context("spawn")
+        self._out_q = None
+        self._procs: List[_Proc] = []
+        self._cams: Dict[str, _PoolCam] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self._cpu_sample = (time.process_time(), time.time())
+        self._main_cpu_pct = 0.0
+
+    # -------------------------
+    # Cameras
+    # -------------------------
+    def add(self, camera_id: str, camera_name: str, ai_fps: float) -> None:
+        self._start()
+        cid = str(camera_id)
+        with self._lock:
+            cam = self._cams.get(cid)
+            if cam is not None:
+                cam.ai_fps = float(ai_fps)
+                cam.camera_name = camera_name
+                return
+            proc = min(self._procs, key=lambda p: (len(p.cameras), p.index))
+            proc.cameras.add(cid)
+            cam = _PoolCam(camera_id=cid, camera_name=camera_name, ai_fps=float(ai_fps), worker=proc.index)
+            cam.ack.set()
+            cam.thread = threading.Thread(target=self._feed, args=(cam,), daemon=True)
+            self._cams[cid] = cam
+        cam.thread.start()
+
+    def remove(self, camera_id: str) -> None:
+        cid = str(camera_id)
+        with self._lock:
+            cam = self._cams.pop(cid, None)
+            if cam is None:
+                return
+            proc = self._procs[cam.worker]
+            proc.cameras.discard(cid)
+        cam.running = False
+        if cam.thread is not None:
+            cam.thread.join(timeout=1.0)
+        self._send(proc, ("remove", cid))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            cams = list(self._cams.values())
+            self._cams.clear()
+        for cam in cams:
+            cam.running = False
+        for proc in self._procs:
+            self._send(proc, ("stop",))
+        for proc in self._procs:
+            if proc.process is not None:
+                proc.process.join(timeout=2.0)
+                if proc.process.is_alive():
+                    proc.process.terminate()
+        for cam in cams:
+            cam.frame.close()
+            cam.main.close()
+
+    # -------------------------
+    # Stats (merged worker snapshots)
+    # -------------------------
+    def stats(self) -> Dict[str, Any]:
+        cpu, wall = time.process_time(), time.time()
+        cpu0, wall0 = self._cpu_sample
+        if wall - wall0 >= 0.5:
+            self._main_cpu_pct = 100.0 * (cpu - cpu0) / (wall - wall0)
+            self._cpu_sample = (cpu, wall)
+
+        procs = []
+        for p in self._procs:
+            snap = p.snapshot
+            try:
+                queued = p.in_q.qsize()
+            except Exception:  # NotImplementedError on macOS
+                queued = None
+            procs.append(
+                {
+                    "index": p.index,
+                    "pid": snap.get("pid"),
+                    "alive": bool(p.process is not None and p.process.is_alive()),
+                    "cameras": sorted(p.cameras),
+                    "queue_depth": p.inflight,
+                    "queued_messages": queued,
+                    "sent": p.sent,
+                    "results": p.results,
+                    "restarts": p.restarts,
+                    "cpu_pct": snap.get("cpu_pct"),
+                    "rss_mb": snap.get("rss_mb"),
+                    "frame_ms": snap.get("frame_ms"),
+                    "decision": snap.get("decision"),
+                    "http": snap.get("http"),
+                    "stats_age_s": round(wall - p.snapshot_ts, 1) if p.snapshot_ts else None,
+                }
+            )
+        return {
+            "size": self.size,
+            "threads_per_worker": self.threads,
+            "main": {"pid": os.getpid(), "cpu_pct": round(self._main_cpu_pct, 1)},
+            "processes": procs,
+        }
+
+    def merged(self, key: str) -> Dict[str, Any]:
+        """Union of one per-camera stats section (embeddings, detection, motion, gallery)."""
+        out: Dict[str, Any] = {}
+        for p in self._procs:
+            out.update(p.snapshot.get(key) or {})
+        return out
+
+    def erp_retry_dead(self) -> int:
+        """Ask every worker to requeue its dead-lettered ERP jobs; returns workers asked."""
+        for p in list(self._procs):
+            self._send(p, ("erp_retry_dead",))
+        return len(self._procs)
+
+    def track_stats(self, camera_id: str) -> List[Dict[str, Any]]:
+        cam = self._cams.get(str(camera_id))
+        if cam is None:
+            return []
+        return list((self._procs[cam.worker].snapshot.get("tracks") or {}).get(cam.camera_id, []))
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._out_q = self._ctx.Queue()
+            self._procs = [_Proc(index=i) for i in range(self.size)]
+            for p in self._procs:
+                self._spawn(p)
+        threading.Thread(target=self._collect, daemon=True).start()
+        print(f"[RECOGNITION] process pool: {self.size} workers")
+
+    def _spawn(self, proc: _Proc) -> None:
+        proc.in_q = self._ctx.Queue()
+        proc.process = self._ctx.Process(
+            target=_worker_main,
+            args=(proc.index, self.size, self.runtime_kwargs, proc.in_q, self._out_q, self.stats_s),
+            name=f"recognition-{proc.index}",
+            daemon=True,
+        )
+        # a spawned child copies os.environ when started, and its thread pools
+        # size themselves from it on import (before _worker_main runs);
+        # callers hold self._lock, so spawns don't race on the environment
+        env = {"ORT_INTRA_OP_THREADS": str(self.threads), "OMP_NUM_THREADS": str(self.threads)}
+        saved = {k: os.environ.get(k) for k in env}
+        os.environ.update(env)
+        try:
+            proc.process.start()
+        finally:
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+        proc.inflight = 0
+
+    def _respawn(self, proc: _Proc) -> None:
+        with self._lock:
+            if proc.process is not None and proc.process.is_alive():
+                return
+            print(f"[RECOGNITION] worker {proc.index} died (exit={proc.process.exitcode}), respawning")
+            proc.restarts += 1
+            proc.snapshot = {}
+            self._spawn(proc)
+            for cam in self._cams.values():
+                if cam.worker == proc.index:
+                    # the new process knows nothing: resend config, nothing in flight
+                    cam.sent_cfg = cam.sent_roi = cam.sent_det = None
+                    cam.ack.set()
+
+    def _send(self, proc: _Proc, msg: Tuple[Any, ...]) -> None:
+        try:
+            proc.in_q.put(msg)
+        except Exception as e:
+            print(f"[RECOGNITION] worker {proc.index} send failed: {e}")
+
+    def _sync_cfg(self, cam: _PoolCam, proc: _Proc) -> None:
+        rt = self.attendance_rt
+        cid = cam.camera_id
+        changes: Dict[str, Any] = {}
+        cfg = (cam.camera_name, rt.company_for_camera(cid), rt.is_attendance_enabled(cid))
+        if cfg != cam.sent_cfg:
+            changes.update(name=cfg[0], company_id=cfg[1], attendance=cfg[2])
+            cam.sent_cfg = cfg
+            # this process syncs the gallery; the workers load its disk snapshots
+            rt.gallery_sync.get(cfg[1])
+        roi = rt.get_roi(cid)
+        if roi is not cam.sent_roi:
+            changes["roi"] = None if roi is None else (roi.to_json(), roi.pad)
+            cam.sent_roi = roi
+        det = rt.det_policy.config(cid)
+        if det is not None and det != cam.sent_det:
+            changes["det"] = det
+            cam.sent_det = det
+        if changes:
+            self._send(proc, ("cfg", cid, changes))
+
+    def _feed(self, cam: _PoolCam) -> None:
+        last_t = 0.0
+        last_seq = 0
+        cid = cam.camera_id
+        while cam.running:
+            frame = self.camera_rt.wait_for_frame(cid, after_seq=last_seq, timeout=0.5)
+            if frame is None:
+                continue
+            wait = 1.0 / max(0.5, cam.ai_fps) - (time.time() - last_t)
+            if wait > 0:
+                time.sleep(wait)
+
+            # backpressure: one frame in flight per camera, the newest one wins
+            proc = self._procs[cam.worker]
+            if not cam.ack.wait(timeout=self.timeout_s):
+                if not proc.process.is_alive():
+                    self._respawn(proc)
+                continue
+            if not cam.running:
+                break
+            frame = self.camera_rt.get_latest(cid) or frame
+            last_t = time.time()
+            last_seq = frame.seq
+
+            self._sync_cfg(cam, proc)
+            name, shape = cam.frame.write(frame.image)
+            main_name = main_shape = None
+            main = self.camera_rt.get_main_frame(cid, frame.ts)
+            if MainView.pair(frame.shape, main) is not None:
+                main_name, main_shape = cam.main.write(main.image)
+
+            cam.ack.clear()
+            cam.sent += 1
+            proc.sent += 1
+            proc.inflight += 1
+            self._send(proc, ("frame", cid, frame.seq, name, shape, main_name, main_shape))
+
+        # the worker may still read the slot: release it once answered
+        cam.ack.wait(timeout=self.timeout_s)
+        cam.frame.close()
+        cam.main.close()
+
+    def _collect(self) -> None:
+        while True:
+            try:
+                msg = self._out_q.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except Exception as e:
+                print(f"[RECOGNITION] results queue failed: {e}")
+                time.sleep(1.0)
+                continue
+            kind, index = msg[0], msg[1]
+            proc = self._procs[index]
+            if kind == "result":
+                _, _, cid, jpg = msg
+                proc.results += 1
+                proc.inflight = max(0, proc.inflight - 1)
+                if jpg is not None:
+                    self.on_jpeg(cid, jpg)
+                cam = self._cams.get(cid)
+                if cam is not None:
+                    cam.results += 1
+                    cam.ack.set()
+            elif kind == "voice":
+                ev = msg[2]
+                self.attendance_rt.push_voice_event(
+                    employee_id=ev["employee_id"],
+                    name=ev["name"],
+                    camera_id=ev["camera_id"],
+                    camera_name=ev["camera_name"],
+                )
+            elif kind == "stats":
+                proc.snapshot = msg[2]
+                proc.snapshot_ts = time.time()
+
+
+# --------------------------------------------------
+# Worker process
+# --------------------------------------------------
+class _Views:
+    """Attached shared-memory segments of one worker, by (camera, kind)."""
+
+    def __init__(self):
+        self._shm: Dict[Tuple[str, str], shared_memory.SharedMemory] = {}
+
+    def get(self, cid: str, kind: str, name: str, shape) -> np.ndarray:
+        key = (cid, kind)
+        shm = self._shm.get(key)
+        if shm is None or shm.name != name:
+            self._close(key)
+            # spawned workers share the main process' resource tracker, so
+            # attaching registers nothing new; the main process unlinks
+            shm = self._shm[key] = shared_memory.SharedMemory(name=name)
+        img = np.ndarray(tuple(shape), dtype=np.uint8, buffer=shm.buf)
+        img.flags.writeable = False  # same contract as Frame.image
+        return img
+
+    def drop(self, cid: str) -> None:
+        for key in [k for k in self._shm if k[0] == cid]:
+            self._close(key)
+
+    def _close(self, key) -> None:
+        shm = self._shm.pop(key, None)
+        if shm is not None:
+            try:
+                shm.close()
+            except Exception:  # BufferError: a view is still referenced
+                pass
+
+
+def _worker_main(index: int, size: int, runtime_kwargs: Dict[str, Any], in_q, out_q, stats_s: float) -> None:
+    import cv2
+
+    threads = _env_int("ORT_INTRA_OP_THREADS", 0)
+    if threads > 0:
+        cv2.setNumThreads(threads)
+
+    from .recognition_worker import recognize
+    from ..clients.http_client import http_stats
+    from ..vision.dual_stream import MainView
+    from ..vision.frame import Frame
+    from ..vision.model_registry import _rss_mb
+    from ..vision.roi import Roi
+
+    # one attendance journal / ERP outbox per worker slot: a respawned worker
+    # takes over (and ships) what its predecessor left pending
+    for env, default in (
+        ("ATT_JOURNAL_PATH", "data/attendance_journal.db"),
+        ("ERP_OUTBOX_PATH", "data/erp_outbox.db"),
+    ):
+        os.environ[env] = f"{os.getenv(env, default)}.w{index}"
+
+    rt = AttendanceRuntime(**runtime_kwargs, role="pool_worker")
+    rt.frames_transient = True  # frames are views of the shared-memory slots
+    if index == 0:
+        adopt_worker_files(rt, keep=size)
+    views = _Views()
+    names: Dict[str, str] = {}
+    voice_seq = 0
+    total = 0
+    frames = 0  # since the last stats message
+    frame_s = 0.0
+    last_stats = 0.0
+    cpu0, wall0 = time.process_time(), time.time()
+    print(f"[RECOGNITION] worker {index} ready pid={os.getpid()}")
+
+    while True:
+        try:
+            msg = in_q.get(timeout=stats_s)
+        except queue.Empty:
+            msg = None
+        except (EOFError, OSError):
+            break
+
+        if msg is not None:
+            kind = msg[0]
+            if kind == "stop":
+                break
+            if kind == "cfg":
+                _, cid, ch = msg
+                if "name" in ch:
+                    names[cid] = ch["name"]
+                    rt.set_company_for_camera(cid, ch["company_id"])
+                    rt.set_attendance_enabled(cid, ch["attendance"])
+                if "roi" in ch:
+                    rt.set_roi(cid, None if ch["roi"] is None else Roi.parse(ch["roi"][0], pad=ch["roi"][1]))
+                if "det" in ch:
+                    mode, size, tiles = ch["det"]
+                    rt.det_policy.set(cid, mode=mode, size=size, tiles=tiles)
+            elif kind == "erp_retry_dead":
+                if rt.erp_queue is not None:
+                    print(f"[ERP] worker {index} requeued {rt.erp_queue.retry_dead()} dead jobs")
+            elif kind == "remove":
+                cid = msg[1]
+                names.pop(cid, None)
+                views.drop(cid)
+                rt.motion_gate.reset(cid)
+                rt.det_policy.reset(cid)
+            elif kind == "frame":
+                _, cid, seq, name, shape, main_name, main_shape = msg
+                jpg = image = main = out = None
+                t0 = time.perf_counter()
+                try:
+                    image = views.get(cid, "frame", name, shape)
+                    main = None
+                    if main_name is not None:
+                        main = MainView.pair(
+                            image.shape,
+                            Frame(image=views.get(cid, "main", main_name, main_shape), seq=seq, ts=0.0),
+                        )
+                    out = recognize(rt, cid, names.get(cid, cid), image, main)
+                    if out is not None:
+                        ok, buf = cv2.imencode(".jpg", out, [int(cv2.IMWRITE_JPEG_QUALITY), 65])
+                        jpg = buf.tobytes() if ok else None
+                except Exception as e:
+                    print(f"[RECOGNITION] worker {index} frame failed cam={cid}: {e}")
+                image = main = out = None  # no view may outlive the slot
+                frames += 1
+                total += 1
+                frame_s += time.perf_counter() - t0
+                # answer even on failure: the camera's slot is free again
+                out_q.put(("result", index, cid, jpg))
+
+                ev = rt.get_voice_events(after_seq=voice_seq, limit=200)
+                for e in ev["events"]:
+                    out_q.put(("voice", index, e))
+                voice_seq = ev["latest_seq"]
+
+        now = time.time()
+        if now - last_stats >= stats_s:
+            cpu = time.process_time()
+            out_q.put(
+                (
+                    "stats",
+                    index,
+                    {
+                        "pid": os.getpid(),
+                        "cpu_pct": round(100.0 * (cpu - cpu0) / max(1e-6, now - wall0), 1),
+                        "rss_mb": _rss_mb(),
+                        "frames": total,
+                        "frame_ms": round(1000.0 * frame_s / max(1, frames), 1),
+                        "embeddings": rt.embedding_stats(),
+                        "detection": rt.det_policy.stats(),
+                        "motion": rt.motion_gate.stats(),
+                        "gallery": rt.gallery_sync.stats(),
+                        "decision": rt.decision_stats(),
+                        "http": http_stats(),
+                        "tracks": {cid: rt.track_stats(cid) for cid in names},
+                    },
+                )
+            )
+            cpu0, wall0, last_stats = cpu, now, now
+            frames, frame_s = 0, 0.0
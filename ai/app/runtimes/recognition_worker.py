@@ -1,14 +1,51 @@
 from __future__ import annotations
 
+import os
 import threading
 import time
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
 
 from .camera_runtime import CameraRuntime
 from .attendance_runtime import AttendanceRuntime
+from .batch_scheduler import BatchScheduler
+from .process_pool import RecognitionProcessPool, adopt_worker_files
+from ..vision.dual_stream import MainView
+
+
+def recognize(
+    attendance_rt: AttendanceRuntime,
+    camera_id: str,
+    camera_name: str,
+    image: np.ndarray,
+    main: Optional[MainView],
+) -> Optional[np.ndarray]:
+    """
+    One frame of the per-camera loop: the live frame on a static scene,
+    else the annotated frame. None when recognition failed.
+    """
+    # Static scene: show the live frame, skip detection
+    if not attendance_rt.wants_inference(camera_id, image):
+        return image
+
+    # Heavy work (capped)
+    t0 = time.time()
+    try:
+        annotated = attendance_rt.process_frame(
+            frame_bgr=image,
+            camera_id=camera_id,
+            name=camera_name,
+            main=main,
+        )
+    except Exception as e:
+        print(
+            f"[RECOGNITION] process_frame failed cam={camera_id}: {e}"
+        )
+        return None
+    attendance_rt.motion_gate.record_cost(camera_id, time.time() - t0)
+    return annotated
 
 
 class RecognitionWorker:
@@ -17,9 +54,24 @@ class RecognitionWorker:
     - reads latest raw frame from CameraRuntime
     - runs attendance/recognition at capped ai_fps (CPU-friendly)
     - stores latest annotated frame (and pre-encoded JPEG) for streaming
+
+    RECOGNITION_MODE:
+      - thread (default): one recognition thread per camera
+      - batch: one BatchScheduler thread serves every camera, ai_fps is the
+        camera's fair-share weight. ArcFace is batched across cameras, but
+        detection (the bulk of the work) is only batched when the detector
+        graph has a batch dimension; buffalo_l's does not, so frames are then
+        detected one at a time on that thread instead of in parallel
+      - process: cameras sharded across worker processes (see
+        RecognitionProcessPool); runtime_kwargs builds their AttendanceRuntime
     """
 
-    def __init__(self, camera_rt: CameraRuntime, attendance_rt: AttendanceRuntime):
+    def __init__(
+        self,
+        camera_rt: CameraRuntime,
+        attendance_rt: AttendanceRuntime,
+        runtime_kwargs: Optional[Dict[str, Any]] = None,
+    ):
         self.camera_rt = camera_rt
         self.attendance_rt = attendance_rt
 
@@ -36,11 +88,45 @@ class RecognitionWorker:
         # Per-camera config
         self._ai_fps: Dict[str, float] = {}
 
+        self.mode = str(os.getenv("RECOGNITION_MODE", "thread")).strip().lower()
+        self._scheduler: Optional[BatchScheduler] = None
+        if self.mode == "batch":
+            self._scheduler = BatchScheduler(
+                camera_rt=camera_rt,
+                attendance_rt=attendance_rt,
+                on_result=self._publish,
+            )
+        self._pool: Optional[RecognitionProcessPool] = None
+        if self.mode == "process":
+            self._pool = RecognitionProcessPool(
+                camera_rt=camera_rt,
+                attendance_rt=attendance_rt,
+                runtime_kwargs=runtime_kwargs or {},
+                on_jpeg=self._publish_jpeg,
+            )
+        else:
+            # leftovers of an earlier RECOGNITION_MODE=process run
+            adopt_worker_files(attendance_rt)
+
     def start(self, camera_id: str, camera_name: str, ai_fps: float = 10.0):
         """
         Start recognition worker for camera if not already running.
         ai_fps controls how often recognition runs. Streaming stays smooth regardless.
         """
+        if self._scheduler is not None:
+            self._running[camera_id] = True
+            self._ai_fps[camera_id] = float(ai_fps)
+            self._locks.setdefault(camera_id, threading.Lock())
+            self._scheduler.add(camera_id, camera_name, weight=float(ai_fps))
+            return
+
+        if self._pool is not None:
+            self._running[camera_id] = True
+            self._ai_fps[camera_id] = float(ai_fps)
+            self._locks.setdefault(camera_id, threading.Lock())
+            self._pool.add(camera_id, camera_name, ai_fps=float(ai_fps))
+            return
+
         if self._running.get(camera_id):
             # update fps dynamically
             self._ai_fps[camera_id] = float(ai_fps)
@@ -58,12 +144,17 @@ class RecognitionWorker:
 
     def stop(self, camera_id: str):
         self._running[camera_id] = False
+        if self._scheduler is not None:
+            self._scheduler.remove(camera_id)
+        if self._pool is not None:
+            self._pool.remove(camera_id)
         t = self._threads.get(camera_id)
         if t:
             t.join(timeout=1.0)
 
         self._threads.pop(camera_id, None)
         self._ai_fps.pop(camera_id, None)
+        self.attendance_rt.motion_gate.reset(camera_id)
 
         lock = self._locks.setdefault(camera_id, threading.Lock())
         with lock:
@@ -73,8 +164,18 @@ class RecognitionWorker:
     def get_latest_annotated(self, camera_id: str) -> Optional[np.ndarray]:
         lock = self._locks.setdefault(camera_id, threading.Lock())
         with lock:
-            f = self._latest_frame.get(camera_id)
-            return None if f is None else f.copy()
+            # published frames are read-only and never modified afterwards
+            frame = self._latest_frame.get(camera_id)
+            item = self._latest_jpg.get(camera_id)
+        if frame is None and item is not None and self._pool is not None:
+            # process mode only ships JPEGs back: decode on demand
+            frame = cv2.imdecode(np.frombuffer(item[0], dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is not None:
+                frame.flags.writeable = False
+                with lock:
+                    if self._latest_jpg.get(camera_id) is item:
+                        self._latest_frame[camera_id] = frame
+        return frame
 
     def get_latest_jpeg(self, camera_id: str) -> Optional[bytes]:
         lock = self._locks.setdefault(camera_id, threading.Lock())
@@ -82,43 +183,117 @@ class RecognitionWorker:
             item = self._latest_jpg.get(camera_id)
             return None if item is None else item[0]
 
+    def stats(self) -> Dict[str, object]:
+        out: Dict[str, object] = {
+            "mode": self.mode,
+            "cameras": {cid: {"ai_fps": fps} for cid, fps in self._ai_fps.items()},
+        }
+        if self._scheduler is not None:
+            out["scheduler"] = self._scheduler.stats()
+        if self._pool is not None:
+            # per-process CPU / RSS and queue depth (frames in flight)
+            out["pool"] = self._pool.stats()
+        else:
+            # FAS / attendance write queue: depth, drops, latency percentiles
+            out["decision"] = self.attendance_rt.decision_stats()
+        out["motion"] = self.runtime_stats("motion")
+        return out
+
+    def runtime_stats(self, section: str) -> Dict[str, Any]:
+        """
+        Per-camera AttendanceRuntime stats (embeddings | detection | motion |
+        gallery), merged from the worker processes in process mode.
+        """
+        if self._pool is not None:
+            return self._pool.merged(section)
+        rt = self.attendance_rt
+        return {
+            "embeddings": rt.embedding_stats,
+            "detection": rt.det_policy.stats,
+            "motion": rt.motion_gate.stats,
+            "gallery": rt.gallery_sync.stats,
+        }[section]()
+
+    def erp_retry_dead(self) -> Dict[str, Any]:
+        """
+        Requeue dead-lettered ERP punches: this process's outbox, plus (process
+        mode) each worker's own outbox, asynchronously.
+        """
+        q = self.attendance_rt.erp_queue
+        return {
+            "requeued": q.retry_dead() if q is not None else 0,
+            "workers_asked": self._pool.erp_retry_dead() if self._pool is not None else 0,
+        }
+
+    def refresh_gallery(self, company_id: Optional[str]) -> None:
+        """
+        Templates changed (enrollment): sync the company's gallery now. In
+        process mode the workers pick up the new disk snapshot within a second.
+        """
+        try:
+            self.attendance_rt.gallery_sync.refresh_now(company_id)
+        except Exception as e:
+            print(f"[RECOGNITION] gallery refresh failed company={company_id}: {e}")
+
+    def track_stats(self, camera_id: str) -> List[Dict[str, Any]]:
+        if self._pool is not None:
+            return self._pool.track_stats(camera_id)
+        return self.attendance_rt.track_stats(camera_id)
+
     def _loop(self, camera_id: str, camera_name: str):
         last_t = 0.0
+        last_seq = 0
 
         while self._running.get(camera_id, False):
             ai_fps = max(0.5, float(self._ai_fps.get(camera_id, 10.0)))
             period = 1.0 / ai_fps
 
-            now = time.time()
-            if (now - last_t) < period:
-                time.sleep(0.005)
-                continue
-            last_t = now
-
-            frame = self.camera_rt.get_frame(camera_id)
+            # Event-driven: sleep until a frame we have not processed yet arrives
+            frame = self.camera_rt.wait_for_frame(camera_id, after_seq=last_seq, timeout=0.5)
             if frame is None:
                 continue
 
-            # Heavy work (capped)
-            try:
-                annotated = self.attendance_rt.process_frame(
-                    frame_bgr=frame, camera_id=camera_id, name=camera_name
-                )
-            except Exception as e:
-                print(
-                    f"[RECOGNITION] process_frame failed cam={camera_id}: {e}"
-                )
-                continue
+            # Cap at ai_fps, then take whatever is newest at that moment
+            wait = period - (time.time() - last_t)
+            if wait > 0:
+                time.sleep(wait)
+                frame = self.camera_rt.get_latest(camera_id) or frame
+            last_t = time.time()
+            last_seq = frame.seq
 
-            # Pre-encode JPEG once (huge CPU win when multiple clients watch)
-            ok, jpg = cv2.imencode(
-                ".jpg", annotated, [int(cv2.IMWRITE_JPEG_QUALITY), 65]
+            annotated = recognize(
+                self.attendance_rt,
+                camera_id,
+                camera_name,
+                frame.image,
+                MainView.pair(frame.shape, self.camera_rt.get_main_frame(camera_id, frame.ts)),
             )
-            if not ok:
-                continue
-            jpg_bytes = jpg.tobytes()
+            if annotated is not None:
+                self._publish(camera_id, annotated)
+
+    def _publish(self, camera_id: str, annotated: np.ndarray) -> None:
+        # Pre-encode JPEG once (huge CPU win when multiple clients watch)
+        ok, jpg = cv2.imencode(
+            ".jpg", annotated, [int(cv2.IMWRITE_JPEG_QUALITY), 65]
+        )
+        if not ok:
+            return
+        jpg_bytes = jpg.tobytes()
+
+        lock = self._locks.setdefault(camera_id, threading.Lock())
+        with lock:
+            # camera may have been stopped while the batch was in flight
+            if not self._running.get(camera_id, False):
+                return
+            annotated.flags.writeable = False
+            self._latest_frame[camera_id] = annotated
+            self._latest_jpg[camera_id] = (jpg_bytes, time.time())
 
-            lock = self._locks.setdefault(camera_id, threading.Lock())
-            with lock:
-                self._latest_frame[camera_id] = annotated
-                self._latest_jpg[camera_id] = (jpg_bytes, time.time())
+    def _publish_jpeg(self, camera_id: str, jpg_bytes: bytes) -> None:
+        # process mode: the worker already encoded the overlay
+        lock = self._locks.setdefault(camera_id, threading.Lock())
+        with lock:
+            if not self._running.get(camera_id, False):
+                return
+            self._latest_frame.pop(camera_id, None)
+            self._latest_jpg[camera_id] = (jpg_bytes, time.time())
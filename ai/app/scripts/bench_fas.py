@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from typing import Callable, List
+
+import numpy as np
+from rich import print
+
+from ..fas.antispoof import AntiSpoofONNX
+
+
+def _crops(n: int, seed: int = 0):
+    """n (frame, bbox) pairs: 80..200 px faces in a 1080p frame."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    items = []
+    for _ in range(n):
+        s = int(rng.integers(80, 200))
+        x, y = int(rng.integers(0, 1920 - s)), int(rng.integers(0, 1080 - s))
+        items.append((frame, (x, y, x + s, y + s)))
+    return items
+
+
+def _legacy_score(model: AntiSpoofONNX, frame: np.ndarray, bbox) -> float:
+    """Previous predict(): _preprocess() + one session run per face."""
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = model._clip_bbox(bbox, w, h)
+    out = model.sess.run(None, {model.in_name: model._preprocess(frame[y1:y2, x1:x2])})
+    return float(model._parse_output_score(out))
+
+
+def _time_ms(fn: Callable[[], object], repeat: int) -> float:
+    fn()  # warm-up
+    ts: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        ts.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.median(ts))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Anti-spoofing throughput: per-face predict() vs predict_batch()")
+    ap.add_argument("--onnx", default=os.getenv("FAS_ONNX_PATH", "app/fas/models/fas.onnx"))
+    ap.add_argument("--batches", default="1,8,32", help="faces scored per call")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    model = AntiSpoofONNX(onnx_path=args.onnx)
+    _ = model.sess
+    print(
+        f"[bold]{args.onnx}[/bold] input batch={'fixed ' + str(model._fixed_batch) if model._fixed_batch else 'dynamic'}\n"
+        "batch  per-face(ms)  batched(ms)  per-face(faces/s)  batched(faces/s)  speedup"
+    )
+    for n in [int(x) for x in args.batches.split(",") if x.strip()]:
+        items = _crops(n)
+        t_loop = _time_ms(lambda: [_legacy_score(model, f, b) for f, b in items], args.repeat)
+        t_batch = _time_ms(lambda: model.predict_batch(items), args.repeat)
+
+        a = [_legacy_score(model, f, b) for f, b in items]
+        c = [r.score for r in model.predict_batch(items)]
+        assert np.allclose(a, c, atol=1e-4), "batched scores differ from per-face scores"
+
+        print(
+            f"{n:>5}  {t_loop:>12.2f}  {t_batch:>11.2f}  {1000.0 * n / t_loop:>17.0f}  "
+            f"{1000.0 * n / t_batch:>16.0f}  {t_loop / t_batch:>6.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+import tracemalloc
+from typing import Dict, List
+
+import numpy as np
+from rich import print
+
+from ..runtimes.camera_runtime import CameraRuntime
+
+
+def _producer(rt: CameraRuntime, cam: str, shape, fps: float, stop: threading.Event):
+    rng = np.random.default_rng(abs(hash(cam)) % (2**32))
+    base = rng.integers(0, 255, size=shape, dtype=np.uint8)
+    period = 1.0 / fps
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        # a decoder hands out a fresh buffer per frame (like cv2.VideoCapture.read)
+        rt.push_frame(cam, base.copy())
+        time.sleep(max(0.0, period - (time.perf_counter() - t0)))
+
+
+def _consumer(
+    rt: CameraRuntime,
+    cam: str,
+    fps: float,
+    copy_on_read: bool,
+    annotate: bool,
+    counts: Dict[str, int],
+    key: str,
+    stop: threading.Event,
+):
+    period = 1.0 / fps
+    sink = 0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        frame = rt.get_frame(cam)
+        if frame is not None:
+            if copy_on_read:
+                frame = frame.copy()  # previous FrameGrabber.read_latest()
+            if annotate:
+                out = frame.copy()  # the annotation stage always owns its canvas
+                out[:8, :8] = 0
+                if copy_on_read:
+                    out = out.copy()  # previous get_latest_annotated()
+                frame = out
+            sink += int(frame[0, 0, 0])
+            counts[key] = counts.get(key, 0) + 1
+        time.sleep(max(0.0, period - (time.perf_counter() - t0)))
+
+
+def _run(mode: str, cams: int, shape, cam_fps: float, rec_fps: float, viewers: int, seconds: float):
+    rt = CameraRuntime()
+    stop = threading.Event()
+    counts: Dict[str, int] = {}
+    copy_on_read = mode == "copy"
+
+    threads: List[threading.Thread] = []
+    for i in range(cams):
+        cam = f"cam{i}"
+        rt.start_relay(cam)
+        threads.append(threading.Thread(target=_producer, args=(rt, cam, shape, cam_fps, stop), daemon=True))
+        # recognition reader (annotates) + raw stream viewers
+        threads.append(
+            threading.Thread(
+                target=_consumer,
+                args=(rt, cam, rec_fps, copy_on_read, True, counts, "rec", stop),
+                daemon=True,
+            )
+        )
+        for v in range(viewers):
+            threads.append(
+                threading.Thread(
+                    target=_consumer,
+                    args=(rt, cam, cam_fps, copy_on_read, False, counts, "view", stop),
+                    daemon=True,
+                )
+            )
+
+    tracemalloc.start()
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join(timeout=2.0)
+    wall = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "reads_per_s": sum(counts.values()) / wall,
+        "rec_fps": counts.get("rec", 0) / wall / cams,
+        "cpu_pct": 100.0 * cpu / wall,
+        "peak_mb": peak / (1024.0 * 1024.0),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Frame hand-off: copy-per-read vs shared read-only frames")
+    ap.add_argument("--cams", type=int, default=8)
+    ap.add_argument("--width", type=int, default=1920)
+    ap.add_argument("--height", type=int, default=1080)
+    ap.add_argument("--cam-fps", type=float, default=25.0)
+    ap.add_argument("--rec-fps", type=float, default=10.0)
+    ap.add_argument("--viewers", type=int, default=1, help="raw stream readers per camera")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    args = ap.parse_args()
+
+    shape = (args.height, args.width, 3)
+    print(
+        f"[bold]{args.cams} cams {args.width}x{args.height} @ {args.cam_fps}fps, "
+        f"recognition {args.rec_fps}fps, {args.viewers} viewer(s)/cam[/bold]\n"
+        "mode     reads/s  rec fps/cam  cpu%   peak alloc(MB)"
+    )
+    for mode in ("copy", "shared"):
+        r = _run(mode, args.cams, shape, args.cam_fps, args.rec_fps, args.viewers, args.seconds)
+        print(
+            f"{mode:<7} {r['reads_per_s']:>8.0f}  {r['rec_fps']:>11.1f}  {r['cpu_pct']:>4.0f}  "
+            f"{r['peak_mb']:>14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, List
+
+import numpy as np
+from rich import print
+
+from ..vision.gallery_index import GalleryIndex
+from ..vision.recognizer import match_gallery
+
+
+def _synthetic_gallery(n_emp: int, angles: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ids = rng.standard_normal((n_emp, dim)).astype(np.float32)
+    ids /= np.linalg.norm(ids, axis=1, keepdims=True)
+    # angles = identity + pose noise (noise norm ~0.7 -> template/identity cos ~0.8)
+    noise = rng.standard_normal((n_emp, angles, dim)).astype(np.float32) * (0.7 / np.sqrt(dim))
+    embs = ids[:, None, :] + noise
+    embs /= np.linalg.norm(embs, axis=2, keepdims=True)
+    keys = np.repeat(np.arange(n_emp), angles)
+    return ids, embs.reshape(-1, dim), keys
+
+
+def _queries(ids: np.ndarray, n: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    pick = rng.choice(ids.shape[0], size=n, replace=True)
+    # live faces are noisier than enrollment (cos to identity ~0.6)
+    noise = rng.standard_normal((n, ids.shape[1])).astype(np.float32) * (1.3 / np.sqrt(ids.shape[1]))
+    q = ids[pick] + noise
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def _time_ms(fn: Callable[[], object], repeat: int) -> float:
+    fn()  # warm-up
+    ts: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        ts.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.median(ts))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="GalleryIndex matching latency vs gallery size")
+    ap.add_argument("--sizes", default="100,1000,5000,20000,50000", help="employees per gallery")
+    ap.add_argument("--angles", type=int, default=5)
+    ap.add_argument("--faces", type=int, default=8, help="faces matched per call (one frame/batch)")
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--nprobe", type=int, default=8, help="IVF lists scored per query")
+    args = ap.parse_args()
+
+    print(
+        f"[bold]faces/call={args.faces} angles={args.angles} dim={args.dim}[/bold]\n"
+        "employees  templates  per-face(ms)  batched(ms)  ivf(ms)  ivf-recall"
+    )
+    for n_emp in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        ids, embs, keys = _synthetic_gallery(n_emp, args.angles, args.dim)
+        q = _queries(ids, args.faces)
+
+        dense = GalleryIndex(embs, keys, agg="max", ann="none")
+        ivf = GalleryIndex(embs, keys, agg="max", ann="ivf", ann_min_employees=0, nprobe=args.nprobe)
+
+        # old path: one matmul + argmax per face over the template matrix
+        t_loop = _time_ms(lambda: [match_gallery(e, embs) for e in q], args.repeat)
+        t_dense = _time_ms(lambda: dense.match(q), args.repeat)
+        t_ivf = _time_ms(lambda: ivf.match(q), args.repeat)
+
+        exact_rows, _ = dense.match(q)
+        ivf_rows, _ = ivf.match(q)
+        recall = float(np.mean(exact_rows == ivf_rows))
+
+        print(
+            f"{n_emp:>9}  {embs.shape[0]:>9}  {t_loop:>12.2f}  {t_dense:>11.2f}  "
+            f"{t_ivf:>7.2f}  {recall:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Callable, List
+
+import numpy as np
+from rich import print
+
+from ..clients.template_codec import decode_templates_bin, encode_templates_bin
+from ..utils import l2_normalize
+
+
+def _synthetic_rows(n: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    embs = rng.standard_normal((n, dim)).astype(np.float32)
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+    rows = [
+        {
+            "id": f"ckx{i:021d}",
+            "employeeId": str(1000 + i // 5),
+            "employeeName": f"Employee {i // 5}",
+            "angle": ["front", "left", "right", "up", "down"][i % 5],
+            "modelName": "buffalo_l",
+            "updatedAt": "2026-01-01T00:00:00.000Z",
+        }
+        for i in range(n)
+    ]
+    return rows, embs
+
+
+def _time_ms(fn: Callable[[], object], repeat: int) -> float:
+    fn()  # warm-up
+    ts: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        ts.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.median(ts))
+
+
+def _load_json(payload: bytes) -> np.ndarray:
+    # previous GallerySync/_ensure_gallery path: parse, then one array per template
+    rows = json.loads(payload)
+    return np.stack([l2_normalize(np.asarray(t["embedding"], dtype=np.float32)) for t in rows])
+
+
+def _load_bin(payload: bytes) -> np.ndarray:
+    _, m = decode_templates_bin(payload)
+    m = m.astype(np.float32, copy=False)
+    return m / (np.linalg.norm(m, axis=1, keepdims=True) + 1e-12)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Gallery template load time: JSON vs binary blob")
+    ap.add_argument("--sizes", default="1000,10000,50000", help="templates per payload")
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print(
+        f"[bold]dim={args.dim} (decode + l2-normalize into a gallery matrix)[/bold]\n"
+        "templates   json(MB)  json(ms)   f32(MB)  f32(ms)   f16(MB)  f16(ms)"
+    )
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        rows, embs = _synthetic_rows(n, args.dim)
+        js = json.dumps(
+            [dict(r, embedding=e) for r, e in zip(rows, embs.tolist())], separators=(",", ":")
+        ).encode("utf-8")
+        b32 = encode_templates_bin(rows, embs, dtype="f32")
+        b16 = encode_templates_bin(rows, embs, dtype="f16")
+
+        t_js = _time_ms(lambda: _load_json(js), args.repeat)
+        t32 = _time_ms(lambda: _load_bin(b32), args.repeat)
+        t16 = _time_ms(lambda: _load_bin(b16), args.repeat)
+
+        mb = 1024.0 * 1024.0
+        print(
+            f"{n:>9}  {len(js) / mb:>9.1f}  {t_js:>8.1f}  {len(b32) / mb:>8.1f}  {t32:>7.1f}  "
+            f"{len(b16) / mb:>8.1f}  {t16:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
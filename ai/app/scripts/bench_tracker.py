@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import argparse
+import time
+from typing import List, Tuple
+
+import numpy as np
+from rich import print
+
+from ..vision.tracker import SimpleTracker
+
+
+def _scene(n: int, frames: int, seed: int, width: int = 1920, height: int = 1080):
+    """n faces walking across the frame with detector jitter and a few misses per frame."""
+    rng = np.random.default_rng(seed)
+    size = rng.uniform(40, 140, n)
+    pos = np.stack([rng.uniform(0, width, n), rng.uniform(0, height, n)], axis=1)
+    vel = rng.normal(0, 6, (n, 2))
+    emp = np.where(rng.random(n) < 0.7, np.arange(n), -1)
+
+    out: List[List[Tuple[np.ndarray, str, int, float]]] = []
+    for _ in range(frames):
+        pos = (pos + vel) % [width, height]
+        dets = []
+        for i in range(n):
+            if rng.random() < 0.05:
+                continue  # missed detection
+            c = pos[i] + rng.normal(0, 2, 2)
+            s = size[i] * rng.uniform(0.95, 1.05)
+            bbox = np.array([c[0] - s / 2, c[1] - s / 2, c[0] + s / 2, c[1] + s / 2])
+            name = f"emp{emp[i]}" if emp[i] != -1 else "Unknown"
+            dets.append((bbox, name, int(emp[i]), 0.6 if emp[i] != -1 else 0.0))
+        rng.shuffle(dets)
+        out.append(dets)
+    return out
+
+
+def _run(method: str, scene) -> Tuple[float, float]:
+    tr = SimpleTracker(iou_threshold=0.35, max_age_frames=30, assign_method=method)
+    times = []
+    for idx, dets in enumerate(scene, start=1):
+        t0 = time.perf_counter()
+        tr.update(idx, dets)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.median(times)), float(np.percentile(times, 95))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SimpleTracker.update() cost vs number of faces")
+    ap.add_argument("--faces", type=str, default="1,5,10,30,60,100")
+    ap.add_argument("--frames", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    print("[bold]faces  method     p50 ms   p95 ms[/bold]")
+    for n in [int(x) for x in args.faces.split(",") if x.strip()]:
+        scene = _scene(n, args.frames, args.seed)
+        for method in ("auto", "greedy"):
+            p50, p95 = _run(method, scene)
+            print(f"{n:>5}  {method:<8} {p50:>8.3f} {p95:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
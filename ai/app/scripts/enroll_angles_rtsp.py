@@ -102,6 +102,7 @@ def main():
                 if frame is None:
                     cv2.waitKey(1)
                     continue
+                frame = frame.copy()  # shared read-only frame; this loop draws on it
 
             dets = recog.detect_and_embed(frame)
             det = None
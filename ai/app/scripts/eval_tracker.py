@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import argparse
+import json
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from rich import print
+
+from ..vision.tracker import SimpleTracker, assign, iou_matrix
+
+# one frame: list of (x1, y1, x2, y2, gt_id) ; gt_id = -1 when the sequence has no labels
+Sequence = List[List[Tuple[float, float, float, float, int]]]
+
+
+def _synthetic(n: int, frames: int, seed: int, width: int = 1280, height: int = 720) -> Sequence:
+    """Faces walking in straight lines (some crossing) with detector jitter and misses."""
+    rng = np.random.default_rng(seed)
+    size = rng.uniform(50, 120, n)
+    pos = np.stack([rng.uniform(0, width, n), rng.uniform(0, height, n)], axis=1)
+    vel = rng.uniform(-8, 8, (n, 2))
+    seq: Sequence = []
+    for _ in range(frames):
+        pos = pos + vel
+        # bounce on the borders
+        for k, lim in ((0, width), (1, height)):
+            out = (pos[:, k] < 0) | (pos[:, k] > lim)
+            vel[out, k] *= -1
+            pos[:, k] = np.clip(pos[:, k], 0, lim)
+        boxes = []
+        for i in range(n):
+            if rng.random() < 0.05:
+                continue
+            c = pos[i] + rng.normal(0, 2, 2)
+            s = size[i] * rng.uniform(0.95, 1.05)
+            boxes.append((c[0] - s / 2, c[1] - s / 2, c[0] + s / 2, c[1] + s / 2, i))
+        seq.append(boxes)
+    return seq
+
+
+def _load(path: str) -> Sequence:
+    seq: Sequence = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            seq.append(
+                [
+                    (float(b[0]), float(b[1]), float(b[2]), float(b[3]), int(b[4]) if len(b) > 4 else -1)
+                    for b in row.get("boxes", [])
+                ]
+            )
+    return seq
+
+
+def _record(source: str, out_path: str, max_frames: int) -> None:
+    """Run the detector on every frame of a video / RTSP source, one JSON line per frame."""
+    import cv2
+
+    from ..vision.recognizer import FaceRecognizer
+
+    rec = FaceRecognizer(use_gpu=False)
+    cap = cv2.VideoCapture(source)
+    n = 0
+    with open(out_path, "w", encoding="utf-8") as f:
+        while n < max_frames:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            dets = rec.detect(frame)
+            f.write(json.dumps({"frame": n, "boxes": [[round(float(v), 1) for v in d.bbox[:4]] for d in dets]}) + "\n")
+            n += 1
+    cap.release()
+    print(f"recorded {n} frames -> {out_path}")
+
+
+def _track(seq: Sequence, stride: int, vel_beta: float) -> List[List[Tuple[np.ndarray, int]]]:
+    """Per frame: (track box, track id) as drawn, detection only every `stride` frames."""
+    tr = SimpleTracker(
+        iou_threshold=0.35,
+        max_age_frames=10 * stride,  # same scaling as AttendanceRuntime
+        smooth_alpha=0.55,
+        center_dist_threshold=140.0,
+        vel_beta=vel_beta,
+    )
+    out = []
+    for idx, boxes in enumerate(seq, start=1):
+        if (idx - 1) % stride == 0:
+            tracks = tr.update(idx, [(np.array(b[:4]), "Unknown", -1, 0.0) for b in boxes])
+        else:
+            tracks = tr.predict(idx)
+        out.append([(tr.box(t, idx), t.track_id) for t in tracks])
+    return out
+
+
+def _score(seq: Sequence, tracked, ref: Optional[List[List[int]]] = None) -> Dict[str, float]:
+    """
+    ID switches (a labelled face changes track id), coverage (share of faces
+    covered by a drawn box with IoU >= 0.3, all frames) and mean IoU.
+    Without labels the stride-1 track ids (ref) are the ground truth.
+    """
+    last: Dict[int, int] = {}
+    switches = covered = total = 0
+    ious: List[float] = []
+    for f, (boxes, tracks) in enumerate(zip(seq, tracked)):
+        if not boxes:
+            continue
+        total += len(boxes)
+        if not tracks:
+            continue
+        gt = np.array([b[:4] for b in boxes], dtype=float)
+        tb = np.stack([t[0] for t in tracks])
+        m = iou_matrix(gt, tb)
+        for g, t in assign(m, m >= 0.3):
+            covered += 1
+            ious.append(float(m[g, t]))
+            gid = boxes[g][4] if ref is None else ref[f][g]
+            if gid < 0:
+                continue
+            tid = tracks[t][1]
+            if gid in last and last[gid] != tid:
+                switches += 1
+            last[gid] = tid
+    return {
+        "id_switches": switches,
+        "coverage": covered / max(1, total),
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+    }
+
+
+def _ref_ids(seq: Sequence, vel_beta: float) -> List[List[int]]:
+    """Unlabelled sequence: label each box with the track id of a stride-1 run."""
+    tracked = _track(seq, 1, vel_beta)
+    ref: List[List[int]] = []
+    for boxes, tracks in zip(seq, tracked):
+        ids = [-1] * len(boxes)
+        if boxes and tracks:
+            gt = np.array([b[:4] for b in boxes], dtype=float)
+            m = iou_matrix(gt, np.stack([t[0] for t in tracks]))
+            for g, t in assign(m, m >= 0.5):
+                ids[g] = tracks[t][1]
+        ref.append(ids)
+    return ref
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Tracker ID switches vs detection stride")
+    ap.add_argument("--sequence", type=str, default="", help="bbox JSONL ({frame, boxes:[[x1,y1,x2,y2(,id)]]})")
+    ap.add_argument("--record", type=str, default="", help="video/RTSP source to record a sequence from")
+    ap.add_argument("--out", type=str, default="data/tracker_seq.jsonl")
+    ap.add_argument("--max-frames", type=int, default=3000)
+    ap.add_argument("--strides", type=str, default="1,2,3,4,5")
+    ap.add_argument("--faces", type=int, default=4, help="synthetic scene (no --sequence)")
+    ap.add_argument("--frames", type=int, default=600)
+    ap.add_argument("--beta", type=float, default=0.2, help="velocity gain of the motion model")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    if args.record:
+        _record(args.record, args.out, args.max_frames)
+        return
+
+    seq = _load(args.sequence) if args.sequence else _synthetic(args.faces, args.frames, args.seed)
+    labelled = any(b[4] >= 0 for boxes in seq for b in boxes)
+    ref = None if labelled else _ref_ids(seq, args.beta)
+    print(
+        f"[bold]{len(seq)} frames, {sum(len(b) for b in seq)} boxes, "
+        f"{'labelled' if labelled else 'unlabelled (reference = stride 1)'}[/bold]\n"
+        "stride  model      id_switches  coverage  mean_iou"
+    )
+    for stride in [int(x) for x in args.strides.split(",") if x.strip()]:
+        for model, beta in (("fixed", 0.0), ("velocity", args.beta)):
+            r = _score(seq, _track(seq, stride, beta), ref)
+            print(
+                f"{stride:>6}  {model:<9} {r['id_switches']:>12}  {r['coverage']:>8.3f}  {r['mean_iou']:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -69,7 +69,6 @@ def main():
 
     last_logged = {}
     frame_idx = 0
-    last_dets = []
 
     ai_fps = float(cfg.runtime.ai_fps)
     detect_every = int(cfg.runtime.detect_every_n_frames)
@@ -82,11 +81,13 @@ def main():
         if frame is None:
             cv2.waitKey(1)
             continue
+        frame = frame.copy()  # shared read-only frame; this loop draws on it
 
         t0 = time.time()
         frame_idx += 1
 
-        if frame_idx % detect_every == 0:
+        detected = frame_idx % detect_every == 0
+        if detected:
             face_dets = recog.detect_and_embed(frame)
             dets_for_tracker = []
             for fd in face_dets:
@@ -98,20 +99,20 @@ def main():
                     emp_id = -1
                     name = "Unknown"
                 dets_for_tracker.append((fd.bbox, name, emp_id, sim))
-            last_dets = dets_for_tracker
             tracks = tracker.update(frame_idx, dets_for_tracker)
         else:
-            tracks = tracker.update(frame_idx, last_dets)
+            # no detection this frame: tracks move on their velocity
+            tracks = tracker.predict(frame_idx)
 
         ts = now_iso()
         for tr in tracks:
-            b = tr.bbox.astype(int)
+            b = tracker.box(tr, frame_idx).astype(int)
             cv2.rectangle(frame, (b[0], b[1]), (b[2], b[3]), (0, 255, 0), 2)
             label = f"{tr.name} | sim={tr.similarity:.2f} | {ts}"
             cv2.putText(frame, label, (b[0], max(20, b[1] - 10)),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
 
-            if tr.employee_id != -1 and tr.name != "Unknown":
+            if detected and tr.employee_id != -1 and tr.name != "Unknown":
                 if tr.stable_name_hits < stable_required:
                     continue
 
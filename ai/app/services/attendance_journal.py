@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from ..clients.backend_client import BackendClient
+from ..clients.http_client import HttpError
+from ..utils import ensure_dir
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    company_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0,
+    shipped REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS events_pending ON events (shipped, next_try);
+"""
+
+
+class AttendanceJournal:
+    """
+    Local write-ahead log of attendance events (SQLite, WAL mode).
+
+    append() commits the event to disk and returns; a background shipper sends
+    pending events to the backend in batches (POST /attendance/bulk, up to
+    ATT_SHIP_BATCH per company and call). Every event carries an idempotency
+    key, so a batch that was stored but not acknowledged (timeout, restart) is
+    simply sent again and counted as duplicates by the backend.
+
+    - backend down: the batch stays pending, retried with exponential backoff
+      (ATT_SHIP_RETRY_MAX_S cap); events survive AI and backend restarts
+    - events the backend rejects (unknown camera...) are kept with their error
+      and not retried
+    - a backend without the bulk endpoint (404) gets one POST /attendance per event
+    - shipped events are deleted after ATT_JOURNAL_KEEP_DAYS
+    - adopt() takes over the pending events of a journal no process uses
+      anymore (per-worker files of a smaller process pool)
+    """
+
+    def __init__(
+        self,
+        client_for_company: Callable[[Optional[str]], BackendClient],
+        path: Optional[str] = None,
+    ):
+        self.client_for_company = client_for_company
+        self.path = path or os.getenv("ATT_JOURNAL_PATH", "data/attendance_journal.db")
+        self.batch = max(1, _env_int("ATT_SHIP_BATCH", 200))
+        self.linger_s = max(0.0, _env_float("ATT_SHIP_LINGER_S", 0.5))
+        self.retry_max_s = max(1.0, _env_float("ATT_SHIP_RETRY_MAX_S", 60.0))
+        self.keep_s = max(0.0, _env_float("ATT_JOURNAL_KEEP_DAYS", 7.0)) * 86400.0
+
+        ensure_dir(os.path.dirname(os.path.abspath(self.path)))
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # NORMAL: survives process crashes; FULL also survives power loss
+        self._db.execute(f"PRAGMA synchronous={os.getenv('ATT_JOURNAL_SYNC', 'NORMAL').strip().upper()}")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._no_bulk: Dict[str, bool] = {}  # company -> backend has no /attendance/bulk
+
+        self._batches = 0
+        self._shipped = 0
+        self._duplicates = 0
+        self._rejected = 0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+        self._last_ship_ms = 0.0
+
+        if self.pending_count() > 0:
+            self._start()  # leftovers of the previous run
+
+    # -------------------------
+    # Producer
+    # -------------------------
+    def append(
+        self,
+        company_id: Optional[str],
+        employee_id: str,
+        timestamp: str,
+        camera_id: Optional[str],
+        confidence: Optional[float],
+    ) -> str:
+        """Durably record one attendance event; returns its idempotency key."""
+        key = uuid.uuid4().hex
+        payload = {
+            "idempotencyKey": key,
+            "employeeId": str(employee_id),
+            "timestamp": timestamp,
+            "cameraId": camera_id,
+            "confidence": confidence,
+        }
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO events (key, company_id, payload, created) VALUES (?, ?, ?, ?)",
+                (key, str(company_id or ""), json.dumps(payload), time.time()),
+            )
+        self._start()
+        self._wake.set()
+        return key
+
+    def adopt(self, path: str) -> int:
+        """
+        Move the unshipped events of another journal file (a worker slot that
+        no longer runs) into this one and delete that file; returns how many.
+        """
+        with self._lock:
+            self._db.execute("ATTACH DATABASE ? AS orphan", (path,))
+            try:
+                # keys are unique: adopting the same file twice inserts nothing new
+                cur = self._db.execute(
+                    "INSERT OR IGNORE INTO events (key, company_id, payload, created, attempts) "
+                    "SELECT key, company_id, payload, created, attempts FROM orphan.events "
+                    "WHERE shipped IS NULL"
+                )
+                moved = max(0, int(cur.rowcount))
+            finally:
+                self._db.execute("DETACH DATABASE orphan")
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+        if moved:
+            self._start()
+            self._wake.set()
+        return moved
+
+    # -------------------------
+    # Stats
+    # -------------------------
+    def pending_count(self) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT COUNT(*) FROM events WHERE shipped IS NULL").fetchone()
+        return int(row[0])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending, oldest = self._db.execute(
+                "SELECT COUNT(*), MIN(created) FROM events WHERE shipped IS NULL"
+            ).fetchone()
+            rejected_kept = self._db.execute(
+                "SELECT COUNT(*) FROM events WHERE error IS NOT NULL"
+            ).fetchone()[0]
+        return {
+            "path": self.path,
+            "pending": int(pending),
+            "oldest_pending_s": round(time.time() - oldest, 1) if oldest else None,
+            "batches": self._batches,
+            "shipped": self._shipped,
+            "duplicates": self._duplicates,
+            "rejected": self._rejected,
+            "rejected_kept": int(rejected_kept),
+            "failures": self._failures,
+            "last_error": self._last_error,
+            "last_ship_ms": round(self._last_ship_ms, 1),
+        }
+
+    # -------------------------
+    # Shipper
+    # -------------------------
+    def _start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="attendance-shipper", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        last_prune = 0.0
+        while True:
+            self._wake.wait(timeout=1.0)
+            self._wake.clear()
+            # shift change: let a burst of events collect into one batch
+            if self.linger_s > 0:
+                time.sleep(self.linger_s)
+            try:
+                while self._ship_once():
+                    pass
+                if time.time() - last_prune > 3600.0:
+                    last_prune = time.time()
+                    self._prune()
+            except Exception as e:
+                print(f"[ATT-JOURNAL] shipper error: {e}")
+                time.sleep(1.0)
+
+    def _due(self) -> List[tuple]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, company_id, payload, attempts FROM events "
+                "WHERE shipped IS NULL AND next_try <= ? ORDER BY id LIMIT ?",
+                (time.time(), self.batch),
+            ).fetchall()
+
+    def _ship_once(self) -> bool:
+        """Ship one batch per company of the due events; True when a full batch went out."""
+        rows = self._due()
+        if not rows:
+            return False
+        by_company: Dict[str, List[tuple]] = {}
+        for r in rows:
+            by_company.setdefault(r[1], []).append(r)
+
+        progressed = False
+        for company_id, items in by_company.items():
+            t0 = time.perf_counter()
+            try:
+                rejected = self._send(company_id, [json.loads(r[2]) for r in items])
+            except Exception as e:
+                self._failures += 1
+                self._last_error = str(e)
+                print(f"[ATT-JOURNAL] ship failed company={company_id or '-'} events={len(items)}: {e}")
+                self._backoff(items)
+                continue
+            self._last_ship_ms = (time.perf_counter() - t0) * 1000.0
+            self._batches += 1
+            self._mark_shipped(items, rejected)
+            progressed = True
+        return progressed and len(rows) >= self.batch
+
+    def _send(self, company_id: str, events: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Send one company batch; -> {idempotencyKey: error} of events rejected for good."""
+        client = self.client_for_company(company_id or None)
+        if not self._no_bulk.get(company_id):
+            try:
+                res = client.create_attendance_bulk(events) or {}
+                self._shipped += int(res.get("inserted", 0))
+                self._duplicates += int(res.get("duplicates", 0))
+                rejected = {
+                    str(r.get("idempotencyKey")): str(r.get("error", "rejected"))
+                    for r in (res.get("rejected") or [])
+                }
+                self._rejected += len(rejected)
+                return rejected
+            except HttpError as e:
+                if e.status_code != 404:
+                    raise
+                print("[ATT-JOURNAL] backend has no /attendance/bulk, shipping one event per call")
+                self._no_bulk[company_id] = True
+
+        rejected: Dict[str, str] = {}
+        for ev in events:
+            try:
+                client.create_attendance(
+                    employee_id=ev["employeeId"],
+                    timestamp=ev["timestamp"],
+                    camera_id=ev.get("cameraId"),
+                    confidence=ev.get("confidence"),
+                )
+                self._shipped += 1
+            except HttpError as e:
+                if e.status_code is None or e.status_code >= 500:
+                    raise  # retry the rest of the batch later (already sent ones may repeat)
+                rejected[ev["idempotencyKey"]] = str(e)
+                self._rejected += 1
+        return rejected
+
+    def _mark_shipped(self, items: List[tuple], rejected: Dict[str, str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            for r in items:
+                key = json.loads(r[2])["idempotencyKey"]
+                self._db.execute(
+                    "UPDATE events SET shipped = ?, error = ? WHERE id = ?",
+                    (now, rejected.get(key), r[0]),
+                )
+            self._db.execute("COMMIT")
+
+    def _backoff(self, items: List[tuple]) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            for r in items:
+                attempts = int(r[3]) + 1
+                delay = min(self.retry_max_s, 2.0 ** min(attempts, 16))
+                self._db.execute(
+                    "UPDATE events SET attempts = ?, next_try = ? WHERE id = ?",
+                    (attempts, now + delay, r[0]),
+                )
+            self._db.execute("COMMIT")
+
+    def _prune(self) -> None:
+        if self.keep_s <= 0:
+            return
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM events WHERE shipped IS NOT NULL AND shipped < ?",
+                (time.time() - self.keep_s,),
+            )
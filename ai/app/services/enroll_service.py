@@ -3,7 +3,7 @@ from __future__ import annotations
 import threading
 import time
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 
@@ -94,8 +94,11 @@ class EnrollmentService:
         use_gpu: bool = True,
         model_name: str = "buffalo_l",
         min_face_size: int = 40,
+        on_saved: Optional[Callable[[Optional[str]], None]] = None,
     ):
         self.camera_rt = camera_rt
+        # called with the company id after templates were saved (gallery refresh)
+        self.on_saved = on_saved
         self.rec = FaceRecognizer(model_name=model_name, use_gpu=use_gpu, min_face_size=min_face_size)
         self.client = BackendClient()
         self.cfg = EnrollConfig()
@@ -349,6 +352,9 @@ class EnrollmentService:
             self._session.last_message = f"Saved angles: {saved_angles}" if saved_angles else "Nothing to save"
             self._session.last_update_at = now_iso()
 
+        if saved_angles and self.on_saved is not None:
+            self.on_saved(self.client.company_id)
+
         return {"ok": True, "saved_angles": saved_angles, "skipped_angles": skipped_angles}
 
     # -------- internal helpers --------
@@ -1,12 +1,30 @@
 from __future__ import annotations
 
-import queue
+import os
+import random
+import sqlite3
 import threading
 import time
 from dataclasses import dataclass
-from typing import Optional, Callable
+from typing import Any, Callable, Dict, List, Optional
 
 from ..clients.erp_client import ERPClient
+from ..clients.http_client import HttpError
+from ..utils import ensure_dir
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
 
 
 @dataclass
@@ -17,57 +35,296 @@ class ERPPushJob:
     in_location: str
 
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    emp_id TEXT NOT NULL,
+    attendance_date TEXT NOT NULL,
+    in_time TEXT NOT NULL,
+    in_location TEXT NOT NULL,
+    created REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0,
+    done REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, next_try);
+CREATE INDEX IF NOT EXISTS jobs_emp_day ON jobs (emp_id, attendance_date, status);
+"""
+
+
+def _retryable(e: Exception) -> bool:
+    """Transport errors, 5xx, 408 and 429 are retried; other 4xx go to dead-letter."""
+    code = getattr(e, "status_code", None)
+    if not isinstance(e, HttpError) or code is None:
+        return True
+    return code >= 500 or code in (408, 429)
+
+
 class ERPPushQueue:
     """
-    Background queue so ERP call doesn't slow down recognition FPS.
-    Includes retries.
+    Disk-backed ERP outbox so ERP calls never slow down recognition FPS.
+
+    enqueue() stores the punch in a SQLite outbox (ERP_OUTBOX_PATH) and
+    returns; ERP_PUSH_WORKERS threads push due jobs to the ERP.
+
+    - coalescing: a punch for an emp/date that already has a job waiting is
+      folded into it, keeping the earliest in_time (the ERP records inTime)
+    - retries: exponential backoff with jitter (ERP_RETRY_BASE_S ..
+      ERP_RETRY_MAX_S); after ERP_MAX_ATTEMPTS, or on a 4xx the ERP will
+      never accept, the job is dead-lettered (kept with its error, on_error
+      called); retry_dead() (POST /erp/retry-dead) puts them back in the queue
+    - batching: with ERP_BATCH_PATH set, up to ERP_PUSH_BATCH jobs go out as
+      one JSON array POST; otherwise one manual-attendance call per job
+    - jobs survive restarts; ones in flight during a crash are sent again
+    - adopt() takes over the jobs of an outbox no process uses anymore
+      (per-worker files of a smaller process pool)
+    - stats(): depth, oldest pending age, dead-letter count, push latency
     """
 
     def __init__(
         self,
         erp_client: ERPClient,
-        maxsize: int = 2000,
-        max_retries: int = 3,
-        retry_sleep_s: float = 1.0,
+        maxsize: int = 0,
+        max_retries: int = 0,
+        retry_sleep_s: float = 0.0,
         on_error: Optional[Callable[[Exception, ERPPushJob], None]] = None,
+        path: Optional[str] = None,
     ):
         self.erp = erp_client
-        self.q: "queue.Queue[ERPPushJob]" = queue.Queue(maxsize=maxsize)
-        self.max_retries = max_retries
-        self.retry_sleep_s = retry_sleep_s
         self.on_error = on_error
+        self.path = path or os.getenv("ERP_OUTBOX_PATH", "data/erp_outbox.db")
+        self.maxsize = int(maxsize) or max(1, _env_int("ERP_OUTBOX_MAX", 100000))
+        self.max_attempts = int(max_retries) or max(1, _env_int("ERP_MAX_ATTEMPTS", 8))
+        self.retry_base_s = float(retry_sleep_s) or max(0.1, _env_float("ERP_RETRY_BASE_S", 2.0))
+        self.retry_max_s = max(self.retry_base_s, _env_float("ERP_RETRY_MAX_S", 300.0))
+        self.workers = max(1, _env_int("ERP_PUSH_WORKERS", 2))
+        self.batch = max(1, _env_int("ERP_PUSH_BATCH", 20))
+        self.batch_path = os.getenv("ERP_BATCH_PATH", "").strip()
+        self.coalesce = _env_int("ERP_COALESCE", 1) == 1
+        self.keep_s = max(0.0, _env_float("ERP_OUTBOX_KEEP_DAYS", 7.0)) * 86400.0
+
+        ensure_dir(os.path.dirname(os.path.abspath(self.path)))
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+        # jobs claimed by a previous run that never finished
+        self._db.execute("UPDATE jobs SET status = 'pending' WHERE status = 'inflight'")
+        self._lock = threading.Lock()
+
+        self._sent = 0
+        self._coalesced = 0
+        self._retried = 0
+        self._dead = 0
+        self._rejected_full = 0
+        self._last_push_ms = 0.0
+        self._last_error: Optional[str] = None
 
         self._stop = threading.Event()
-        self._t = threading.Thread(target=self._run, daemon=True)
-        self._t.start()
+        self._wake = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"erp-push-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
 
+    # -------------------------
+    # Producer
+    # -------------------------
     def enqueue(self, job: ERPPushJob) -> bool:
-        try:
-            self.q.put_nowait(job)
-            return True
-        except queue.Full:
-            return False
+        """Store a punch in the outbox; False when the outbox is full."""
+        with self._lock:
+            if self.coalesce:
+                row = self._db.execute(
+                    "SELECT id, in_time FROM jobs WHERE emp_id = ? AND attendance_date = ? "
+                    "AND status = 'pending' ORDER BY id LIMIT 1",
+                    (job.emp_id, job.attendance_date),
+                ).fetchone()
+                if row is not None:
+                    if job.in_time < row[1]:
+                        self._db.execute(
+                            "UPDATE jobs SET in_time = ?, in_location = ? WHERE id = ?",
+                            (job.in_time, job.in_location, row[0]),
+                        )
+                    self._coalesced += 1
+                    return True
+            depth = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'inflight')"
+            ).fetchone()[0]
+            if depth >= self.maxsize:
+                self._rejected_full += 1
+                return False
+            self._db.execute(
+                "INSERT INTO jobs (emp_id, attendance_date, in_time, in_location, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (job.emp_id, job.attendance_date, job.in_time, job.in_location, time.time()),
+            )
+        self._wake.set()
+        return True
+
+    def retry_dead(self) -> int:
+        """Put dead-lettered jobs back in the queue; returns how many."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, next_try = 0, error = NULL "
+                "WHERE status = 'dead'"
+            )
+        self._wake.set()
+        return int(cur.rowcount)
+
+    def adopt(self, path: str) -> int:
+        """
+        Move the unsent jobs of another outbox file (a worker slot that no
+        longer runs) into this one and delete that file; returns how many.
+        """
+        with self._lock:
+            self._db.execute("ATTACH DATABASE ? AS orphan", (path,))
+            try:
+                self._db.execute("BEGIN")
+                cur = self._db.execute(
+                    "INSERT INTO jobs (emp_id, attendance_date, in_time, in_location, created, "
+                    "status, attempts, next_try, done, error) "
+                    "SELECT emp_id, attendance_date, in_time, in_location, created, "
+                    "CASE status WHEN 'dead' THEN 'dead' ELSE 'pending' END, attempts, 0, done, error "
+                    "FROM orphan.jobs WHERE status != 'sent'"
+                )
+                moved = max(0, int(cur.rowcount))
+                self._db.execute("DELETE FROM orphan.jobs WHERE status != 'sent'")
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            finally:
+                self._db.execute("DETACH DATABASE orphan")
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+        self._wake.set()
+        return moved
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    # -------------------------
+    # Metrics
+    # -------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = self._db.execute(
+                "SELECT MIN(created) FROM jobs WHERE status IN ('pending', 'inflight')"
+            ).fetchone()[0]
+        return {
+            "path": self.path,
+            "workers": self.workers,
+            "batch": self.batch if self.batch_path else 1,
+            "depth": int(counts.get("pending", 0)) + int(counts.get("inflight", 0)),
+            "inflight": int(counts.get("inflight", 0)),
+            "dead_letter": int(counts.get("dead", 0)),
+            "oldest_age_s": round(time.time() - oldest, 1) if oldest else None,
+            "sent": self._sent,
+            "coalesced": self._coalesced,
+            "retried": self._retried,
+            "dead": self._dead,
+            "rejected_full": self._rejected_full,
+            "last_push_ms": round(self._last_push_ms, 1),
+            "last_error": self._last_error,
+        }
+
+    # -------------------------
+    # Workers
+    # -------------------------
+    def _claim(self) -> List[tuple]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, attendance_date, emp_id, in_time, in_location, attempts FROM jobs "
+                "WHERE status = 'pending' AND next_try <= ? ORDER BY id LIMIT ?",
+                (time.time(), self.batch if self.batch_path else 1),
+            ).fetchall()
+            if rows:
+                self._db.execute(
+                    f"UPDATE jobs SET status = 'inflight' WHERE id IN ({','.join('?' * len(rows))})",
+                    [r[0] for r in rows],
+                )
+        return rows
 
     def _run(self):
+        last_prune = 0.0
         while not self._stop.is_set():
             try:
-                job = self.q.get(timeout=0.5)
-            except queue.Empty:
-                continue
-
-            last_err: Optional[Exception] = None
-            for _ in range(self.max_retries):
-                try:
-                    self.erp.manual_attendance(
-                        job.attendance_date, job.emp_id, job.in_time, job.in_location
-                    )
-                    last_err = None
-                    break
-                except Exception as e:
-                    last_err = e
-                    time.sleep(self.retry_sleep_s)
-
-            if last_err and self.on_error:
-                self.on_error(last_err, job)
-
-            self.q.task_done()
+                rows = self._claim()
+                if not rows:
+                    if time.time() - last_prune > 3600.0:
+                        last_prune = time.time()
+                        self._prune()
+                    self._wake.wait(timeout=1.0)
+                    self._wake.clear()
+                    continue
+                self._push(rows)
+            except Exception as e:
+                print(f"[ERP] outbox worker error: {e}")
+                time.sleep(1.0)
+
+    def _push(self, rows: List[tuple]) -> None:
+        jobs = [ERPPushJob(attendance_date=r[1], emp_id=r[2], in_time=r[3], in_location=r[4]) for r in rows]
+        t0 = time.perf_counter()
+        try:
+            if self.batch_path:
+                self.erp.manual_attendance_batch(
+                    [(j.attendance_date, j.emp_id, j.in_time, j.in_location) for j in jobs],
+                    path=self.batch_path,
+                )
+            else:
+                j = jobs[0]
+                self.erp.manual_attendance(j.attendance_date, j.emp_id, j.in_time, j.in_location)
+        except Exception as e:
+            self._last_error = str(e)
+            for r, job in zip(rows, jobs):
+                self._fail(r[0], int(r[5]) + 1, e, job)
+            return
+        self._last_push_ms = (time.perf_counter() - t0) * 1000.0
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                f"UPDATE jobs SET status = 'sent', done = ?, error = NULL "
+                f"WHERE id IN ({','.join('?' * len(rows))})",
+                [now] + [r[0] for r in rows],
+            )
+            self._sent += len(rows)
+
+    def _fail(self, job_id: int, attempts: int, err: Exception, job: ERPPushJob) -> None:
+        if attempts >= self.max_attempts or not _retryable(err):
+            with self._lock:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'dead', attempts = ?, done = ?, error = ? WHERE id = ?",
+                    (attempts, time.time(), str(err), job_id),
+                )
+                self._dead += 1
+            if self.on_error:
+                self.on_error(err, job)
+            return
+        # jitter: jobs that failed together (ERP outage) don't all retry together
+        delay = min(self.retry_max_s, self.retry_base_s * (2.0 ** (attempts - 1)))
+        delay *= random.uniform(0.5, 1.0)
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'pending', attempts = ?, next_try = ?, error = ? WHERE id = ?",
+                (attempts, time.time() + delay, str(err), job_id),
+            )
+            self._retried += 1
+
+    def _prune(self) -> None:
+        if self.keep_s <= 0:
+            return
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status = 'sent' AND done < ?",
+                (time.time() - self.keep_s,),
+            )
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils import ensure_dir
+
+
+def _safe_name(company_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", company_id) or "_"
+
+
+class GalleryCache:
+    """
+    On-disk per-company gallery snapshot:
+
+      <root>/<company>/embs-<token>.npy   float32 (N, D) l2-normalized templates
+      <root>/<company>/gallery.json       sidecar: version, saved_at, matrix file,
+                                          per-row template metadata
+
+    The matrix is written first under a new name, then the sidecar is replaced
+    with os.replace(), so readers see either the old or the new snapshot. Loads
+    memory-map the matrix (np.load mmap_mode="r").
+    """
+
+    SIDECAR = "gallery.json"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def companies(self) -> List[str]:
+        """Company ids that have a snapshot on disk."""
+        out: List[str] = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return out
+        for name in names:
+            try:
+                with open(os.path.join(self.root, name, self.SIDECAR), "r", encoding="utf-8") as f:
+                    cid = str(json.load(f).get("company_id") or "")
+            except Exception:
+                continue
+            if cid:
+                out.append(cid)
+        return out
+
+    def save(
+        self,
+        company_id: str,
+        version: str,
+        rows: List[Dict[str, Any]],
+        embs: np.ndarray,
+    ) -> None:
+        cdir = os.path.join(self.root, _safe_name(company_id))
+        ensure_dir(cdir)
+
+        token = str(int(time.time() * 1000))
+        matrix_name = f"embs-{token}.npy"
+        tmp_matrix = os.path.join(cdir, f".{matrix_name}.tmp")
+        with open(tmp_matrix, "wb") as f:
+            np.save(f, np.ascontiguousarray(embs, dtype=np.float32))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_matrix, os.path.join(cdir, matrix_name))
+
+        sidecar = os.path.join(cdir, self.SIDECAR)
+        tmp_sidecar = sidecar + ".tmp"
+        with open(tmp_sidecar, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "company_id": company_id,
+                    "version": version,
+                    "saved_at": time.time(),
+                    "matrix": matrix_name,
+                    "rows": rows,
+                },
+                f,
+                separators=(",", ":"),
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_sidecar, sidecar)
+
+        # drop matrices no longer referenced by the sidecar
+        for name in os.listdir(cdir):
+            if name.startswith("embs-") and name.endswith(".npy") and name != matrix_name:
+                try:
+                    os.remove(os.path.join(cdir, name))
+                except OSError:
+                    pass
+
+    def stamp(self, company_id: str) -> Optional[int]:
+        """Sidecar mtime (ns), changes with every save(); None if there is no snapshot."""
+        try:
+            return os.stat(os.path.join(self.root, _safe_name(company_id), self.SIDECAR)).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(
+        self, company_id: str
+    ) -> Optional[Tuple[str, float, List[Dict[str, Any]], np.ndarray]]:
+        """(version, saved_at, rows, memory-mapped embs) or None if missing/corrupt."""
+        cdir = os.path.join(self.root, _safe_name(company_id))
+        try:
+            with open(os.path.join(cdir, self.SIDECAR), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            embs = np.load(os.path.join(cdir, str(meta["matrix"])), mmap_mode="r")
+            rows = list(meta.get("rows") or [])
+            if embs.ndim != 2 or embs.shape[0] != len(rows):
+                raise ValueError(f"rows={len(rows)} matrix={embs.shape}")
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[GALLERY] ignoring unreadable disk snapshot company={company_id}: {e}")
+            return None
+        return str(meta.get("version") or ""), float(meta.get("saved_at") or 0.0), rows, embs
@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..clients.backend_client import BackendClient
+from .gallery_cache import GalleryCache
+from ..utils import l2_normalize
+from ..vision.gallery_index import GalleryIndex
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _env_str(name: str, default: str) -> str:
+    return str(os.getenv(name, default)).strip()
+
+
+def _l2_rows(x: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(x, axis=1, keepdims=True) + 1e-12
+    return (x / n).astype(np.float32, copy=False)
+
+
+@dataclass
+class _Template:
+    emp_id_str: str
+    name: str
+    angle: str
+    emb: np.ndarray
+    updated_at: str
+    tid: str = ""
+
+    def row(self) -> Dict[str, Any]:
+        """Metadata stored in the disk snapshot sidecar."""
+        return {
+            "id": self.tid,
+            "employeeId": self.emp_id_str,
+            "employeeName": self.name,
+            "angle": self.angle,
+            "updatedAt": self.updated_at,
+        }
+
+
+@dataclass
+class GallerySnapshot:
+    """Immutable view used by the recognition hot path (swapped atomically)."""
+
+    index: GalleryIndex
+    meta: List[Tuple[int, str, str]]  # per index row: (emp_int, emp_id_str, name)
+    version: str = ""  # max template updatedAt
+    synced_at: float = 0.0
+    source: str = "backend"  # "backend" | "disk"
+
+
+@dataclass
+class _CompanyState:
+    templates: Dict[str, _Template] = field(default_factory=dict)  # template id -> template
+    version: str = ""
+    last_sync: float = 0.0
+    last_full_sync: float = 0.0
+    last_sync_ms: float = 0.0
+    last_ok: float = 0.0  # last time the data was known to match the backend
+    source: str = ""
+    last_error: Optional[str] = None
+    syncs: int = 0
+    full_syncs: int = 0
+    disk_stamp: Optional[int] = None  # GalleryCache.stamp() of the last disk load
+
+
+EMPTY_SNAPSHOT = GallerySnapshot(
+    index=GalleryIndex(np.zeros((0, 512), dtype=np.float32), []), meta=[]
+)
+
+
+class GallerySync:
+    """
+    Background, versioned gallery sync per company.
+
+    - get() never blocks on HTTP: it returns the current snapshot and, the first
+      time a company is seen, schedules its initial load.
+    - every refresh_s the refresher thread asks the backend only for templates
+      with updatedAt >= the last version (delta), parses just those and swaps
+      in a rebuilt GalleryIndex.
+    - every full_sync_s (GALLERY_FULL_SYNC_S) a full reload catches deletions.
+    - on backend errors the last good snapshot keeps serving.
+    - every change is persisted to disk (GALLERY_CACHE_DIR, see GalleryCache);
+      cached companies are loaded at startup, so recognition works before the
+      first sync and through backend outages.
+
+    Transport (GALLERY_TRANSPORT): "bin" pulls /gallery/templates.bin (packed
+    float32/float16, decoded with np.frombuffer), "json" the plain endpoint.
+    A backend without the binary endpoint falls back to JSON automatically.
+
+    follow=True (process pool workers): a read-only copy that never calls the
+    backend; it reloads a company from the disk cache whenever the owning
+    process (the one syncing with the backend) has saved a new snapshot.
+    Without a cache dir it syncs with the backend itself.
+    """
+
+    def __init__(
+        self,
+        client_for_company: Callable[[Optional[str]], BackendClient],
+        emp_key: Callable[[Optional[str], str], int],
+        refresh_s: float = 5.0,
+        full_sync_s: Optional[float] = None,
+        cache_dir: Optional[str] = None,
+        follow: bool = False,
+    ):
+        self._client_for_company = client_for_company
+        self._emp_key = emp_key
+        self.refresh_s = max(0.5, float(refresh_s))
+        self.full_sync_s = float(
+            full_sync_s if full_sync_s is not None else _env_float("GALLERY_FULL_SYNC_S", 300.0)
+        )
+
+        self.transport = _env_str("GALLERY_TRANSPORT", "bin").lower()
+        self.bin_dtype = _env_str("GALLERY_BIN_DTYPE", "f32").lower()
+
+        self._snapshots: Dict[str, GallerySnapshot] = {}
+        self._states: Dict[str, _CompanyState] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        cache_dir = cache_dir if cache_dir is not None else _env_str("GALLERY_CACHE_DIR", "data/gallery_cache")
+        self._cache: Optional[GalleryCache] = GalleryCache(cache_dir) if cache_dir else None
+        self.follow = bool(follow) and self._cache is not None
+        if self.follow:
+            self.refresh_s = min(self.refresh_s, 1.0)  # a stat() per company
+        if self._cache is not None:
+            for cid in self._cache.companies():
+                self._register(cid)
+
+    # -------------------------
+    # Public
+    # -------------------------
+    def get(self, company_id: Optional[str]) -> GallerySnapshot:
+        cid = str(company_id or "").strip()
+        if not cid:
+            return EMPTY_SNAPSHOT
+        snap = self._snapshots.get(cid)
+        if snap is None:
+            self._register(cid)
+            return EMPTY_SNAPSHOT
+        return snap
+
+    def refresh_now(self, company_id: Optional[str]) -> None:
+        """Ask the refresher to sync a company on its next wake-up."""
+        cid = str(company_id or "").strip()
+        if not cid:
+            return
+        self._register(cid)
+        with self._lock:
+            self._states[cid].last_sync = 0.0
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            out: Dict[str, Dict[str, Any]] = {}
+            for cid, st in self._states.items():
+                snap = self._snapshots.get(cid)
+                out[cid] = {
+                    "source": st.source or None,
+                    "snapshot_age_s": None if not st.last_ok else round(now - st.last_ok, 1),
+                    "version": st.version,
+                    "templates": len(st.templates),
+                    "employees": len(snap.index) if snap else 0,
+                    "age_s": None if not st.last_sync else round(now - st.last_sync, 1),
+                    "last_sync_ms": round(st.last_sync_ms, 1),
+                    "syncs": st.syncs,
+                    "full_syncs": st.full_syncs,
+                    "last_error": st.last_error,
+                }
+            return out
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _register(self, cid: str) -> None:
+        with self._lock:
+            new = cid not in self._states
+            if new:
+                self._states[cid] = _CompanyState()
+        if new:
+            self._load_from_disk(cid)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while True:
+            now = time.time()
+            with self._lock:
+                due = [
+                    cid for cid, st in self._states.items() if (now - st.last_sync) >= self.refresh_s
+                ]
+            for cid in due:
+                if self.follow:
+                    self._follow_company(cid)
+                else:
+                    self._sync_company(cid)
+            self._wake.wait(timeout=self.refresh_s)
+            self._wake.clear()
+
+    def _sync_company(self, cid: str) -> None:
+        with self._lock:
+            st = self._states[cid]
+        now = time.time()
+        full = (not st.version) or (now - st.last_full_sync) >= self.full_sync_s
+        t0 = time.perf_counter()
+
+        try:
+            rows, embs = self._fetch(cid, None if full else st.version)
+        except Exception as e:
+            # keep serving the last good snapshot
+            with self._lock:
+                st.last_error = str(e)
+                st.last_sync = now
+            print(f"[GALLERY] sync failed company={cid}: {e}")
+            return
+
+        templates = {} if full else dict(st.templates)
+        version = "" if full else st.version
+        changed = full
+
+        for t, emb in zip(rows, embs):
+            emp_id_str = str(t.get("employeeId") or t.get("employee_id") or "").strip()
+            if not emp_id_str or emb is None:
+                continue
+            angle = str(t.get("angle") or "front")
+            tid = str(t.get("id") or f"{emp_id_str}:{angle}")
+            updated_at = str(t.get("updatedAt") or "")
+
+            prev = templates.get(tid)
+            if prev is not None and updated_at and prev.updated_at == updated_at:
+                continue  # delta uses >= version, so the boundary row comes back
+
+            name = str(
+                t.get("employeeName")
+                or t.get("employee_name")
+                or t.get("name")
+                or emp_id_str
+            )
+            templates[tid] = _Template(
+                emp_id_str=emp_id_str,
+                name=name,
+                angle=angle,
+                emb=emb,
+                updated_at=updated_at,
+                tid=tid,
+            )
+            version = max(version, updated_at)
+            changed = True
+
+        built = self._build(cid, templates, version, now) if changed else None
+        snap = built[0] if built else None
+
+        with self._lock:
+            st.templates = templates
+            st.version = version
+            st.last_sync = now
+            st.last_sync_ms = (time.perf_counter() - t0) * 1000.0
+            st.last_error = None
+            st.last_ok = now
+            st.source = "backend"
+            st.syncs += 1
+            if full:
+                st.full_syncs += 1
+                st.last_full_sync = now
+            if snap is not None:
+                # atomic swap: readers see either the old or the new snapshot
+                self._snapshots[cid] = snap
+            elif cid not in self._snapshots:
+                self._snapshots[cid] = EMPTY_SNAPSHOT
+
+        if built is not None and self._cache is not None:
+            try:
+                self._cache.save(cid, version, [t.row() for t in templates.values()], built[1])
+            except Exception as e:
+                print(f"[GALLERY] disk snapshot save failed company={cid}: {e}")
+
+    def _follow_company(self, cid: str) -> None:
+        """Read-only copy: reload the company if the owner saved a new snapshot."""
+        with self._lock:
+            st = self._states[cid]
+            st.last_sync = time.time()
+        stamp = self._cache.stamp(cid) if self._cache is not None else None
+        if stamp is not None and stamp != st.disk_stamp:
+            self._load_from_disk(cid)
+
+    def _load_from_disk(self, cid: str) -> None:
+        if self._cache is None:
+            return
+        t0 = time.perf_counter()
+        stamp = self._cache.stamp(cid)  # before reading: a save during the load is picked up next time
+        cached = self._cache.load(cid)
+        if cached is None:
+            return
+        version, saved_at, rows, embs = cached
+
+        templates: Dict[str, _Template] = {}
+        for i, r in enumerate(rows):
+            emp_id_str = str(r.get("employeeId") or "")
+            if not emp_id_str:
+                continue
+            templates[str(r.get("id") or i)] = _Template(
+                emp_id_str=emp_id_str,
+                name=str(r.get("employeeName") or emp_id_str),
+                angle=str(r.get("angle") or "front"),
+                emb=embs[i],
+                updated_at=str(r.get("updatedAt") or ""),
+                tid=str(r.get("id") or i),
+            )
+        snap, _ = self._build(cid, templates, version, saved_at, source="disk")
+
+        with self._lock:
+            st = self._states[cid]
+            if st.source == "backend":
+                return  # a backend sync already won the race
+            st.templates = templates
+            st.version = version
+            st.last_ok = saved_at
+            st.source = "disk"
+            st.disk_stamp = stamp
+            self._snapshots[cid] = snap
+        print(
+            f"[GALLERY] company={cid} loaded {len(templates)} templates from disk "
+            f"in {(time.perf_counter() - t0) * 1000.0:.1f}ms (age {time.time() - saved_at:.0f}s)"
+        )
+
+    def _fetch(
+        self, cid: str, updated_since: Optional[str]
+    ) -> Tuple[List[Dict[str, Any]], List[Optional[np.ndarray]]]:
+        """Template rows + their l2-normalized embeddings (None = unusable row)."""
+        client = self._client_for_company(cid)
+
+        if self.transport == "bin":
+            try:
+                rows, matrix = client.list_templates_bin(
+                    updated_since=updated_since, dtype=self.bin_dtype
+                )
+            except Exception as e:
+                if "404" not in str(e):
+                    raise
+                print(f"[GALLERY] backend has no /gallery/templates.bin, using JSON: {e}")
+                self.transport = "json"
+            else:
+                if matrix.shape[0] and matrix.shape[1] < 10:
+                    return rows, [None] * len(rows)
+                # one vectorized normalize for the whole blob; rows are views into it
+                return rows, list(_l2_rows(matrix.astype(np.float32, copy=False)))
+
+        rows = client.list_templates(updated_since=updated_since) or []
+        embs: List[Optional[np.ndarray]] = []
+        for t in rows:
+            emb_list = t.get("embedding") or []
+            if not isinstance(emb_list, list) or len(emb_list) < 10:
+                embs.append(None)
+                continue
+            embs.append(l2_normalize(np.asarray(emb_list, dtype=np.float32)))
+        return rows, embs
+
+    def _build(
+        self,
+        cid: str,
+        templates: Dict[str, _Template],
+        version: str,
+        synced_at: float,
+        source: str = "backend",
+    ) -> Tuple[GallerySnapshot, np.ndarray]:
+        """(snapshot, stacked (N, D) template matrix in templates order)."""
+        if not templates:
+            snap = GallerySnapshot(
+                index=EMPTY_SNAPSHOT.index, meta=[], version=version, synced_at=synced_at, source=source
+            )
+            return snap, np.zeros((0, EMPTY_SNAPSHOT.index.dim), dtype=np.float32)
+
+        embs: List[np.ndarray] = []
+        emp_keys: List[int] = []
+        meta_by_emp: Dict[int, Tuple[int, str, str]] = {}
+        for t in templates.values():
+            emp_int = self._emp_key(cid, t.emp_id_str)
+            embs.append(t.emb)
+            emp_keys.append(emp_int)
+            meta_by_emp.setdefault(emp_int, (emp_int, t.emp_id_str, t.name))
+
+        stacked = np.stack(embs, axis=0)
+        index = GalleryIndex(stacked, emp_keys)
+        snap = GallerySnapshot(
+            index=index,
+            meta=[meta_by_emp[k] for k in index.keys],
+            version=version,
+            synced_at=synced_at,
+            source=source,
+        )
+        return snap, stacked
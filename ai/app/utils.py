@@ -31,8 +31,12 @@ def sleep_fps(target_fps: float, t0: float) -> None:
         time.sleep(wait)
 
 
-def quality_score(face_bbox, frame_bgr) -> float:
-    """Simple quality heuristic: bigger face + sharper image => higher score (0-100)."""
+def quality_score(face_bbox, frame_bgr, frame_shape=None) -> float:
+    """
+    Simple quality heuristic: bigger face + sharper image => higher score (0-100).
+
+    frame_shape: (h, w) of the full frame when frame_bgr is only a face ROI of it.
+    """
     x1, y1, x2, y2 = [int(v) for v in face_bbox]
     h, w = frame_bgr.shape[:2]
     x1, y1 = max(0, x1), max(0, y1)
@@ -41,6 +45,8 @@ def quality_score(face_bbox, frame_bgr) -> float:
     if crop.size == 0:
         return 0.0
 
+    if frame_shape is not None:
+        h, w = frame_shape[:2]
     area = (x2 - x1) * (y2 - y1)
     size_ratio = min(1.0, area / float(w * h + 1e-6))
 
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 import os
+import shutil
+import subprocess
 import threading
 import time
-from typing import Optional, Tuple, List, Union
+from collections import deque
+from typing import Callable, Deque, Optional, Tuple, List, Union
 
 import cv2
 import numpy as np
 
+from .frame import Frame
+
 
 def _env_float(name: str, default: float) -> float:
     try:
@@ -23,7 +28,36 @@ def _env_int(name: str, default: int) -> int:
         return default
 
 
+def _env_str(name: str, default: str) -> str:
+    return str(os.getenv(name, default)).strip()
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    v = str(os.getenv(name, "1" if default else "0")).strip().lower()
+    return v in ("1", "true", "yes", "on")
+
+
 class FrameGrabber:
+    """
+    Latest-frame reader for one RTSP/webcam source.
+
+    Decode modes (DECODE_MODE, RTSP only; webcams always use OpenCV):
+      - opencv (default): cv2.VideoCapture. Every frame is grab()bed, which
+        still runs the H.264/H.265 decoder; only every DECODE_EVERY_N-th one is
+        retrieve()d (BGR conversion + allocation). This saves conversion and
+        copies, not decode: for decode savings use ffmpeg mode.
+      - ffmpeg: an ffmpeg subprocess decodes straight to a BGR pipe, with
+        optional keyframe-only decode (DECODE_KEYFRAMES_ONLY, the decoder drops
+        every non-key frame), every-Nth selection, in-decoder downscale
+        (DECODE_WIDTH) and hardware decode (DECODE_HWACCEL=auto|cuda|vaapi|qsv).
+        Falls back to opencv if ffmpeg/ffprobe are not installed.
+
+    Demand: consumers call touch() (CameraRuntime does on every read). After
+    DECODE_IDLE_S without a reader, opencv mode only grab()s (plus one frame
+    every 1/DECODE_IDLE_FPS s) and ffmpeg mode stops its decoder until the
+    next read.
+    """
+
     def __init__(
         self,
         rtsp_url: str,
@@ -31,8 +65,15 @@ class FrameGrabber:
         height: int = 720,
         prefer_max_webcam_res: bool = True,
         target_fps: int = 30,
+        on_frame: Optional[Callable[[Frame], None]] = None,
+        history: int = 0,
+        decode_every_n: Optional[int] = None,
+        decode_keyframes_only: Optional[bool] = None,
+        decode_width: Optional[int] = None,
     ):
         self.rtsp_url = rtsp_url
+        # called from the capture thread after every new frame
+        self.on_frame = on_frame
         self.width = int(width)
         self.height = int(height)
 
@@ -52,9 +93,39 @@ class FrameGrabber:
         self.cap_open_timeout_ms = max(0, _env_int("CAP_OPEN_TIMEOUT_MS", 5000))
         self.cap_read_timeout_ms = max(0, _env_int("CAP_READ_TIMEOUT_MS", 5000))
 
+        # Decode pipeline (see class docstring)
+        is_webcam = isinstance(rtsp_url, str) and rtsp_url.strip().isdigit()
+        self.decode_mode = "opencv" if is_webcam else _env_str("DECODE_MODE", "opencv").lower()
+        # constructor values override the DECODE_* env (the main stream of a
+        # dual-stream camera must decode every frame at native size)
+        self.decode_every_n = max(
+            1, _env_int("DECODE_EVERY_N", 1) if decode_every_n is None else int(decode_every_n)
+        )
+        self.decode_keyframes_only = (
+            _env_bool("DECODE_KEYFRAMES_ONLY", False)
+            if decode_keyframes_only is None
+            else bool(decode_keyframes_only)
+        )
+        self.decode_width = max(0, _env_int("DECODE_WIDTH", 0) if decode_width is None else int(decode_width))
+        self.decode_hwaccel = _env_str("DECODE_HWACCEL", "")
+        self.decode_idle_s = max(0.0, _env_float("DECODE_IDLE_S", 10.0))
+        self.decode_idle_fps = max(0.01, _env_float("DECODE_IDLE_FPS", 1.0))
+        self.ffmpeg_bin = _env_str("FFMPEG_BIN", "ffmpeg")
+        self.ffprobe_bin = _env_str("FFPROBE_BIN", "ffprobe")
+
+        self._last_demand = time.monotonic()
+        self._proc: Optional[subprocess.Popen] = None
+        self._out_size: Optional[Tuple[int, int]] = None  # ffmpeg output (w, h)
+
+        # counters
+        self._n_grabbed = 0
+        self._n_decoded = 0
+
         self.cap: Optional[cv2.VideoCapture] = None
         self._lock = threading.Lock()
-        self._frame: Optional[np.ndarray] = None
+        self._frame: Optional[Frame] = None
+        # last N frames, for time-aligned lookups (main stream of a dual-stream camera)
+        self._history: Deque[Frame] = deque(maxlen=max(1, int(history)))
         self._running = False
         self._thread: Optional[threading.Thread] = None
 
@@ -63,15 +134,49 @@ class FrameGrabber:
     # -------------------------
     def start(self):
         self._running = True
-        self._open_capture()
-        self._thread = threading.Thread(target=self._loop, daemon=True)
+        if self.decode_mode == "ffmpeg" and not self._ffmpeg_available():
+            print("[FrameGrabber] ffmpeg/ffprobe not found, DECODE_MODE=opencv")
+            self.decode_mode = "opencv"
+
+        if self.decode_mode == "ffmpeg":
+            target = self._loop_ffmpeg
+        else:
+            self._open_capture()
+            target = self._loop
+        self._thread = threading.Thread(target=target, daemon=True)
         self._thread.start()
 
-    def read_latest(self) -> Optional[np.ndarray]:
+    def touch(self) -> None:
+        """Mark that someone wants frames (keeps full-rate decode on)."""
+        self._last_demand = time.monotonic()
+
+    def stats(self) -> dict:
+        f = self._frame
+        return {
+            "mode": self.decode_mode,
+            "demanded": self._demanded(),
+            "grabbed": self._n_grabbed,
+            "decoded": self._n_decoded,
+            "frame_size": None if f is None else [int(f.shape[1]), int(f.shape[0])],
+        }
+
+    def read_frame(self) -> Optional[Frame]:
+        """Latest frame (shared, read-only; no copy)."""
+        return self._frame
+
+    def frame_near(self, ts: float, max_skew_s: float) -> Optional[Frame]:
+        """Buffered frame whose capture ts is closest to ts (None if all are > max_skew_s away)."""
         with self._lock:
-            if self._frame is None:
-                return None
-            return self._frame.copy()
+            frames = list(self._history)
+        best = min(frames, key=lambda f: abs(f.ts - ts), default=None)
+        if best is None or abs(best.ts - ts) > max_skew_s:
+            return None
+        return best
+
+    def read_latest(self) -> Optional[np.ndarray]:
+        """Latest image as a read-only array; copy it before drawing on it."""
+        f = self._frame
+        return None if f is None else f.image
 
     def stop(self):
         self._running = False
@@ -81,6 +186,7 @@ class FrameGrabber:
                 self.cap.release()
             except Exception:
                 pass
+        self._stop_proc()
         if self._thread:
             self._thread.join(timeout=1.0)
         if self.cap:
@@ -142,7 +248,9 @@ class FrameGrabber:
                 cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
                 # Some RTSP backends ignore width/height; still try (won't hurt)
-                self._set_resolution(cap, self.width, self.height)
+                # width/height <= 0 = keep the native size (main streams)
+                if self.width > 0 and self.height > 0:
+                    self._set_resolution(cap, self.width, self.height)
 
                 # Log actual
                 self._log_stream_info(prefix="RTSP", best_hint=None, cap=cap)
@@ -177,10 +285,26 @@ class FrameGrabber:
             self._frame = None
         print(f"[FrameGrabber] reopen ({reason}) src={self.rtsp_url}")
 
+    def _demanded(self) -> bool:
+        return self.decode_idle_s <= 0 or (time.monotonic() - self._last_demand) < self.decode_idle_s
+
+    def _publish(self, frame: np.ndarray) -> None:
+        # decoders allocate a fresh buffer per frame, so readers can keep the
+        # previous one without a copy
+        f = Frame.wrap(frame)
+        with self._lock:
+            self._frame = f
+            self._history.append(f)
+        self._n_decoded += 1
+        if self.on_frame is not None:
+            self.on_frame(f)
+
     def _loop(self):
         reopen_backoff = float(self.frame_reopen_wait_sec)
         last_ok = time.monotonic()
+        last_idle_decode = 0.0
         fails = 0
+        n = 0
 
         while self._running:
             cap = self.cap
@@ -196,15 +320,28 @@ class FrameGrabber:
                 reopen_backoff = min(reopen_backoff * 2.0, 10.0)
                 continue
 
-            ok, frame = cap.read()
+            # grab() pulls the next frame; retrieve() (BGR convert + new
+            # buffer) only for frames someone will look at
+            ok = cap.grab()
             now = time.monotonic()
+            frame = None
+            if ok:
+                n += 1
+                self._n_grabbed += 1
+                if self._demanded():
+                    want = (n % self.decode_every_n) == 0
+                else:
+                    want = (now - last_idle_decode) >= 1.0 / self.decode_idle_fps
+                if want:
+                    ok, frame = cap.retrieve()
+                    last_idle_decode = now
 
-            if ok and frame is not None:
+            if ok:
                 fails = 0
                 last_ok = now
                 reopen_backoff = float(self.frame_reopen_wait_sec)
-                with self._lock:
-                    self._frame = frame
+                if frame is not None:
+                    self._publish(frame)
                 continue
 
             fails += 1
@@ -216,6 +353,134 @@ class FrameGrabber:
                 time.sleep(reopen_backoff)
                 reopen_backoff = min(reopen_backoff * 2.0, 10.0)
 
+    # -------------------------
+    # ffmpeg decode pipeline
+    # -------------------------
+    def _ffmpeg_available(self) -> bool:
+        return shutil.which(self.ffmpeg_bin) is not None and shutil.which(self.ffprobe_bin) is not None
+
+    def _probe_size(self) -> Optional[Tuple[int, int]]:
+        try:
+            out = subprocess.run(
+                [
+                    self.ffprobe_bin,
+                    "-v", "error",
+                    "-rtsp_transport", "tcp",
+                    "-select_streams", "v:0",
+                    "-show_entries", "stream=width,height",
+                    "-of", "csv=p=0:s=x",
+                    str(self.rtsp_url),
+                ],
+                capture_output=True,
+                text=True,
+                timeout=max(1.0, self.cap_open_timeout_ms / 1000.0) + 5.0,
+            ).stdout.strip()
+            w, h = [int(v) for v in out.splitlines()[0].split("x")[:2]]
+            return (w, h) if w > 0 and h > 0 else None
+        except Exception:
+            return None
+
+    def _start_proc(self) -> bool:
+        src = self._probe_size()
+        if src is None:
+            return False
+        sw, sh = src
+        if self.decode_width and self.decode_width < sw:
+            ow = self.decode_width - (self.decode_width % 2)
+            oh = int(round(sh * ow / sw / 2.0)) * 2
+        else:
+            ow, oh = sw, sh
+
+        cmd = [self.ffmpeg_bin, "-hide_banner", "-loglevel", "error", "-nostdin"]
+        if self.decode_hwaccel:
+            cmd += ["-hwaccel", self.decode_hwaccel]
+        if self.decode_keyframes_only:
+            cmd += ["-skip_frame", "nokey"]
+        if str(self.rtsp_url).lower().startswith("rtsp"):
+            cmd += ["-rtsp_transport", "tcp"]
+            if self.cap_read_timeout_ms > 0:
+                cmd += ["-rw_timeout", str(self.cap_read_timeout_ms * 1000)]
+        cmd += ["-fflags", "nobuffer", "-flags", "low_delay", "-i", str(self.rtsp_url), "-an", "-sn"]
+
+        filters = []
+        if self.decode_every_n > 1:
+            filters.append(f"select='not(mod(n\\,{self.decode_every_n}))'")
+        if (ow, oh) != (sw, sh):
+            filters.append(f"scale={ow}:{oh}")
+        if filters:
+            cmd += ["-vf", ",".join(filters)]
+        cmd += ["-vsync", "0", "-pix_fmt", "bgr24", "-f", "rawvideo", "pipe:1"]
+
+        try:
+            self._proc = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0
+            )
+        except Exception as e:
+            print(f"[FrameGrabber] ffmpeg start failed src={self.rtsp_url}: {e}")
+            return False
+        self._out_size = (ow, oh)
+        print(
+            f"[FrameGrabber] ffmpeg: {sw}x{sh} -> {ow}x{oh} every_n={self.decode_every_n} "
+            f"keyframes_only={self.decode_keyframes_only} hwaccel={self.decode_hwaccel or 'none'}"
+        )
+        return True
+
+    def _stop_proc(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.kill()
+            proc.wait(timeout=2.0)
+        except Exception:
+            pass
+
+    def _read_exact(self, n: int) -> Optional[bytearray]:
+        proc = self._proc
+        if proc is None or proc.stdout is None:
+            return None
+        buf = bytearray(n)
+        view = memoryview(buf)
+        got = 0
+        while got < n:
+            k = proc.stdout.readinto(view[got:])
+            if not k:
+                return None
+            got += k
+        return buf
+
+    def _loop_ffmpeg(self):
+        reopen_backoff = float(self.frame_reopen_wait_sec)
+
+        while self._running:
+            if not self._demanded():
+                if self._proc is not None:
+                    print(f"[FrameGrabber] no readers, pausing decode src={self.rtsp_url}")
+                    self._stop_proc()
+                time.sleep(0.1)
+                continue
+
+            if self._proc is None:
+                if not self._start_proc():
+                    time.sleep(reopen_backoff)
+                    reopen_backoff = min(reopen_backoff * 2.0, 10.0)
+                    continue
+                reopen_backoff = float(self.frame_reopen_wait_sec)
+
+            ow, oh = self._out_size or (0, 0)
+            buf = self._read_exact(ow * oh * 3)
+            if buf is None:
+                if not self._running:
+                    break
+                self._stop_proc()
+                self._reopen_capture(reason="ffmpeg eof")
+                time.sleep(reopen_backoff)
+                reopen_backoff = min(reopen_backoff * 2.0, 10.0)
+                continue
+
+            self._n_grabbed += 1
+            self._publish(np.frombuffer(buf, dtype=np.uint8).reshape(oh, ow, 3))
+
     def _negotiate_best_webcam_resolution(self, cap: cv2.VideoCapture) -> Tuple[int, int]:
         """
         Try common webcam resolutions from highest to lowest and keep the best accepted.
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .recognizer import FaceDet
+
+
+DET_MODES = ("fixed", "auto", "tiled")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(float(str(os.getenv(name, str(default))).strip()))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _env_str(name: str, default: str) -> str:
+    return str(os.getenv(name, default)).strip()
+
+
+def _parse_sizes(raw: str, fallback: int) -> List[int]:
+    sizes = set()
+    for part in raw.split(","):
+        try:
+            n = int(part.strip())
+        except ValueError:
+            continue
+        if n >= 96:
+            sizes.add(n - n % 32)  # RetinaFace/SCRFD strides need multiples of 32
+    return sorted(sizes) or [fallback]
+
+
+def parse_tiles(raw: str) -> Tuple[int, int]:
+    """'3x2' -> (cols=3, rows=2); anything invalid -> (2, 1)."""
+    try:
+        c, r = str(raw).lower().split("x", 1)
+        return max(1, int(c)), max(1, int(r))
+    except Exception:
+        return 2, 1
+
+
+@dataclass
+class _CamDet:
+    mode: str
+    size: int
+    tiles: Tuple[int, int]
+    faces: Deque[float] = field(default_factory=deque)  # min side of recent faces, source px
+    frame_long: int = 0  # long side of the last frame (source px)
+    last_probe: float = 0.0
+    probing: bool = False  # the frame being detected is a probe
+    probe_needs: Deque[int] = field(default_factory=deque)  # size each recent probe needed
+    det_ms: float = 0.0  # EMA of detection latency
+    frames: int = 0
+    probes: int = 0
+
+
+class DetSizePolicy:
+    """
+    Per-camera detector input size.
+
+    Modes (DET_SIZE_MODE default, per camera via set()):
+    - fixed: AI_DET_SIZE for every frame (previous behaviour)
+    - auto: learns the face size distribution of the camera and picks the
+      smallest DET_SIZE_CHOICES entry at which its small faces (DET_AUTO_PCT
+      percentile, never below min_face_size) are still >= DET_AUTO_MIN_PX px
+      at the detector input. Every DET_AUTO_PROBE_S one frame is detected at
+      the largest size: faces the small size misses never reach the regular
+      window, so each probe records the size its smallest face needs, and
+      the camera never goes below the largest need of the last
+      DET_AUTO_PROBE_KEEP probes that found faces.
+    - tiled: the frame is cut into DET_TILES (cols x rows, DET_TILE_OVERLAP)
+      and each tile is detected at the camera size (high-res wide shots).
+    """
+
+    def __init__(self, default_size: int, min_face_size: int):
+        self.default_size = int(default_size)
+        self.min_face_size = max(1, int(min_face_size))
+        self.default_mode = _env_str("DET_SIZE_MODE", "fixed").lower()
+        if self.default_mode not in DET_MODES:
+            self.default_mode = "fixed"
+        self.choices = _parse_sizes(_env_str("DET_SIZE_CHOICES", "320,480,640"), self.default_size)
+        self.min_input_px = max(4.0, _env_float("DET_AUTO_MIN_PX", 20.0))
+        self.pct = min(50.0, max(0.0, _env_float("DET_AUTO_PCT", 5.0)))
+        self.window = max(10, _env_int("DET_AUTO_WINDOW", 300))
+        self.min_samples = max(1, _env_int("DET_AUTO_MIN_SAMPLES", 20))
+        self.probe_s = max(0.0, _env_float("DET_AUTO_PROBE_S", 30.0))
+        self.probe_keep = max(1, _env_int("DET_AUTO_PROBE_KEEP", 10))
+        self.tiles = parse_tiles(_env_str("DET_TILES", "2x1"))
+        self.tile_overlap = min(0.5, max(0.0, _env_float("DET_TILE_OVERLAP", 0.15)))
+
+        self._cams: Dict[str, _CamDet] = {}
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # Config
+    # -------------------------
+    def set(
+        self,
+        camera_id: str,
+        mode: Optional[str] = None,
+        size: Optional[int] = None,
+        tiles: Optional[str] = None,
+    ) -> Dict[str, object]:
+        if mode is not None and mode not in DET_MODES:
+            raise ValueError(f"mode must be one of {DET_MODES}")
+        st = self._state(camera_id)
+        with self._lock:
+            if mode is not None:
+                st.mode = mode
+                st.faces.clear()
+                st.probe_needs.clear()
+            if size is not None:
+                st.size = _parse_sizes(str(size), self.default_size)[0]
+            if tiles is not None:
+                st.tiles = parse_tiles(tiles)
+        return self._describe(st)
+
+    def config(self, camera_id: str) -> Optional[Tuple[str, int, str]]:
+        """(mode, size, tiles) set for this camera, None if it never used the policy."""
+        st = self._cams.get(str(camera_id))
+        if st is None:
+            return None
+        return st.mode, st.size, f"{st.tiles[0]}x{st.tiles[1]}"
+
+    def reset(self, camera_id: str) -> None:
+        with self._lock:
+            self._cams.pop(str(camera_id), None)
+
+    # -------------------------
+    # Hot path
+    # -------------------------
+    def plan(self, camera_id: str, frame_shape: Sequence[int]) -> Tuple[int, Optional[Tuple[int, int]]]:
+        """(detector input size, tiles or None) for the next frame of this camera."""
+        st = self._state(camera_id)
+        st.frame_long = max(int(frame_shape[0]), int(frame_shape[1]))
+        if st.mode == "tiled":
+            return st.size, st.tiles
+        if st.mode == "fixed":
+            return st.size, None
+
+        now = time.time()
+        st.probing = self.probe_s > 0 and now - st.last_probe >= self.probe_s
+        if st.probing:
+            st.last_probe = now
+            st.probes += 1
+            return self.choices[-1], None
+        return self._auto_size(st), None
+
+    def observe(self, camera_id: str, dets: Sequence[FaceDet], det_ms: float) -> None:
+        st = self._state(camera_id)
+        st.frames += 1
+        st.det_ms = det_ms if st.det_ms <= 0 else 0.9 * st.det_ms + 0.1 * det_ms
+        if st.mode != "auto":
+            return
+        sides = [float(min(d.bbox[2] - d.bbox[0], d.bbox[3] - d.bbox[1])) for d in dets]
+        if st.probing:
+            # kept apart: a probe every 30 s would never move the window's percentile
+            st.probing = False
+            if sides:
+                st.probe_needs.append(self._size_for(max(min(sides), float(self.min_face_size)), st))
+                while len(st.probe_needs) > self.probe_keep:
+                    st.probe_needs.popleft()
+            return
+        st.faces.extend(sides)
+        while len(st.faces) > self.window:
+            st.faces.popleft()
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            items = list(self._cams.items())
+        return {cid: self._describe(st) for cid, st in items}
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _state(self, camera_id: str) -> _CamDet:
+        cid = str(camera_id)
+        st = self._cams.get(cid)
+        if st is None:
+            with self._lock:
+                st = self._cams.setdefault(
+                    cid,
+                    _CamDet(mode=self.default_mode, size=self.default_size, tiles=self.tiles),
+                )
+        return st
+
+    def _small_face_px(self, st: _CamDet) -> Optional[float]:
+        if len(st.faces) < self.min_samples:
+            return None
+        small = float(np.percentile(np.fromiter(st.faces, dtype=np.float32), self.pct))
+        return max(small, float(self.min_face_size))
+
+    def _size_for(self, face_px: float, st: _CamDet) -> int:
+        """Smallest choice at which a face of face_px (source px) is >= DET_AUTO_MIN_PX."""
+        if st.frame_long <= 0:
+            return self.choices[-1]
+        # a face of `face_px` px on the long side L shrinks to face_px * S / L at the detector input
+        need = self.min_input_px * st.frame_long / face_px
+        for s in self.choices:
+            if s >= need:
+                return s
+        return self.choices[-1]
+
+    def _auto_size(self, st: _CamDet) -> int:
+        small = self._small_face_px(st)
+        if small is None or st.frame_long <= 0:
+            size = st.size  # still learning
+        else:
+            size = self._size_for(small, st)
+        # never below what a recent full-size probe found
+        return max([size] + list(st.probe_needs))
+
+    def _describe(self, st: _CamDet) -> Dict[str, object]:
+        small = self._small_face_px(st)
+        return {
+            "mode": st.mode,
+            "size": self._auto_size(st) if st.mode == "auto" else st.size,
+            "tiles": f"{st.tiles[0]}x{st.tiles[1]}" if st.mode == "tiled" else None,
+            "det_ms": round(st.det_ms, 1),
+            "frames": st.frames,
+            "face_samples": len(st.faces),
+            "small_face_px": None if small is None else round(small, 1),
+            "probes": st.probes,
+            "probe_floor": max(st.probe_needs) if st.probe_needs else None,
+        }
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .frame import Frame
+from .recognizer import FaceDet, FaceRecognizer
+
+# (sub width, main width) pairs already reported by MainView.pair
+_rejected: Set[Tuple[int, int]] = set()
+
+
+@dataclass(frozen=True)
+class MainView:
+    """
+    High-res main-stream frame paired with the substream frame detection ran on.
+    Maps substream coordinates (bbox / kps) into the main frame.
+    """
+
+    image: np.ndarray
+    sx: float
+    sy: float
+
+    @classmethod
+    def pair(cls, sub_shape: Tuple[int, ...], main: Optional[Frame]) -> Optional["MainView"]:
+        """None when there is no main frame or it is not larger than the substream."""
+        if main is None:
+            return None
+        sh, sw = int(sub_shape[0]), int(sub_shape[1])
+        mh, mw = int(main.shape[0]), int(main.shape[1])
+        if sw <= 0 or sh <= 0 or mw <= sw:
+            if (sw, mw) not in _rejected:
+                _rejected.add((sw, mw))
+                print(
+                    f"[DUAL] main frame {mw}x{mh} is not larger than the substream {sw}x{sh}, "
+                    "recognizing on the substream"
+                )
+            return None
+        return cls(image=main.image, sx=mw / float(sw), sy=mh / float(sh))
+
+    def map_bbox(self, bbox) -> Tuple[int, int, int, int]:
+        x1, y1, x2, y2 = [float(v) for v in bbox[:4]]
+        return (
+            int(round(x1 * self.sx)),
+            int(round(y1 * self.sy)),
+            int(round(x2 * self.sx)),
+            int(round(y2 * self.sy)),
+        )
+
+    def map_kps(self, kps: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        if kps is None:
+            return None
+        return np.asarray(kps, dtype=np.float32) * np.array([self.sx, self.sy], dtype=np.float32)
+
+    def map_det(self, d: FaceDet) -> FaceDet:
+        bbox = np.asarray(d.bbox, dtype=np.float32).copy()
+        bbox[[0, 2]] *= self.sx
+        bbox[[1, 3]] *= self.sy
+        return replace(d, bbox=bbox, kps=self.map_kps(d.kps), emb=None)
+
+
+def embed_dual(
+    rec: FaceRecognizer,
+    items: Sequence[Tuple[np.ndarray, FaceDet, Optional[MainView]]],
+) -> None:
+    """
+    FaceRecognizer.embed_batch() over (sub_frame, det, main_view) triples.
+    Faces of cameras with a main view are aligned from the main-stream frame
+    (norm_crop warps only the face ROI, so the full-res frame is never copied
+    or resized); the rest use the substream frame. Fills det.emb in place.
+    """
+    pairs: List[Tuple[np.ndarray, FaceDet]] = []
+    back: List[Tuple[FaceDet, FaceDet]] = []
+    for frame, d, main in items:
+        if main is None:
+            pairs.append((frame, d))
+            continue
+        proxy = main.map_det(d)
+        pairs.append((main.image, proxy))
+        back.append((d, proxy))
+
+    rec.embed_batch(pairs)
+    for d, proxy in back:
+        d.emb = proxy.emb
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+
+_seq = itertools.count(1)  # next() is atomic under the GIL
+
+
+@dataclass(frozen=True)
+class Frame:
+    """
+    One captured frame, shared by every consumer (recognition, streams,
+    snapshots, enrollment) without per-reader copies.
+
+    - image is marked read-only, so a consumer that wants to draw must copy
+      first (only the annotation stage does)
+    - seq is process-wide and strictly increasing (also across a camera's
+      direct/relay switches or reconnects), so "newer than the last frame I
+      processed" is a plain integer compare; ts is the capture time
+    - lifetime is plain Python refcounting: the pixel buffer is freed when the
+      producer has replaced it and the last reader drops its reference
+    """
+
+    image: np.ndarray
+    seq: int
+    ts: float
+
+    @classmethod
+    def wrap(cls, image: np.ndarray, ts: Optional[float] = None) -> "Frame":
+        # the producer hands the buffer over: freeze it instead of copying it
+        image.flags.writeable = False
+        return cls(image=image, seq=next(_seq), ts=time.time() if ts is None else float(ts))
+
+    @property
+    def shape(self):
+        return self.image.shape
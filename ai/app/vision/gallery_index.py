@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import os
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _env_str(name: str, default: str) -> str:
+    return str(os.getenv(name, default)).strip()
+
+
+def _l2_rows(x: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(x, axis=1, keepdims=True) + 1e-12
+    return (x / n).astype(np.float32, copy=False)
+
+
+def _spherical_kmeans(
+    x: np.ndarray, k: int, iters: int = 12, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Tiny k-means on the unit sphere (cosine). Returns (centroids, assignment)."""
+    rng = np.random.default_rng(seed)
+    k = max(1, min(int(k), x.shape[0]))
+    cents = x[rng.choice(x.shape[0], size=k, replace=False)].copy()
+    assign = np.zeros(x.shape[0], dtype=np.int32)
+    for _ in range(iters):
+        assign = np.argmax(x @ cents.T, axis=1).astype(np.int32)
+        sums = np.zeros_like(cents)
+        np.add.at(sums, assign, x)
+        empty = np.bincount(assign, minlength=k) == 0
+        if empty.any():
+            # re-seed empty lists from random points
+            sums[empty] = x[rng.choice(x.shape[0], size=int(empty.sum()), replace=False)]
+        cents = _l2_rows(sums)
+    return cents, assign
+
+
+class GalleryIndex:
+    """
+    Employee-level gallery matcher.
+
+    - templates are packed as (employees, max_angles, dim) with padded slots masked
+    - match() scores all query faces in ONE matrix multiply
+    - per-employee aggregation over angles: "max" or "topk" (mean of best k angles)
+    - optional IVF (coarse k-means over employee centroids) for very large
+      galleries: only the nprobe closest lists are scored exactly
+
+    Env defaults:
+      GALLERY_AGG=max|topk, GALLERY_TOPK=2
+      GALLERY_ANN=none|ivf, GALLERY_ANN_MIN=2000 employees,
+      GALLERY_IVF_NLIST=0 (auto ~sqrt(employees)), GALLERY_IVF_NPROBE=8
+    """
+
+    def __init__(
+        self,
+        embs: np.ndarray,
+        keys: Sequence[Hashable],
+        agg: Optional[str] = None,
+        topk: Optional[int] = None,
+        ann: Optional[str] = None,
+        ann_min_employees: Optional[int] = None,
+        nlist: Optional[int] = None,
+        nprobe: Optional[int] = None,
+    ):
+        """
+        embs: (N, D) l2-normalized templates
+        keys: N employee keys (template rows of the same employee share a key)
+        """
+        self.agg = (agg or _env_str("GALLERY_AGG", "max")).lower()
+        self.topk = max(1, int(topk if topk is not None else _env_int("GALLERY_TOPK", 2)))
+        ann = (ann or _env_str("GALLERY_ANN", "none")).lower()
+        ann_min = int(ann_min_employees if ann_min_employees is not None else _env_int("GALLERY_ANN_MIN", 2000))
+        self.nprobe = max(1, int(nprobe if nprobe is not None else _env_int("GALLERY_IVF_NPROBE", 8)))
+
+        embs = np.asarray(embs, dtype=np.float32)
+        dim = int(embs.shape[1]) if embs.ndim == 2 and embs.shape[0] else 512
+
+        # employee rows in first-seen order
+        self.keys: List[Hashable] = []
+        row_of: dict = {}
+        rows = np.empty(len(keys), dtype=np.int64)
+        for i, k in enumerate(keys):
+            r = row_of.get(k)
+            if r is None:
+                r = len(self.keys)
+                row_of[k] = r
+                self.keys.append(k)
+            rows[i] = r
+
+        n_emp = len(self.keys)
+        counts = np.bincount(rows, minlength=n_emp) if n_emp else np.zeros(0, dtype=np.int64)
+        self.max_angles = int(counts.max()) if n_emp else 1
+
+        # slot index of each template inside its employee row
+        order = np.argsort(rows, kind="stable")
+        slot = np.empty(len(rows), dtype=np.int64)
+        if len(rows):
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            slot[order] = np.arange(len(rows)) - np.repeat(starts, counts)
+
+        self._packed = np.zeros((n_emp, self.max_angles, dim), dtype=np.float32)
+        self._valid = np.zeros((n_emp, self.max_angles), dtype=bool)
+        if len(rows):
+            self._packed[rows, slot] = embs
+            self._valid[rows, slot] = True
+        self._flat = self._packed.reshape(n_emp * self.max_angles, dim)
+        self.dim = dim
+
+        # optional IVF over employee centroids
+        self._ivf_cents: Optional[np.ndarray] = None
+        self._ivf_lists: List[np.ndarray] = []
+        if ann == "ivf" and n_emp >= ann_min:
+            cents = _l2_rows(self._packed.sum(axis=1))
+            k = int(nlist) if nlist else _env_int("GALLERY_IVF_NLIST", 0)
+            if k <= 0:
+                k = int(np.sqrt(n_emp))
+            self._ivf_cents, assign = _spherical_kmeans(cents, k)
+            self._ivf_lists = [np.where(assign == c)[0] for c in range(self._ivf_cents.shape[0])]
+
+    # -------------------------
+    # Public
+    # -------------------------
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def n_templates(self) -> int:
+        return int(self._valid.sum())
+
+    @property
+    def uses_ann(self) -> bool:
+        return self._ivf_cents is not None
+
+    def match(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        queries: (M, D) l2-normalized embeddings (all faces of a frame / batch)
+        returns (employee_row (M,), score (M,)); row -1 / score -1 for an empty gallery
+        """
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        m = q.shape[0]
+        if m == 0 or len(self.keys) == 0:
+            return np.full(m, -1, dtype=np.int64), np.full(m, -1.0, dtype=np.float32)
+        if self._ivf_cents is not None:
+            return self._match_ivf(q)
+
+        scores = self._aggregate(q @ self._flat.T, self._valid)  # (M, E)
+        best = np.argmax(scores, axis=1)
+        return best.astype(np.int64), scores[np.arange(m), best].astype(np.float32)
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _aggregate(self, flat_sims: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        """(M, E*A) template sims -> (M, E) employee scores."""
+        m = flat_sims.shape[0]
+        sims = flat_sims.reshape(m, valid.shape[0], self.max_angles)
+        sims = np.where(valid[None, :, :], sims, -np.inf)
+        if self.agg == "topk" and self.max_angles > 1:
+            k = min(self.topk, self.max_angles)
+            top = -np.sort(-sims, axis=2)[:, :, :k]
+            # employees with fewer than k templates average over what they have
+            n = np.minimum(valid.sum(axis=1), k)[None, :]
+            return np.where(np.isfinite(top), top, 0.0).sum(axis=2) / np.maximum(n, 1)
+        return sims.max(axis=2)
+
+    def _match_ivf(self, q: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        m = q.shape[0]
+        coarse = q @ self._ivf_cents.T
+        nprobe = min(self.nprobe, coarse.shape[1])
+        probe = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        best_rows = np.full(m, -1, dtype=np.int64)
+        best_scores = np.full(m, -1.0, dtype=np.float32)
+        for i in range(m):
+            cand = np.concatenate([self._ivf_lists[c] for c in probe[i]])
+            if cand.size == 0:
+                continue
+            flat = self._packed[cand].reshape(-1, self.dim)
+            scores = self._aggregate((flat @ q[i])[None, :], self._valid[cand])[0]
+            j = int(np.argmax(scores))
+            best_rows[i] = int(cand[j])
+            best_scores[i] = float(scores[j])
+        return best_rows, best_scores
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .frame import Frame
+
+
+class _Slot:
+    __slots__ = ("lock", "seq", "tag", "jpg")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seq = -1
+        self.tag: Hashable = None
+        self.jpg: Optional[bytes] = None
+
+
+class JpegCache:
+    """
+    Encoded frames shared by every MJPEG / snapshot viewer.
+
+    One slot per (camera, variant, quality, width) holds the JPEG of the last
+    frame seq it encoded. The first viewer to ask for a newer frame encodes it
+    (render() overlay, resize, imencode) while the others wait on the slot's
+    lock and get the same bytes, so N viewers of a camera cost one encode per
+    frame instead of N.
+
+    - tag: anything that changes the picture besides the frame (HUD state);
+      a different tag re-encodes the same seq
+    - a request for an older seq than the slot holds is served the newer
+      JPEG (live view), never re-encoded
+    - width: downscale to at most this many pixels wide (aspect kept)
+    - at most JPEG_CACHE_MAX_ENTRIES slots, least recently used evicted
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max(
+            1, int(max_entries or int(os.getenv("JPEG_CACHE_MAX_ENTRIES", "256")))
+        )
+        self._slots: "OrderedDict[Tuple[str, str, int, Optional[int]], _Slot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, float]] = {}
+
+    def get(
+        self,
+        camera_id: str,
+        variant: str,
+        frame: Frame,
+        quality: int,
+        width: Optional[int] = None,
+        tag: Hashable = None,
+        render: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    ) -> Optional[bytes]:
+        width = int(width) if width and int(width) > 0 else None
+        key = (str(camera_id), str(variant), int(quality), width)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = _Slot()
+                while len(self._slots) > self.max_entries:
+                    self._slots.popitem(last=False)
+            else:
+                self._slots.move_to_end(key)
+
+        with slot.lock:
+            # a viewer that fell behind gets the newer picture, not a re-encode
+            if slot.jpg is not None and slot.seq >= frame.seq and slot.tag == tag:
+                self._count(variant, "hits")
+                return slot.jpg
+
+            t0 = time.perf_counter()
+            image = frame.image
+            if render is not None:
+                image = render(image)
+            h, w = image.shape[:2]
+            if width is not None and w > width:
+                image = cv2.resize(image, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+            if not ok:
+                self._count(variant, "errors")
+                return None
+            slot.seq, slot.tag, slot.jpg = frame.seq, tag, buf.tobytes()
+            self._count(variant, "misses", encode_ms=(time.perf_counter() - t0) * 1000.0)
+            return slot.jpg
+
+    def drop(self, camera_id: str) -> None:
+        """Forget a camera's slots (camera stopped)."""
+        cid = str(camera_id)
+        with self._lock:
+            for key in [k for k in self._slots if k[0] == cid]:
+                del self._slots[key]
+
+    def _count(self, variant: str, field: str, encode_ms: float = 0.0) -> None:
+        with self._lock:
+            c = self._counts.setdefault(variant, {"hits": 0, "misses": 0, "errors": 0, "encode_ms": 0.0})
+            c[field] += 1
+            c["encode_ms"] += encode_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {v: dict(c) for v, c in self._counts.items()}
+            entries = len(self._slots)
+        variants: Dict[str, Any] = {}
+        for v, c in sorted(counts.items()):
+            total = c["hits"] + c["misses"]
+            variants[v] = {
+                "hits": int(c["hits"]),
+                "misses": int(c["misses"]),
+                "errors": int(c["errors"]),
+                "hit_ratio": round(c["hits"] / total, 3) if total else None,
+                "avg_encode_ms": round(c["encode_ms"] / c["misses"], 2) if c["misses"] else None,
+            }
+        hits = sum(v["hits"] for v in variants.values())
+        misses = sum(v["misses"] for v in variants.values())
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+            "variants": variants,
+        }
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from ..utils import now_iso
+
+
+def _rss_mb() -> Optional[float]:
+    """Current process RSS in MB (psutil if installed, else /proc), None if unknown."""
+    try:
+        import psutil  # optional
+
+        return float(psutil.Process().memory_info().rss) / (1024.0 * 1024.0)
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+    except Exception:
+        return None
+
+
+def ort_session_options() -> Any:
+    """
+    SessionOptions for the ONNX sessions of this process, None = ORT defaults.
+
+    ORT_INTRA_OP_THREADS > 0 caps each session's intra-op thread pool (ORT
+    default: one thread per core). The recognition process pool sets it per
+    worker, so N workers don't each run a pool the size of the machine.
+    """
+    try:
+        threads = int(str(os.getenv("ORT_INTRA_OP_THREADS", "0")).strip())
+    except Exception:
+        threads = 0
+    if threads <= 0:
+        return None
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = threads
+    opts.inter_op_num_threads = 1
+    return opts
+
+
+@dataclass
+class ModelEntry:
+    key: str
+    obj: Any = None
+    load_s: float = 0.0
+    rss_mb: Optional[float] = None  # RSS growth while loading (approx. model RAM)
+    loaded_at: Optional[str] = None
+    users: int = 0
+    report: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class ModelRegistry:
+    """
+    Process-wide model cache:
+    - one instance per key (model pack + providers + det_size + modules, or ONNX path)
+    - lazy: nothing is loaded until the first get_or_load()
+    - loads are serialized, so RSS deltas can be attributed to one model
+    - ONNX Runtime sessions are safe to run from several threads, so the
+      shared objects are handed out as-is
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._entries: Dict[str, ModelEntry] = {}
+
+    def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Any],
+        on_loaded: Optional[Callable[[ModelEntry], None]] = None,
+    ) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.obj is not None:
+                entry.users += 1
+                return entry.obj
+
+        with self._load_lock:
+            # another thread may have loaded it while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.obj is not None:
+                    entry.users += 1
+                    return entry.obj
+
+            rss0 = _rss_mb()
+            t0 = time.perf_counter()
+            obj = loader()
+            load_s = time.perf_counter() - t0
+            rss1 = _rss_mb()
+
+            entry = ModelEntry(
+                key=key,
+                obj=obj,
+                load_s=load_s,
+                rss_mb=None if rss0 is None or rss1 is None else max(0.0, rss1 - rss0),
+                loaded_at=now_iso(),
+                users=1,
+            )
+            if on_loaded is not None:
+                on_loaded(entry)
+            with self._lock:
+                self._entries[key] = entry
+            return obj
+
+    def entry(self, key: str) -> Optional[ModelEntry]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "key": e.key,
+                    "load_s": round(e.load_s, 3),
+                    "rss_mb": None if e.rss_mb is None else round(e.rss_mb, 1),
+                    "loaded_at": e.loaded_at,
+                    "users": e.users,
+                    "report": list(e.report),
+                }
+                for e in self._entries.values()
+            ]
+
+
+_registry = ModelRegistry()
+
+
+def get_registry() -> ModelRegistry:
+    return _registry
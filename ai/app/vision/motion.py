@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(float(str(os.getenv(name, str(default))).strip()))
+    except Exception:
+        return default
+
+
+@dataclass
+class _GateState:
+    prev: Optional[np.ndarray] = None  # last checked frame, downscaled gray
+    last_motion: float = 0.0
+    last_infer: float = 0.0
+    started: float = 0.0
+    checked: int = 0
+    inferred: int = 0
+    skipped: int = 0
+    gate_s: float = 0.0  # time spent in the gate itself
+    infer_s_ema: float = 0.0  # recent inference cost per frame
+
+
+class MotionGate:
+    """
+    Cheap per-camera scene-change gate in front of detection.
+
+    Each frame is downscaled to MOTION_WIDTH px, grayed and blurred, then
+    compared with the previous checked frame. The camera counts as moving when
+    more than MOTION_MIN_AREA of the pixels changed by > MOTION_PIXEL_DELTA.
+
+    should_infer() is True when:
+    - the scene moved (instant ramp-up, no warm-up)
+    - it moved less than MOTION_HOLD_S ago (people pausing at the gate)
+    - the caller reports live tracks (busy=True)
+    - MOTION_IDLE_INTERVAL_S passed since the last inference (heartbeat)
+
+    Saved CPU = skipped frames x recent per-frame inference cost (record_cost()).
+    MOTION_GATE=0 disables the gate (always infer).
+    """
+
+    def __init__(self):
+        self.enabled = _env_int("MOTION_GATE", 1) == 1
+        self.width = max(32, _env_int("MOTION_WIDTH", 160))
+        self.pixel_delta = max(1, _env_int("MOTION_PIXEL_DELTA", 18))
+        self.min_area = max(0.0, _env_float("MOTION_MIN_AREA", 0.003))
+        self.hold_s = max(0.0, _env_float("MOTION_HOLD_S", 2.0))
+        self.idle_interval_s = max(0.0, _env_float("MOTION_IDLE_INTERVAL_S", 5.0))
+
+        self._states: Dict[str, _GateState] = {}
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # Public
+    # -------------------------
+    def should_infer(
+        self, camera_id: str, frame_bgr: np.ndarray, busy: bool = False, now: Optional[float] = None
+    ) -> bool:
+        now = time.time() if now is None else float(now)
+        st = self._state(camera_id, now)
+        if not self.enabled:
+            st.inferred += 1
+            return True
+
+        t0 = time.perf_counter()
+        small = self._prep(frame_bgr)
+        moved = True
+        if st.prev is not None and st.prev.shape == small.shape:
+            diff = cv2.absdiff(small, st.prev)
+            changed = float(np.count_nonzero(diff > self.pixel_delta)) / float(diff.size)
+            moved = changed > self.min_area
+        st.prev = small
+        st.gate_s += time.perf_counter() - t0
+        st.checked += 1
+
+        if moved:
+            st.last_motion = now
+        infer = (
+            busy
+            or (now - st.last_motion) <= self.hold_s
+            or (self.idle_interval_s > 0 and (now - st.last_infer) >= self.idle_interval_s)
+        )
+        if infer:
+            st.inferred += 1
+            st.last_infer = now
+        else:
+            st.skipped += 1
+        return infer
+
+    def record_cost(self, camera_id: str, seconds: float) -> None:
+        """Per-frame inference time of an inferred frame (feeds the savings estimate)."""
+        st = self._states.get(str(camera_id))
+        if st is None:
+            return
+        st.infer_s_ema = float(seconds) if st.infer_s_ema <= 0 else 0.9 * st.infer_s_ema + 0.1 * float(seconds)
+
+    def reset(self, camera_id: str) -> None:
+        with self._lock:
+            self._states.pop(str(camera_id), None)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        now = time.time()
+        with self._lock:
+            items = list(self._states.items())
+        out: Dict[str, Dict[str, float]] = {}
+        for cid, st in items:
+            hours = max(1e-6, (now - st.started) / 3600.0)
+            saved = st.skipped * st.infer_s_ema - st.gate_s
+            out[cid] = {
+                "enabled": self.enabled,
+                "checked": st.checked,
+                "inferred": st.inferred,
+                "skipped": st.skipped,
+                "skip_ratio": round(st.skipped / max(1, st.checked), 3),
+                "idle_s": round(now - st.last_motion, 1) if st.last_motion else None,
+                "gate_ms": round(1000.0 * st.gate_s / max(1, st.checked), 3),
+                "infer_ms": round(1000.0 * st.infer_s_ema, 1),
+                "cpu_s_saved": round(saved, 1),
+                "cpu_s_saved_per_hour": round(saved / hours, 1),
+            }
+        return out
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _state(self, camera_id: str, now: float) -> _GateState:
+        cid = str(camera_id)
+        st = self._states.get(cid)
+        if st is None:
+            with self._lock:
+                st = self._states.setdefault(cid, _GateState(started=now, last_infer=0.0))
+        return st
+
+    def _prep(self, frame_bgr: np.ndarray) -> np.ndarray:
+        h, w = frame_bgr.shape[:2]
+        sw = min(self.width, w)
+        sh = max(1, int(round(h * sw / float(w))))
+        small = cv2.resize(frame_bgr, (sw, sh), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
 import os
+import time
 from dataclasses import dataclass
-from typing import List, Tuple, Optional
+from typing import Any, Dict, List, Sequence, Tuple, Optional
 
+import cv2
 import numpy as np
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.model_zoo.retinaface import distance2bbox, distance2kps
+from insightface.utils import face_align
 
 from ..utils import l2_normalize
+from .model_registry import ModelEntry, get_registry, ort_session_options
 
 
 def _env_bool(name: str, default: bool) -> bool:
@@ -37,6 +43,137 @@ def _clamp(v: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, v))
 
 
+# Attendance only uses bbox + 5-pt kps (detector) and the ArcFace embedding.
+DEFAULT_MODULES: Tuple[str, ...] = ("detection", "recognition")
+
+
+def _pick_modules(allowed_modules: Optional[Sequence[str]]) -> List[str]:
+    """
+    AI_MODULES (comma separated) overrides the caller, e.g.
+      AI_MODULES=detection,recognition,landmark_2d_106
+    "all" loads every model of the pack (InsightFace default).
+    """
+    raw = _env_str("AI_MODULES", "")
+    if raw:
+        mods = [m.strip() for m in raw.split(",") if m.strip()]
+    else:
+        mods = list(allowed_modules or DEFAULT_MODULES)
+    if any(m.lower() == "all" for m in mods):
+        return []
+    if "detection" not in mods:
+        mods.insert(0, "detection")
+    return mods
+
+
+def profile_models(
+    app: FaceAnalysis, det_size: Tuple[int, int], runs: int = 3
+) -> List[Dict[str, Any]]:
+    """
+    Per-model startup report: median latency on a dummy frame/face and ONNX size.
+    Lets us compare the per-frame cost of each loaded buffalo_l sub-model.
+    """
+    img = np.zeros((det_size[1], det_size[0], 3), dtype=np.uint8)
+    w, h = det_size
+    face = Face(
+        bbox=np.array([w * 0.35, h * 0.3, w * 0.65, h * 0.7], dtype=np.float32),
+        kps=np.array(
+            [[w * 0.43, h * 0.45], [w * 0.57, h * 0.45], [w * 0.5, h * 0.52],
+             [w * 0.45, h * 0.6], [w * 0.55, h * 0.6]],
+            dtype=np.float32,
+        ),
+        det_score=1.0,
+    )
+
+    report: List[Dict[str, Any]] = []
+    for taskname, model in app.models.items():
+        times: List[float] = []
+        for _ in range(max(1, int(runs))):
+            t0 = time.perf_counter()
+            try:
+                if taskname == "detection":
+                    model.detect(img, max_num=0, metric="default")
+                else:
+                    model.get(img, face)
+            except Exception:
+                break
+            times.append((time.perf_counter() - t0) * 1000.0)
+
+        model_file = str(getattr(model, "model_file", "") or "")
+        size_mb = os.path.getsize(model_file) / (1024.0 * 1024.0) if os.path.isfile(model_file) else None
+        report.append(
+            {
+                "task": taskname,
+                "file": os.path.basename(model_file),
+                "ms": float(np.median(times)) if times else None,
+                "onnx_mb": None if size_mb is None else round(size_mb, 1),
+            }
+        )
+    return report
+
+
+def print_model_report(tag: str, report: List[Dict[str, Any]], load_s: float, rss_delta_mb: Optional[float]) -> None:
+    mem = "n/a" if rss_delta_mb is None else f"{rss_delta_mb:.0f}MB"
+    print(f"[{tag}] models loaded in {load_s:.2f}s rss+={mem}")
+    for r in report:
+        ms = "n/a" if r["ms"] is None else f"{r['ms']:.1f}ms"
+        size = "n/a" if r["onnx_mb"] is None else f"{r['onnx_mb']}MB"
+        print(f"[{tag}]   {r['task']:<16} {r['file']:<24} {ms:>9}  onnx={size}")
+
+
+def shared_face_analysis(
+    tag: str,
+    model_name: str,
+    use_gpu: bool,
+    det_size: Tuple[int, int],
+    modules: List[str],
+) -> FaceAnalysis:
+    """
+    FaceAnalysis from the process-wide registry: recognizers with the same
+    pack/providers/det_size/modules share one set of ONNX sessions.
+    """
+    providers = _pick_providers(use_gpu)
+    # ctx_id is used by InsightFace; keep consistent
+    ctx_id = 0 if use_gpu else -1
+    key = (
+        f"insightface:{model_name}:{'+'.join(providers)}:{det_size[0]}x{det_size[1]}:"
+        f"{','.join(modules) or 'all'}"
+    )
+
+    def _load() -> FaceAnalysis:
+        app = FaceAnalysis(name=model_name, providers=providers, allowed_modules=modules or None)
+        app.prepare(ctx_id=ctx_id, det_size=det_size)
+        _apply_session_options(app)
+        return app
+
+    def _loaded(entry: ModelEntry) -> None:
+        app = entry.obj
+        print(f"[{tag}] USE_GPU={int(use_gpu)} ORT_PROVIDER={_env_str('ORT_PROVIDER','auto')} providers={providers} ctx_id={ctx_id} det_size={det_size} modules={sorted(app.models)}")
+        # AI_MODEL_REPORT=0 skips the warm-up latency report
+        if _env_bool("AI_MODEL_REPORT", True):
+            entry.report = profile_models(app, det_size)
+            print_model_report(tag, entry.report, entry.load_s, entry.rss_mb)
+
+    return get_registry().get_or_load(key, _load, on_loaded=_loaded)
+
+
+def _apply_session_options(app: FaceAnalysis) -> None:
+    """
+    InsightFace builds its sessions without SessionOptions: with
+    ORT_INTRA_OP_THREADS set, reopen each model's session with them.
+    """
+    opts = ort_session_options()
+    if opts is None:
+        return
+    import onnxruntime as ort
+
+    for model in app.models.values():
+        sess = getattr(model, "session", None)
+        model_file = str(getattr(model, "model_file", "") or "")
+        if sess is None or not os.path.isfile(model_file):
+            continue
+        model.session = ort.InferenceSession(model_file, sess_options=opts, providers=sess.get_providers())
+
+
 def _pick_providers(use_gpu: bool) -> list[str]:
     """
     ORT_PROVIDER:
@@ -65,9 +202,11 @@ def _pick_providers(use_gpu: bool) -> list[str]:
 @dataclass
 class FaceDet:
     bbox: np.ndarray
-    emb: np.ndarray
+    emb: Optional[np.ndarray]
     kps: Optional[np.ndarray]
     det_score: float
+    # set when the detection re-uses an already verified track (no embedding)
+    track_id: Optional[int] = None
 
 
 class FaceRecognizer:
@@ -78,6 +217,7 @@ class FaceRecognizer:
         min_face_size: int = 40,
         det_size: tuple[int, int] = (640, 640),
         min_det_score: float = 0.35,
+        allowed_modules: Optional[Sequence[str]] = DEFAULT_MODULES,
     ):
         # allow env override (but caller can still pass args)
         use_gpu = _env_bool("USE_GPU", use_gpu)
@@ -87,30 +227,196 @@ class FaceRecognizer:
         self.min_face_size = int(min_face_size)
         self.min_det_score = _clamp(_env_float("MIN_FACE_DET_SCORE", min_det_score), 0.0, 1.0)
 
-        providers = _pick_providers(use_gpu)
+        self.model_name = model_name
+        self.use_gpu = use_gpu
+        self.det_size = det_size
+        self.modules = _pick_modules(allowed_modules)
+
+        # Shared, lazily loaded model (AI_LAZY_MODELS=0 loads it right away)
+        self._app: Optional[FaceAnalysis] = None
+        self._det_dynamic: Optional[bool] = None
+        if not _env_bool("AI_LAZY_MODELS", True):
+            _ = self.app
+
+    @property
+    def app(self) -> FaceAnalysis:
+        if self._app is None:
+            self._app = shared_face_analysis(
+                "FaceRecognizer", self.model_name, self.use_gpu, self.det_size, self.modules
+            )
+        return self._app
 
-        # ctx_id is used by InsightFace; keep consistent
-        ctx_id = 0 if use_gpu else -1
+    def detect_and_embed(self, frame_bgr: np.ndarray) -> List[FaceDet]:
+        dets = self.detect(frame_bgr)
+        self.embed(frame_bgr, dets)
+        return dets
+
+    @property
+    def det_dynamic(self) -> bool:
+        """True when the detector graph accepts any input size (per-call det size)."""
+        if self._det_dynamic is None:
+            shape = self.app.det_model.session.get_inputs()[0].shape
+            self._det_dynamic = not isinstance(shape[2], int)
+        return self._det_dynamic
+
+    def detect(self, frame_bgr: np.ndarray, input_size: Optional[int] = None) -> List[FaceDet]:
+        """
+        Detector only (no recognition / landmark / genderage models).
+        Returned FaceDet.emb is None until embed() fills it.
+        input_size overrides det_size for this call (ignored by fixed-shape graphs).
+        """
+        size = None
+        if input_size and int(input_size) != self.det_size[0] and self.det_dynamic:
+            size = (int(input_size), int(input_size))
+        bboxes, kpss = self.app.det_model.detect(
+            frame_bgr, input_size=size, max_num=0, metric="default"
+        )
+        return self._filter_dets(bboxes, kpss)
+
+    def detect_tiled(
+        self,
+        frame_bgr: np.ndarray,
+        tiles: Tuple[int, int],
+        overlap: float = 0.15,
+        input_size: Optional[int] = None,
+    ) -> List[FaceDet]:
+        """
+        Detect on a cols x rows grid of overlapping tiles (each at input_size) and
+        merge the results with the detector NMS. Small faces of a wide high-res
+        frame keep tile-level resolution instead of being shrunk with the frame.
+        """
+        det = self.app.det_model
+        h, w = frame_bgr.shape[:2]
+        cols, rows = int(tiles[0]), int(tiles[1])
+        tw = int(np.ceil(w / (cols - (cols - 1) * overlap)))
+        th = int(np.ceil(h / (rows - (rows - 1) * overlap)))
+        size = None
+        if input_size and self.det_dynamic:
+            size = (int(input_size), int(input_size))
+
+        boxes: List[np.ndarray] = []
+        kps_all: List[np.ndarray] = []
+        for r in range(rows):
+            y0 = 0 if rows == 1 else int(round(r * (h - th) / (rows - 1)))
+            for c in range(cols):
+                x0 = 0 if cols == 1 else int(round(c * (w - tw) / (cols - 1)))
+                tile = frame_bgr[y0 : y0 + th, x0 : x0 + tw]
+                b, k = det.detect(tile, input_size=size, max_num=0, metric="default")
+                if b.shape[0] == 0:
+                    continue
+                b = b.copy()
+                b[:, [0, 2]] += x0
+                b[:, [1, 3]] += y0
+                boxes.append(b)
+                if k is not None:
+                    kps_all.append(k + np.array([x0, y0], dtype=k.dtype))
+
+        if not boxes:
+            return []
+        pre = np.vstack(boxes).astype(np.float32, copy=False)
+        order = pre[:, 4].argsort()[::-1]
+        pre = pre[order]
+        keep = det.nms(pre)
+        kpss = np.vstack(kps_all)[order][keep] if len(kps_all) == len(boxes) else None
+        return self._filter_dets(pre[keep], kpss)
+
+    def detect_batch(
+        self,
+        frames_bgr: Sequence[np.ndarray],
+        input_sizes: Optional[Sequence[Optional[int]]] = None,
+    ) -> List[List[FaceDet]]:
+        """
+        Detect faces on several frames (usually one per camera) in one call.
+
+        If the detector ONNX graph has a batch dimension, frames are
+        letterboxed to their input size (det_size unless input_sizes says
+        otherwise) and each size group runs as a single session call.
+        Otherwise frames are detected one after another on the calling thread,
+        which still avoids several camera threads fighting over the same session.
+        """
+        det = self.app.det_model
+        sizes = list(input_sizes) if input_sizes is not None else [None] * len(frames_bgr)
+        if len(frames_bgr) <= 1 or not bool(getattr(det, "batched", False)):
+            return [self.detect(f, s) for f, s in zip(frames_bgr, sizes)]
+
+        dynamic = self.det_dynamic
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        for i, s in enumerate(sizes):
+            key = (int(s), int(s)) if s and dynamic else tuple(det.input_size)
+            groups.setdefault(key, []).append(i)
+
+        out: List[List[FaceDet]] = [[] for _ in frames_bgr]
+        for (in_w, in_h), idxs in groups.items():
+            group = self._detect_group(det, [frames_bgr[i] for i in idxs], in_w, in_h)
+            for i, dets in zip(idxs, group):
+                out[i] = dets
+        return out
+
+    def _detect_group(
+        self, det, frames_bgr: Sequence[np.ndarray], in_w: int, in_h: int
+    ) -> List[List[FaceDet]]:
+        det_imgs: List[np.ndarray] = []
+        scales: List[float] = []
+        for img in frames_bgr:
+            det_img, scale = _letterbox(img, in_w, in_h)
+            det_imgs.append(det_img)
+            scales.append(scale)
+
+        blob = cv2.dnn.blobFromImages(
+            det_imgs,
+            1.0 / det.input_std,
+            (in_w, in_h),
+            (det.input_mean, det.input_mean, det.input_mean),
+            swapRB=True,
+        )
+        net_outs = det.session.run(det.output_names, {det.input_name: blob})
+
+        out: List[List[FaceDet]] = []
+        for b, scale in enumerate(scales):
+            bboxes, kpss = _decode_retinaface(det, [o[b] for o in net_outs], in_w, in_h, scale)
+            out.append(self._filter_dets(bboxes, kpss))
+        return out
 
-        self.app = FaceAnalysis(name=model_name, providers=providers)
-        self.app.prepare(ctx_id=ctx_id, det_size=det_size)
+    def embed(self, frame_bgr: np.ndarray, dets: Sequence[FaceDet]) -> None:
+        """Fill FaceDet.emb in place (one batched ArcFace call per frame)."""
+        self.embed_batch([(frame_bgr, d) for d in dets])
+
+    def embed_batch(self, items: Sequence[Tuple[np.ndarray, FaceDet]]) -> None:
+        """
+        Fill FaceDet.emb in place for (frame, det) pairs, possibly from different
+        cameras, using a single ArcFace session run.
+        """
+        if not items:
+            return
+        rec = self.app.models["recognition"]
+        size = int(rec.input_size[0])
+
+        crops: List[np.ndarray] = []
+        targets: List[FaceDet] = []
+        for frame_bgr, d in items:
+            if d.kps is None:
+                continue
+            crops.append(face_align.norm_crop(frame_bgr, landmark=d.kps, image_size=size))
+            targets.append(d)
+        if not crops:
+            return
 
-        print(f"[FaceRecognizer] USE_GPU={int(use_gpu)} ORT_PROVIDER={_env_str('ORT_PROVIDER','auto')} providers={providers} ctx_id={ctx_id} det_size={det_size}")
+        feats = rec.get_feat(crops)
+        for d, f in zip(targets, feats):
+            d.emb = l2_normalize(np.asarray(f, dtype=np.float32).reshape(-1))
 
-    def detect_and_embed(self, frame_bgr: np.ndarray) -> List[FaceDet]:
-        faces = self.app.get(frame_bgr)
+    def _filter_dets(self, bboxes: np.ndarray, kpss: Optional[np.ndarray]) -> List[FaceDet]:
         out: List[FaceDet] = []
         best_fallback: Optional[FaceDet] = None
-        for f in faces:
-            score = float(getattr(f, "det_score", 1.0))
-            bbox = f.bbox.astype(np.float32)
+        for i in range(int(bboxes.shape[0])):
+            score = float(bboxes[i, 4])
+            bbox = bboxes[i, 0:4].astype(np.float32)
             w = float(bbox[2] - bbox[0])
             h = float(bbox[3] - bbox[1])
             if min(w, h) < self.min_face_size:
                 continue
-            emb = l2_normalize(f.embedding.astype(np.float32))
-            kps = getattr(f, "kps", None)
-            det = FaceDet(bbox=bbox, emb=emb, kps=kps, det_score=score)
+            kps = kpss[i] if kpss is not None else None
+            det = FaceDet(bbox=bbox, emb=None, kps=kps, det_score=score)
             if score >= self.min_det_score:
                 out.append(det)
             # keep best-scoring face for fallback when lighting is poor
@@ -124,6 +430,65 @@ class FaceRecognizer:
         return out
 
 
+def _letterbox(img: np.ndarray, in_w: int, in_h: int) -> Tuple[np.ndarray, float]:
+    """Same resize + top-left padding as insightface RetinaFace.detect()."""
+    im_ratio = float(img.shape[0]) / img.shape[1]
+    model_ratio = float(in_h) / in_w
+    if im_ratio > model_ratio:
+        new_h = in_h
+        new_w = int(new_h / im_ratio)
+    else:
+        new_w = in_w
+        new_h = int(new_w * im_ratio)
+    scale = float(new_h) / img.shape[0]
+    det_img = np.zeros((in_h, in_w, 3), dtype=np.uint8)
+    det_img[:new_h, :new_w, :] = cv2.resize(img, (new_w, new_h))
+    return det_img, scale
+
+
+def _decode_retinaface(
+    det, outs: List[np.ndarray], in_w: int, in_h: int, det_scale: float
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Decode one image of a batched RetinaFace/SCRFD output.
+    Mirrors insightface RetinaFace.forward() + detect() (anchors, threshold, NMS).
+    """
+    fmc = det.fmc
+    scores_list, bboxes_list, kpss_list = [], [], []
+    for idx, stride in enumerate(det._feat_stride_fpn):
+        scores = outs[idx]
+        bbox_preds = outs[idx + fmc] * stride
+        height = in_h // stride
+        width = in_w // stride
+        key = (height, width, stride)
+        anchor_centers = det.center_cache.get(key)
+        if anchor_centers is None:
+            anchor_centers = np.stack(np.mgrid[:height, :width][::-1], axis=-1).astype(np.float32)
+            anchor_centers = (anchor_centers * stride).reshape((-1, 2))
+            if det._num_anchors > 1:
+                anchor_centers = np.stack([anchor_centers] * det._num_anchors, axis=1).reshape((-1, 2))
+            if len(det.center_cache) < 100:
+                det.center_cache[key] = anchor_centers
+
+        pos_inds = np.where(scores >= det.det_thresh)[0]
+        bboxes = distance2bbox(anchor_centers, bbox_preds)
+        scores_list.append(scores[pos_inds])
+        bboxes_list.append(bboxes[pos_inds])
+        if det.use_kps:
+            kpss = distance2kps(anchor_centers, outs[idx + fmc * 2] * stride)
+            kpss_list.append(kpss.reshape((kpss.shape[0], -1, 2))[pos_inds])
+
+    scores = np.vstack(scores_list)
+    order = scores.ravel().argsort()[::-1]
+    bboxes = np.vstack(bboxes_list) / det_scale
+    pre_det = np.hstack((bboxes, scores)).astype(np.float32, copy=False)[order, :]
+    keep = det.nms(pre_det)
+    kpss = None
+    if det.use_kps:
+        kpss = (np.vstack(kpss_list) / det_scale)[order, :, :][keep, :, :]
+    return pre_det[keep, :], kpss
+
+
 def match_gallery(emb: np.ndarray, gallery_embs: np.ndarray) -> Tuple[int, float]:
     if gallery_embs.size == 0:
         return -1, -1.0
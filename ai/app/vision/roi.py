@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .recognizer import FaceDet
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(str(os.getenv(name, str(default))).strip())
+    except Exception:
+        return default
+
+
+def _clamp01(v: float) -> float:
+    return max(0.0, min(1.0, float(v)))
+
+
+def _parse_region(item: Any) -> Optional[np.ndarray]:
+    """{"x0","y0","x1","y1"} rect, {"points": [[x, y], ...]} or a bare point list."""
+    if isinstance(item, dict) and all(k in item for k in ("x0", "y0", "x1", "y1")):
+        x0, x1 = sorted((_clamp01(item["x0"]), _clamp01(item["x1"])))
+        y0, y1 = sorted((_clamp01(item["y0"]), _clamp01(item["y1"])))
+        pts = [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+    elif isinstance(item, dict) and "points" in item:
+        pts = item["points"]
+    else:
+        pts = item
+    try:
+        arr = np.array([[_clamp01(p[0]), _clamp01(p[1])] for p in pts], dtype=np.float32)
+    except (TypeError, IndexError, KeyError, ValueError):
+        return None
+    if arr.shape[0] < 3 or cv2.contourArea(arr) <= 0:
+        return None
+    return arr
+
+
+@dataclass(frozen=True)
+class Roi:
+    """
+    Detection regions of one camera: polygons in normalized [0..1] frame
+    coordinates, so the same config fits the substream, the main stream and
+    any decode size.
+
+    Only the (padded) bounding boxes of the regions are cropped and detected;
+    a face is kept when its center falls inside one of the polygons.
+    """
+
+    polygons: Tuple[np.ndarray, ...]
+    pad: float = 0.15  # crop padding, fraction of the region size (faces on the border)
+    _masks: Dict[Tuple[int, int], np.ndarray] = field(
+        default_factory=dict, compare=False, repr=False
+    )
+
+    @classmethod
+    def parse(cls, raw: Any, pad: Optional[float] = None) -> Optional["Roi"]:
+        """JSON string or list of regions; None for empty / invalid configs."""
+        if isinstance(raw, (str, bytes)):
+            raw = raw.strip()
+            if not raw:
+                return None
+            try:
+                raw = json.loads(raw)
+            except ValueError:
+                return None
+        if isinstance(raw, dict):
+            raw = [raw]
+        if not isinstance(raw, list):
+            return None
+        polys = tuple(p for p in (_parse_region(r) for r in raw) if p is not None)
+        if not polys:
+            return None
+        return cls(polygons=polys, pad=_env_float("ROI_PAD", 0.15) if pad is None else float(pad))
+
+    @classmethod
+    def rect(cls, x0: float, y0: float, x1: float, y1: float, pad: float = 0.15) -> "Roi":
+        roi = cls.parse([{"x0": x0, "y0": y0, "x1": x1, "y1": y1}], pad=pad)
+        assert roi is not None, "empty ROI rect"
+        return roi
+
+    def to_json(self) -> List[Dict[str, Any]]:
+        return [{"points": [[round(float(x), 4), round(float(y), 4)] for x, y in p]} for p in self.polygons]
+
+    def crop_boxes(self, h: int, w: int) -> List[Tuple[int, int, int, int]]:
+        """Padded pixel bounding boxes of the regions; overlapping boxes are merged."""
+        boxes: List[List[int]] = []
+        for p in self.polygons:
+            x0, y0 = p.min(axis=0)
+            x1, y1 = p.max(axis=0)
+            px, py = (x1 - x0) * self.pad, (y1 - y0) * self.pad
+            boxes.append(
+                [
+                    max(0, int((x0 - px) * w)),
+                    max(0, int((y0 - py) * h)),
+                    min(w, int(np.ceil((x1 + px) * w))),
+                    min(h, int(np.ceil((y1 + py) * h))),
+                ]
+            )
+
+        merged = True
+        while merged and len(boxes) > 1:
+            merged = False
+            for i in range(len(boxes)):
+                for j in range(i + 1, len(boxes)):
+                    a, b = boxes[i], boxes[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del boxes[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return [tuple(b) for b in boxes if b[2] > b[0] and b[3] > b[1]]
+
+    def mask(self, h: int, w: int) -> np.ndarray:
+        key = (int(h), int(w))
+        m = self._masks.get(key)
+        if m is None:
+            m = np.zeros(key, dtype=np.uint8)
+            scale = np.array([w, h], dtype=np.float32)
+            cv2.fillPoly(m, [np.round(p * scale).astype(np.int32) for p in self.polygons], 1)
+            if len(self._masks) < 8:
+                self._masks[key] = m
+        return m
+
+    def contains(self, bbox, h: int, w: int) -> bool:
+        cx = int(0.5 * (float(bbox[0]) + float(bbox[2])))
+        cy = int(0.5 * (float(bbox[1]) + float(bbox[3])))
+        if not (0 <= cx < w and 0 <= cy < h):
+            return False
+        return bool(self.mask(h, w)[cy, cx])
+
+    def area_frac(self, h: int, w: int) -> float:
+        """Share of the frame pixels the detector sees (crop boxes)."""
+        return sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in self.crop_boxes(h, w)) / float(max(1, h * w))
+
+
+def roi_views(frame_bgr: np.ndarray, roi: Optional[Roi]) -> List[Tuple[np.ndarray, int, int]]:
+    """(view, x0, y0) crops to detect on; the whole frame when there is no ROI."""
+    if roi is None:
+        return [(frame_bgr, 0, 0)]
+    h, w = frame_bgr.shape[:2]
+    return [(frame_bgr[y0:y1, x0:x1], x0, y0) for x0, y0, x1, y1 in roi.crop_boxes(h, w)]
+
+
+def remap_dets(dets: Sequence[FaceDet], x0: int, y0: int) -> None:
+    """Shift detections of a crop back into frame coordinates (in place)."""
+    if x0 == 0 and y0 == 0:
+        return
+    off = np.array([x0, y0], dtype=np.float32)
+    for d in dets:
+        d.bbox = d.bbox.copy()
+        d.bbox[[0, 2]] += x0
+        d.bbox[[1, 3]] += y0
+        if d.kps is not None:
+            d.kps = d.kps + off
+
+
+def keep_in_roi(dets: Sequence[FaceDet], roi: Optional[Roi], shape) -> List[FaceDet]:
+    if roi is None:
+        return list(dets)
+    h, w = int(shape[0]), int(shape[1])
+    return [d for d in dets if roi.contains(d.bbox, h, w)]
+
+
+def detect_in_roi(
+    detect: Callable[[np.ndarray], List[FaceDet]],
+    frame_bgr: np.ndarray,
+    roi: Optional[Roi],
+) -> List[FaceDet]:
+    """crop -> detect -> remap -> keep faces centered inside the ROI polygons."""
+    out: List[FaceDet] = []
+    for view, x0, y0 in roi_views(frame_bgr, roi):
+        dets = detect(view)
+        remap_dets(dets, x0, y0)
+        out.extend(dets)
+    return keep_in_roi(out, roi, frame_bgr.shape)
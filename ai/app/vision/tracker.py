@@ -1,8 +1,14 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 
+try:
+    from scipy.optimize import linear_sum_assignment
+except Exception:  # pragma: no cover - scipy is optional, greedy fallback below
+    linear_sum_assignment = None
+
 def iou(a: np.ndarray, b: np.ndarray) -> float:
     ax1, ay1, ax2, ay2 = a
     bx1, by1, bx2, by2 = b
@@ -29,6 +35,63 @@ def bbox_diag(b: np.ndarray) -> float:
     x1, y1, x2, y2 = b
     return float(((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5)
 
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (N,4) and (M,4) boxes -> (N,M), same formula as iou()."""
+    a = np.asarray(a, dtype=float).reshape(-1, 4)
+    b = np.asarray(b, dtype=float).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0.0, None) * np.clip(iy2 - iy1, 0.0, None)
+    area_a = np.clip(a[:, 2] - a[:, 0], 0.0, None) * np.clip(a[:, 3] - a[:, 1], 0.0, None)
+    area_b = np.clip(b[:, 2] - b[:, 0], 0.0, None) * np.clip(b[:, 3] - b[:, 1], 0.0, None)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-6)
+
+
+def center_distance_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise box-center distances of (N,4) and (M,4) boxes -> (N,M)."""
+    a = np.asarray(a, dtype=float).reshape(-1, 4)
+    b = np.asarray(b, dtype=float).reshape(-1, 4)
+    ca = 0.5 * (a[:, :2] + a[:, 2:])
+    cb = 0.5 * (b[:, :2] + b[:, 2:])
+    d = ca[:, None, :] - cb[None, :, :]
+    return np.sqrt((d * d).sum(axis=2))
+
+
+def bbox_diags(b: np.ndarray) -> np.ndarray:
+    b = np.asarray(b, dtype=float).reshape(-1, 4)
+    return np.hypot(b[:, 2] - b[:, 0], b[:, 3] - b[:, 1])
+
+
+def assign(score: np.ndarray, valid: np.ndarray, method: str = "auto") -> List[Tuple[int, int]]:
+    """
+    Rows x cols assignment maximizing the summed score over valid pairs.
+    "auto" solves it optimally with scipy's linear_sum_assignment (Hungarian)
+    when scipy is installed; "greedy" (and the fallback) takes the best
+    remaining pair first.
+    """
+    if score.size == 0 or not valid.any():
+        return []
+    if method != "greedy" and linear_sum_assignment is not None:
+        # invalid pairs cost more than any valid combination, then are dropped
+        big = 1e6 + float(np.abs(score[valid]).sum())
+        rows, cols = linear_sum_assignment(np.where(valid, -score, big))
+        return [(int(r), int(c)) for r, c in zip(rows, cols) if valid[r, c]]
+
+    flat = np.flatnonzero(valid.ravel())
+    flat = flat[np.argsort(-score.ravel()[flat], kind="stable")]
+    used_r, used_c, out = set(), set(), []
+    for k in flat:
+        r, c = divmod(int(k), score.shape[1])
+        if r in used_r or c in used_c:
+            continue
+        used_r.add(r)
+        used_c.add(c)
+        out.append((r, c))
+    return out
+
 @dataclass
 class Track:
     track_id: int
@@ -38,8 +101,76 @@ class Track:
     similarity: float
     last_seen_frame: int
     stable_name_hits: int = 0
+    last_embed_ts: float = 0.0  # last time identity was confirmed by an embedding
+    # constant-velocity state: bbox change per frame (x1, y1, x2, y2)
+    vel: np.ndarray = field(default_factory=lambda: np.zeros(4, dtype=float))
+    # identity evidence: quality-weighted sum of the L2-normalized embeddings
+    emb_sum: Optional[np.ndarray] = None
+    emb_weight: float = 0.0
+    emb_count: int = 0
+    confidence: float = 0.0  # gallery similarity of the mean embedding
+    det_index: int = -1  # dets index that refreshed this track in the last update()
+    decision: str = ""  # last attendance decision (marked / cooldown / model_spoof / ...)
+
+    def add_embedding(self, emb: np.ndarray, weight: float, reset_sim: float = 0.3) -> None:
+        """
+        Accumulate one embedding. A face that does not resemble the running
+        mean (cosine < reset_sim) means another person took over the box:
+        the evidence restarts from this embedding.
+        """
+        e = np.asarray(emb, dtype=np.float32).reshape(-1)
+        w = max(1e-3, float(weight))
+        if self.emb_sum is not None:
+            mean = self.mean_embedding()
+            if mean is None or mean.shape != e.shape or float(mean @ e) < reset_sim:
+                self.emb_sum = None
+        if self.emb_sum is None:
+            self.emb_sum = e * w
+            self.emb_weight = w
+            self.emb_count = 1
+            return
+        self.emb_sum += e * w
+        self.emb_weight += w
+        self.emb_count += 1
+
+    def mean_embedding(self) -> Optional[np.ndarray]:
+        if self.emb_sum is None:
+            return None
+        n = float(np.linalg.norm(self.emb_sum))
+        return self.emb_sum / n if n > 0 else None
+
+    def predict(self, frame_idx: int, max_frames: int = 8) -> np.ndarray:
+        """Box extrapolated to frame_idx (at most max_frames past the last detection)."""
+        age = min(max(0, frame_idx - self.last_seen_frame), max_frames)
+        if age == 0:
+            return self.bbox
+        return self.bbox + self.vel * age
+
 
 class SimpleTracker:
+    """
+    IoU / center-distance face tracker.
+
+    Each update() stacks the track boxes into one (N,4) array and scores all
+    tracks x detections at once (IoU and center-distance matrices); the
+    assignment is solved by assign() (optimal when scipy is available,
+    TRACKER_ASSIGN=greedy forces the fallback). Smoothing, stale re-attach,
+    duplicate suppression and the merge/dedup passes keep their gates.
+
+    Tracks carry a constant-velocity state (alpha-beta filter, the
+    steady-state Kalman filter of that model): smooth_alpha corrects the
+    position, vel_beta the velocity. Association, merges and Track.predict()
+    use boxes extrapolated to the current frame, so detection can skip frames
+    (frames without detection just advance frame_idx) while boxes follow the
+    faces. vel_beta=0 gives the previous fixed-box smoothing.
+
+    The track table (boxes, velocities, last_seen_frame as arrays) is built
+    once and kept in step by update(), which is the only writer of track
+    geometry: find_track() calls and the next update() reuse it, and the
+    suppression and merge/dedup passes of one update() share one ordering
+    and one "same face" matrix.
+    """
+
     def __init__(
         self,
         iou_threshold: float = 0.35,
@@ -49,6 +180,9 @@ class SimpleTracker:
         suppress_new_iou: float = 0.65,
         merge_iou: float = 0.5,
         merge_center: float = 90.0,
+        assign_method: Optional[str] = None,
+        vel_beta: Optional[float] = None,
+        max_predict_frames: Optional[int] = None,
     ):
         self.iou_threshold = float(iou_threshold)
         self.max_age_frames = int(max_age_frames)
@@ -57,118 +191,216 @@ class SimpleTracker:
         self.suppress_new_iou = float(suppress_new_iou)
         self.merge_iou = float(merge_iou)
         self.merge_center = float(merge_center)
+        if assign_method is None:
+            assign_method = os.getenv("TRACKER_ASSIGN", "auto")
+        self.assign_method = str(assign_method).strip().lower()
+        if vel_beta is None:
+            vel_beta = float(os.getenv("TRACKER_VEL_BETA", "0.2"))
+        self.vel_beta = max(0.0, min(1.0, float(vel_beta)))
+        if max_predict_frames is None:
+            max_predict_frames = int(os.getenv("TRACKER_MAX_PREDICT_FRAMES", "8"))
+        self.max_predict_frames = max(0, int(max_predict_frames))
+        self._frame_idx = 0
         self.tracks: Dict[int, Track] = {}
         self._next_id = 1
+        # (tracks, bbox (N,4), vel (N,4), last_seen_frame (N,)), rows in self.tracks order
+        self._arrays: Optional[Tuple[List[Track], np.ndarray, np.ndarray, np.ndarray]] = None
+        self._pred: Optional[Tuple[int, np.ndarray]] = None  # boxes predicted at frame_idx
 
     def _base_center_thresh(self, bbox: np.ndarray) -> float:
         diag = bbox_diag(np.asarray(bbox, dtype=float))
         return max(self.center_dist_threshold, diag * 0.75)
 
+    def _center_thresh(self, boxes: np.ndarray) -> np.ndarray:
+        """Vector form of _base_center_thresh() over (N,4) boxes."""
+        return np.maximum(self.center_dist_threshold, bbox_diags(boxes) * 0.75)
+
     def _merge_distance(self, a: np.ndarray, b: np.ndarray) -> float:
         return max(self.merge_center, 0.5 * max(bbox_diag(a), bbox_diag(b)))
 
+    def _table(self, frame_idx: int) -> Tuple[List[Track], np.ndarray, np.ndarray]:
+        """
+        Tracks with their boxes predicted at frame_idx (N,4) and
+        last_seen_frame (N,) as arrays. Cached, the arrays are read-only.
+        """
+        if self._arrays is None:
+            trs = list(self.tracks.values())
+            n = len(trs)
+            if n:
+                base = np.stack([np.asarray(t.bbox, dtype=float) for t in trs])
+                vel = np.stack([t.vel for t in trs]).astype(float)
+            else:
+                base, vel = np.zeros((0, 4), dtype=float), np.zeros((0, 4), dtype=float)
+            last = np.fromiter((t.last_seen_frame for t in trs), dtype=np.int64, count=n)
+            self._arrays = (trs, base, vel, last)
+            self._pred = None
+        trs, base, vel, last = self._arrays
+        if self._pred is None or self._pred[0] != frame_idx:
+            boxes = base
+            if self.vel_beta > 0 and trs:
+                age = np.clip(frame_idx - last, 0, self.max_predict_frames)[:, None]
+                boxes = base + vel * age
+            self._pred = (frame_idx, boxes)
+        return trs, self._pred[1], last
+
+    def predict(self, frame_idx: int) -> List[Track]:
+        """
+        Frame without detection: only advances the clock. Draw each returned
+        track at tr.predict(frame_idx, tracker.max_predict_frames).
+        """
+        self._frame_idx = max(self._frame_idx, int(frame_idx))
+        return list(self.tracks.values())
+
+    def box(self, tr: Track, frame_idx: int) -> np.ndarray:
+        return tr.predict(frame_idx, self.max_predict_frames)
+
+    def find_track(self, bbox: np.ndarray, frame_idx: int) -> Optional[Track]:
+        """
+        Best live track for a new detection box (same gates as update()),
+        without modifying any state. Used to decide if a face needs embedding.
+        """
+        trs, boxes, last = self._table(frame_idx)
+        if not trs:
+            return None
+        age = np.maximum(0, frame_idx - last)
+        adaptive = self._center_thresh(boxes) * (1.0 + 0.12 * np.minimum(age, 5))
+        b = np.asarray(bbox, dtype=float).reshape(1, 4)
+        v_iou = iou_matrix(boxes, b)[:, 0]
+        v_dist = center_distance_matrix(boxes, b)[:, 0]
+        ok = (age <= self.max_age_frames) & ~(
+            (v_iou < self.iou_threshold * 0.75) & (v_dist > adaptive)
+        )
+        if not ok.any():
+            return None
+        score = np.where(ok, (v_iou * 1.8) - (v_dist / (adaptive + 1e-6)), -np.inf)
+        return trs[int(np.argmax(score))]
+
     def update(self, frame_idx: int, dets: List[Tuple[np.ndarray, str, int, float]]) -> List[Track]:
-        assigned = set()
-        updated_tracks = set()
-
-        for tid, tr in list(self.tracks.items()):
-            age = max(0, frame_idx - tr.last_seen_frame)
-            base_center = self._base_center_thresh(tr.bbox)
-            adaptive_center = base_center * (1.0 + 0.12 * min(age, 5))
-
-            best_j = -1
-            best_iou = 0.0
-            best_dist = 1e9
-            best_score = -1e9
-            for j, (bbox, name, emp_id, sim) in enumerate(dets):
-                if j in assigned:
-                    continue
-                v_iou = iou(tr.bbox, bbox)
-                v_dist = center_distance(tr.bbox, bbox)
-                if v_dist > adaptive_center * 1.3:
-                    continue
-                score = (v_iou * 1.8) - (v_dist / (adaptive_center + 1e-6))
-                if score > best_score:
-                    best_score = score
-                    best_iou = v_iou
-                    best_dist = v_dist
-                    best_j = j
-
-            if best_j != -1 and (best_iou >= self.iou_threshold * 0.75 or best_dist <= adaptive_center):
-                bbox, name, emp_id, sim = dets[best_j]
-                self._update_track(tr, bbox, name, emp_id, sim, frame_idx, alpha=self.smooth_alpha)
-                updated_tracks.add(tid)
-                assigned.add(best_j)
-
-        # Relaxed re-attach for stale tracks before creating new tracks
-        for j, (bbox, name, emp_id, sim) in enumerate(dets):
-            if j in assigned:
-                continue
-            best_tid = None
-            best_score = -1e9
-            for tid, tr in self.tracks.items():
-                if tid in updated_tracks:
-                    continue
-                age = frame_idx - tr.last_seen_frame
-                if age <= 0 or age > self.max_age_frames:
-                    continue
-                base_center = self._base_center_thresh(tr.bbox)
-                relaxed_center = base_center * (1.6 + 0.08 * min(age, 5))
-                v_iou = iou(tr.bbox, bbox)
-                v_dist = center_distance(tr.bbox, bbox)
-                if v_dist > relaxed_center * 1.15 and v_iou < self.iou_threshold * 0.6:
-                    continue
-                score = (v_iou * 1.4) - (v_dist / (relaxed_center + 1e-6))
-                if score > best_score:
-                    best_score = score
-                    best_tid = tid
-
-            if best_tid is not None:
-                tr = self.tracks[best_tid]
-                self._update_track(tr, bbox, name, emp_id, sim, frame_idx, alpha=max(self.smooth_alpha, 0.7))
-                updated_tracks.add(best_tid)
-                assigned.add(j)
-                continue
+        det_boxes = np.array(
+            [np.asarray(d[0], dtype=float).reshape(4) for d in dets], dtype=float
+        ).reshape(-1, 4)
+        assigned = np.zeros(len(dets), dtype=bool)
+        self._frame_idx = int(frame_idx)
+        for t in self.tracks.values():
+            t.det_index = -1
 
-        for j, (bbox, name, emp_id, sim) in enumerate(dets):
-            if j in assigned:
-                continue
-            # Skip spawning a duplicate track if it overlaps heavily or sits near an existing track
-            should_skip = False
-            for tr in self.tracks.values():
-                if iou(tr.bbox, bbox) >= self.suppress_new_iou:
-                    should_skip = True
-                    break
-                prox_gate = max(self.center_dist_threshold * 0.4,
-                                self._base_center_thresh(np.asarray(bbox, dtype=float)) * 0.6)
-                if center_distance(tr.bbox, bbox) <= prox_gate:
-                    should_skip = True
-                    break
-            if should_skip:
-                continue
-            tid = self._next_id
-            self._next_id += 1
-            self.tracks[tid] = Track(
-                track_id=tid,
-                bbox=np.asarray(bbox, dtype=float),
-                name=name,
-                employee_id=emp_id,
-                similarity=sim,
-                last_seen_frame=frame_idx,
-                stable_name_hits=1 if emp_id != -1 else 0
+        trs, boxes, last = self._table(frame_idx)
+        _, base, vel, _ = self._arrays
+        # from here on the table is edited in place (copies), and cached again at the end
+        trs, boxes, last = list(trs), boxes.copy(), last.copy()
+        base, vel = base.copy(), vel.copy()
+        self._arrays = self._pred = None
+        if trs and dets:
+            v_iou = iou_matrix(boxes, det_boxes)
+            v_dist = center_distance_matrix(boxes, det_boxes)
+            base_center = self._center_thresh(boxes)[:, None]
+            age = (frame_idx - last)[:, None]
+
+            # Main association: every track against every detection
+            adaptive = base_center * (1.0 + 0.12 * np.minimum(np.maximum(age, 0), 5))
+            score = (v_iou * 1.8) - (v_dist / (adaptive + 1e-6))
+            valid = (v_dist <= adaptive * 1.3) & (
+                (v_iou >= self.iou_threshold * 0.75) | (v_dist <= adaptive)
             )
+            updated = np.zeros(len(trs), dtype=bool)
+            for r, c in assign(score, valid, self.assign_method):
+                bbox, name, emp_id, sim = dets[c]
+                self._update_track(trs[r], bbox, name, emp_id, sim, frame_idx, alpha=self.smooth_alpha)
+                trs[r].det_index = c
+                updated[r] = True
+                assigned[c] = True
 
-        for tid, tr in list(self.tracks.items()):
-            age = frame_idx - tr.last_seen_frame
-            max_age = self.max_age_frames if tr.employee_id != -1 else max(3, self.max_age_frames // 3)
-            if age > max_age:
-                del self.tracks[tid]
+            # Relaxed re-attach for stale tracks before creating new tracks
+            stale = ~updated & (age[:, 0] > 0) & (age[:, 0] <= self.max_age_frames)
+            if stale.any() and not assigned.all():
+                relaxed = base_center * (1.6 + 0.08 * np.minimum(age, 5))
+                score = (v_iou * 1.4) - (v_dist / (relaxed + 1e-6))
+                valid = (
+                    stale[:, None]
+                    & ~assigned[None, :]
+                    & ~((v_dist > relaxed * 1.15) & (v_iou < self.iou_threshold * 0.6))
+                )
+                for r, c in assign(score, valid, self.assign_method):
+                    bbox, name, emp_id, sim = dets[c]
+                    self._update_track(
+                        trs[r], bbox, name, emp_id, sim, frame_idx, alpha=max(self.smooth_alpha, 0.7)
+                    )
+                    trs[r].det_index = c
+                    updated[r] = True
+                    assigned[c] = True
 
+            # refreshed rows: seen at frame_idx, so the predicted box is the new box
+            for r in np.flatnonzero(updated):
+                base[r] = boxes[r] = trs[r].bbox
+                vel[r] = trs[r].vel
+                last[r] = frame_idx
+
+        new_idx = np.flatnonzero(~assigned)
+        if new_idx.size:
+            # Skip spawning a duplicate track if it overlaps heavily or sits near an existing track
+            cand = det_boxes[new_idx]
+            prox_gate = np.maximum(self.center_dist_threshold * 0.4, self._center_thresh(cand) * 0.6)
+            blocked = (
+                (iou_matrix(boxes, cand) >= self.suppress_new_iou)
+                | (center_distance_matrix(boxes, cand) <= prox_gate[None, :])
+            ).any(axis=0)
+            created: List[np.ndarray] = []
+            for k, j in enumerate(new_idx):
+                if blocked[k]:
+                    continue
+                bbox = det_boxes[j]
+                if created:
+                    # tracks spawned earlier in this update count as existing ones too
+                    prev = np.stack(created)
+                    b = bbox.reshape(1, 4)
+                    if (iou_matrix(prev, b) >= self.suppress_new_iou).any() or (
+                        center_distance_matrix(prev, b) <= prox_gate[k]
+                    ).any():
+                        continue
+                _, name, emp_id, sim = dets[j]
+                tid = self._next_id
+                self._next_id += 1
+                tr = Track(
+                    track_id=tid,
+                    bbox=bbox.copy(),
+                    name=name,
+                    employee_id=emp_id,
+                    similarity=sim,
+                    last_seen_frame=frame_idx,
+                    stable_name_hits=1 if emp_id != -1 else 0,
+                    det_index=int(j),
+                )
+                self.tracks[tid] = tr
+                trs.append(tr)
+                created.append(bbox)
+            if created:
+                new_boxes = np.stack(created)
+                base = np.concatenate([base, new_boxes])
+                boxes = np.concatenate([boxes, new_boxes])
+                vel = np.concatenate([vel, np.zeros_like(new_boxes)])
+                last = np.concatenate([last, np.full(len(created), frame_idx, dtype=np.int64)])
+
+        emp = np.fromiter((t.employee_id for t in trs), dtype=np.int64, count=len(trs))
+        max_age = np.where(emp != -1, self.max_age_frames, max(3, self.max_age_frames // 3))
+        keep = (frame_idx - last) <= max_age
 
         # Merge overlapping/nearby tracks so a single face keeps one box
-        self._merge_tracks()
-        self._dedup_by_employee()
-        self._dedup_unknown_overlap()
+        if int(keep.sum()) > 1:
+            ordered, near = self._ordered_near(trs, boxes)
+            alive = keep[ordered]
+            emp_o = emp[ordered]
+            self._merge_tracks(emp_o, near, alive)
+            self._dedup_by_employee(emp_o, near, alive)
+            self._dedup_unknown_overlap(emp_o, near, alive)
+            keep[ordered] = alive
+
+        for i in np.flatnonzero(~keep):
+            del self.tracks[trs[i].track_id]
+        if not keep.all():
+            trs = [t for t, k in zip(trs, keep) if k]
+            base, vel, last, boxes = base[keep], vel[keep], last[keep], boxes[keep]
+        self._arrays = (trs, base, vel, last)
+        self._pred = (frame_idx, boxes)
 
         return list(self.tracks.values())
 
@@ -188,77 +420,65 @@ class SimpleTracker:
         else:
             tr.stable_name_hits = 1 if emp_id != -1 else 0
 
+        z = np.asarray(bbox, dtype=float)
+        dt = max(1, frame_idx - tr.last_seen_frame)
+        pred = tr.bbox + tr.vel * min(dt, self.max_predict_frames) if self.vel_beta > 0 else tr.bbox
+        resid = z - pred
         if alpha > 0:
-            tr.bbox = (alpha * np.asarray(bbox, dtype=float) +
-                       (1.0 - alpha) * tr.bbox)
+            tr.bbox = pred + alpha * resid
         else:
-            tr.bbox = np.asarray(bbox, dtype=float)
+            tr.bbox = z
+        if self.vel_beta > 0:
+            tr.vel = tr.vel + (self.vel_beta / dt) * resid
         tr.name = name
         tr.employee_id = emp_id
         tr.similarity = sim
         tr.last_seen_frame = frame_idx
 
-    def _merge_tracks(self) -> None:
-        if len(self.tracks) <= 1:
-            return
-        ordered = sorted(
-            self.tracks.values(),
-            key=lambda t: (t.stable_name_hits, t.similarity, t.last_seen_frame),
-            reverse=True,
+    def _ordered_near(self, trs: List[Track], boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row order by (stable hits, similarity, recency) desc and the pairwise
+        "same face" matrix in that order (IoU >= merge_iou or centers within
+        the merge distance). Removing tracks keeps the order of the others,
+        so the merge/dedup passes share one matrix and just skip dead rows.
+        """
+        ordered = np.array(
+            sorted(
+                range(len(trs)),
+                key=lambda i: (trs[i].stable_name_hits, trs[i].similarity, trs[i].last_seen_frame),
+                reverse=True,
+            ),
+            dtype=np.int64,
         )
-        removed: set[int] = set()
-        for i, t in enumerate(ordered):
-            if t.track_id in removed:
+        b = boxes[ordered]
+        diag = bbox_diags(b)
+        merge_dist = np.maximum(self.merge_center, 0.5 * np.maximum(diag[:, None], diag[None, :]))
+        near = (iou_matrix(b, b) >= self.merge_iou) | (center_distance_matrix(b, b) <= merge_dist)
+        return ordered, near
+
+    def _merge_tracks(self, emp: np.ndarray, near: np.ndarray, alive: np.ndarray) -> None:
+        known = emp != -1
+        for i in range(len(emp)):
+            if not alive[i]:
                 continue
-            for o in ordered[i + 1:]:
-                if o.track_id in removed:
-                    continue
-                if t.employee_id != -1 and o.employee_id != -1 and t.employee_id != o.employee_id:
-                    continue
-                merge_dist = self._merge_distance(t.bbox, o.bbox)
-                if iou(t.bbox, o.bbox) >= self.merge_iou or center_distance(t.bbox, o.bbox) <= merge_dist:
-                    removed.add(o.track_id)
-        for tid in removed:
-            self.tracks.pop(tid, None)
+            # never merge two different known employees
+            compatible = ~(known[i] & known[i + 1:] & (emp[i + 1:] != emp[i]))
+            alive[i + 1:] &= ~(near[i, i + 1:] & compatible)
 
-    def _dedup_by_employee(self) -> None:
+    def _dedup_by_employee(self, emp: np.ndarray, near: np.ndarray, alive: np.ndarray) -> None:
         # Keep a single track per known employee id when they overlap/are near
-        ordered = sorted(
-            self.tracks.values(),
-            key=lambda t: (t.stable_name_hits, t.similarity, t.last_seen_frame),
-            reverse=True,
-        )
-        kept_emp: Dict[int, Track] = {}
-        removed: set[int] = set()
-        for tr in ordered:
-            if tr.employee_id == -1 or tr.track_id in removed:
-                continue
-            if tr.employee_id not in kept_emp:
-                kept_emp[tr.employee_id] = tr
+        anchor: Dict[int, int] = {}
+        for i in range(len(emp)):
+            if emp[i] == -1 or not alive[i]:
                 continue
-            anchor = kept_emp[tr.employee_id]
-            merge_dist = self._merge_distance(anchor.bbox, tr.bbox)
-            if iou(anchor.bbox, tr.bbox) >= self.merge_iou or center_distance(anchor.bbox, tr.bbox) <= merge_dist:
-                removed.add(tr.track_id)
-        for tid in removed:
-            self.tracks.pop(tid, None)
-
-    def _dedup_unknown_overlap(self) -> None:
+            a = anchor.setdefault(int(emp[i]), i)
+            if a != i and near[a, i]:
+                alive[i] = False
+
+    def _dedup_unknown_overlap(self, emp: np.ndarray, near: np.ndarray, alive: np.ndarray) -> None:
         # Unknown faces: suppress multiple overlapping boxes
-        ordered = sorted(
-            self.tracks.values(),
-            key=lambda t: (t.stable_name_hits, t.similarity, t.last_seen_frame),
-            reverse=True,
-        )
-        removed: set[int] = set()
-        for i, t in enumerate(ordered):
-            if t.employee_id != -1 or t.track_id in removed:
+        unknown = emp == -1
+        for i in range(len(emp)):
+            if not unknown[i] or not alive[i]:
                 continue
-            for o in ordered[i + 1:]:
-                if o.employee_id != -1 or o.track_id in removed:
-                    continue
-                merge_dist = self._merge_distance(t.bbox, o.bbox)
-                if iou(t.bbox, o.bbox) >= self.merge_iou or center_distance(t.bbox, o.bbox) <= merge_dist:
-                    removed.add(o.track_id)
-        for tid in removed:
-            self.tracks.pop(tid, None)
+            alive[i + 1:] &= ~(near[i, i + 1:] & unknown[i + 1:])
@@ -54,6 +54,96 @@ export async function createAttendance(req: Request, res: Response) {
   }
 }
 
+const BULK_MAX_EVENTS = 1000;
+
+/**
+ * POST /attendance/bulk { events: [{ idempotencyKey, employeeId, timestamp, cameraId?, confidence? }] }
+ * Batched writes from the AI attendance journal. Events already stored under
+ * the same idempotencyKey are skipped, so a batch can be replayed safely.
+ * -> { inserted, duplicates, rejected: [{ idempotencyKey, error }] }
+ */
+export async function createAttendanceBulk(req: Request, res: Response) {
+  try {
+    const companyId = String((req as any).companyId ?? "");
+    const events = Array.isArray(req.body?.events) ? req.body.events : null;
+    if (!events)
+      return res.status(400).json({ error: "events array required" });
+    if (events.length > BULK_MAX_EVENTS)
+      return res
+        .status(413)
+        .json({ error: `at most ${BULK_MAX_EVENTS} events per request` });
+
+    // one lookup per distinct employee / camera in the batch
+    const employees = new Map<string, Promise<any>>();
+    const cameras = new Map<string, Promise<any>>();
+    const rejected: { idempotencyKey: string | null; error: string }[] = [];
+    const data: any[] = [];
+
+    for (const ev of events) {
+      const key = ev?.idempotencyKey ? String(ev.idempotencyKey) : null;
+      const identifier = normalizeEmployeeIdentifier(ev?.employeeId);
+      const ts = ev?.timestamp ? new Date(ev.timestamp) : null;
+      if (!key || !identifier || !ts || Number.isNaN(ts.getTime())) {
+        rejected.push({
+          idempotencyKey: key,
+          error: "idempotencyKey, employeeId and timestamp required",
+        });
+        continue;
+      }
+
+      try {
+        if (!employees.has(identifier))
+          employees.set(
+            identifier,
+            getOrCreateEmployeeByAnyId(identifier, companyId, {
+              nameIfCreate: "Unknown",
+            })
+          );
+        const employee = await employees.get(identifier);
+
+        let cam: any = null;
+        if (ev.cameraId) {
+          const camKey = String(ev.cameraId);
+          if (!cameras.has(camKey))
+            cameras.set(camKey, findCameraByAnyId(camKey, companyId));
+          cam = await cameras.get(camKey);
+          if (!cam) {
+            rejected.push({ idempotencyKey: key, error: "Camera not found" });
+            continue;
+          }
+        }
+
+        data.push({
+          idempotencyKey: key,
+          employeeId: employee.id,
+          timestamp: ts,
+          cameraId: cam ? cam.id : null,
+          confidence: ev.confidence ?? null,
+          companyId,
+        });
+      } catch (e: any) {
+        rejected.push({ idempotencyKey: key, error: e?.message ?? String(e) });
+      }
+    }
+
+    const result = data.length
+      ? await prisma.attendance.createMany({ data, skipDuplicates: true })
+      : { count: 0 };
+
+    res.json({
+      ok: true,
+      inserted: result.count,
+      duplicates: data.length - result.count,
+      rejected,
+    });
+  } catch (e: any) {
+    res.status(500).json({
+      error: "Failed to create attendance",
+      detail: e?.message ?? String(e),
+    });
+  }
+}
+
 export async function listAttendance(req: Request, res: Response) {
   try {
     const companyId = String((req as any).companyId ?? "");
@@ -6,14 +6,35 @@ import {
   normalizeEmployeeIdentifier,
 } from "../utils/employee";
 
+// Incremental sync: ?updatedSince=<ISO> returns only templates changed since then.
+// Returns undefined for an invalid value.
+function parseUpdatedSince(req: Request): Date | null | undefined {
+  const raw = String(req.query.updatedSince ?? "").trim();
+  if (!raw) return null;
+  const d = new Date(raw);
+  return Number.isNaN(d.getTime()) ? undefined : d;
+}
+
+function findTemplates(companyId: string, updatedSince: Date | null) {
+  return prisma.faceTemplate.findMany({
+    where: {
+      companyId,
+      ...(updatedSince ? { updatedAt: { gte: updatedSince } } : {}),
+    },
+    include: { employee: true },
+    orderBy: [{ employeeId: "asc" }, { angle: "asc" }],
+  });
+}
+
 export async function getTemplates(req: Request, res: Response) {
   try {
     const companyId = String((req as any).companyId ?? "");
-    const templates = await prisma.faceTemplate.findMany({
-      where: { companyId },
-      include: { employee: true },
-      orderBy: [{ employeeId: "asc" }, { angle: "asc" }],
-    });
+    const updatedSince = parseUpdatedSince(req);
+    if (updatedSince === undefined) {
+      return res.status(400).json({ error: "Invalid updatedSince" });
+    }
+
+    const templates = await findTemplates(companyId, updatedSince);
 
     res.json(
       templates.map((t) => ({
@@ -34,6 +55,102 @@ export async function getTemplates(req: Request, res: Response) {
   }
 }
 
+/*
+ * Binary template transport (GET /gallery/templates.bin)
+ *
+ * All integers little-endian:
+ *   0  magic   "FTPL"
+ *   4  u16     format version (1)
+ *   6  u8      dtype (0 = float32, 1 = float16)
+ *   7  u8      reserved
+ *   8  u32     dim
+ *   12 u32     count
+ *   16 u32     header length (bytes of UTF-8 JSON)
+ *   20 JSON    { ids, employeeIds, employeeNames, angles, modelNames, updatedAt } (columns)
+ *      pad     zero bytes up to a 4-byte boundary
+ *      matrix  count x dim values, row-major
+ */
+const TEMPLATE_BIN_MAGIC = "FTPL";
+const TEMPLATE_BIN_VERSION = 1;
+const TEMPLATE_BIN_FIXED = 20;
+
+const f32Scratch = new Float32Array(1);
+const u32Scratch = new Uint32Array(f32Scratch.buffer);
+
+// float32 -> IEEE 754 half (round to nearest)
+function toHalf(v: number): number {
+  f32Scratch[0] = v;
+  const x = u32Scratch[0];
+  const sign = (x >>> 16) & 0x8000;
+  const exp = (x >>> 23) & 0xff;
+  let mant = x & 0x7fffff;
+
+  if (exp === 0xff) return sign | 0x7c00 | (mant ? 0x200 : 0); // inf / nan
+  const e = exp - 127 + 15;
+  if (e >= 0x1f) return sign | 0x7c00; // overflow -> inf
+  if (e <= 0) {
+    if (e < -10) return sign; // underflow -> 0
+    mant = (mant | 0x800000) >> (1 - e);
+    return sign | ((mant + 0x1000) >> 13);
+  }
+  return (sign | (e << 10) | (mant >> 13)) + ((mant >> 12) & 1);
+}
+
+export async function getTemplatesBin(req: Request, res: Response) {
+  try {
+    const companyId = String((req as any).companyId ?? "");
+    const updatedSince = parseUpdatedSince(req);
+    if (updatedSince === undefined) {
+      return res.status(400).json({ error: "Invalid updatedSince" });
+    }
+    const half = String(req.query.dtype ?? "f32").toLowerCase() === "f16";
+
+    const all = await findTemplates(companyId, updatedSince);
+    const dim = all.length ? all[0].embedding.length : 0;
+    const templates = all.filter((t) => t.embedding.length === dim);
+
+    const header = Buffer.from(
+      JSON.stringify({
+        ids: templates.map((t) => t.id),
+        employeeIds: templates.map((t) => employeePublicId(t.employee)),
+        employeeNames: templates.map((t) => t.employee.name),
+        angles: templates.map((t) => t.angle),
+        modelNames: templates.map((t) => t.modelName),
+        updatedAt: templates.map((t) => t.updatedAt.toISOString()),
+      }),
+      "utf8"
+    );
+    const pad = (4 - ((TEMPLATE_BIN_FIXED + header.length) % 4)) % 4;
+    const itemSize = half ? 2 : 4;
+
+    const fixed = Buffer.alloc(TEMPLATE_BIN_FIXED);
+    fixed.write(TEMPLATE_BIN_MAGIC, 0, "ascii");
+    fixed.writeUInt16LE(TEMPLATE_BIN_VERSION, 4);
+    fixed.writeUInt8(half ? 1 : 0, 6);
+    fixed.writeUInt32LE(dim, 8);
+    fixed.writeUInt32LE(templates.length, 12);
+    fixed.writeUInt32LE(header.length, 16);
+
+    const matrix = Buffer.alloc(templates.length * dim * itemSize);
+    let off = 0;
+    for (const t of templates) {
+      for (const v of t.embedding) {
+        if (half) matrix.writeUInt16LE(toHalf(v), off);
+        else matrix.writeFloatLE(v, off);
+        off += itemSize;
+      }
+    }
+
+    res.setHeader("Content-Type", "application/octet-stream");
+    res.send(Buffer.concat([fixed, header, Buffer.alloc(pad), matrix]));
+  } catch (e: any) {
+    res.status(500).json({
+      error: "Failed to load templates",
+      detail: e?.message ?? String(e),
+    });
+  }
+}
+
 export async function upsertTemplate(req: Request, res: Response) {
   try {
     const companyId = String((req as any).companyId ?? "");
@@ -1,6 +1,7 @@
 import { Router } from "express";
 import {
   createAttendance,
+  createAttendanceBulk,
   dataSync,
   listAttendance,
 } from "../controllers/attendance.controller";
@@ -8,6 +9,7 @@ import {
 const router = Router();
 
 router.post("/", createAttendance);
+router.post("/bulk", createAttendanceBulk);
 router.get("/", listAttendance);
 router.get("/data-sync", dataSync);
 
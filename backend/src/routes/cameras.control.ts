@@ -64,6 +64,10 @@ r.post("/start/:id", async (req, res) => {
           camera_id: cam.id,
           rtsp_url: cam.rtspUrl,
           mode: isRelay ? "relay" : "direct",
+          ...(!isRelay && cam.rtspMainUrl ? { main_url: cam.rtspMainUrl } : {}),
+          ...(Array.isArray(cam.roi) && cam.roi.length
+            ? { roi: JSON.stringify(cam.roi) }
+            : {}),
         },
       },
     );
@@ -1,14 +1,22 @@
 import { Router } from "express";
+import axios from "axios";
+import { Prisma } from "@prisma/client";
 import { prisma } from "../prisma";
 import {
   cameraPublicId,
   findCameraByAnyId,
   normalizeCameraIdentifier,
+  normalizeRoi,
 } from "../utils/camera";
 import { encryptForAgent } from "../utils/relayCrypto";
 
 const r = Router();
 
+const AI_BASE = (process.env.AI_BASE_URL || "http://127.0.0.1:8000").replace(
+  /\/$/,
+  "",
+);
+
 function isTruthy(v: any) {
   return v !== undefined && v !== null;
 }
@@ -37,6 +45,7 @@ r.post("/", async (req, res) => {
   const companyId = String((req as any).companyId ?? "");
   const name = String(req.body?.name ?? "").trim();
   const rtspUrlInput = String(req.body?.rtspUrl ?? "").trim();
+  const rtspMainUrlInput = String(req.body?.rtspMainUrl ?? "").trim();
 
   const relayAgentId = isTruthy(req.body?.relayAgentId)
     ? String(req.body.relayAgentId).trim()
@@ -53,6 +62,11 @@ r.post("/", async (req, res) => {
     return res.status(400).json({ error: "name and rtspUrl are required" });
   }
 
+  const roi = isTruthy(req.body?.roi) ? normalizeRoi(req.body.roi) : null;
+  if (roi === undefined) {
+    return res.status(400).json({ error: "Invalid roi" });
+  }
+
   // optional relay settings
   const sendFps = isTruthy(req.body?.sendFps)
     ? Number(req.body.sendFps)
@@ -89,6 +103,7 @@ r.post("/", async (req, res) => {
           relayAgentId,
           isActive: false,
           companyId,
+          ...(roi ? { roi } : {}),
           ...(sendFps !== undefined ? { sendFps } : {}),
           ...(sendWidth !== undefined ? { sendWidth } : {}),
           ...(sendHeight !== undefined ? { sendHeight } : {}),
@@ -111,8 +126,10 @@ r.post("/", async (req, res) => {
       ...(camId ? { camId } : {}),
       name,
       rtspUrl: rtspUrlInput,
+      rtspMainUrl: rtspMainUrlInput || null,
       isActive: false,
       companyId,
+      ...(roi ? { roi } : {}),
     },
   });
 
@@ -124,7 +141,7 @@ r.put("/:id", async (req, res) => {
   const companyId = String((req as any).companyId ?? "");
   const { id: anyId } = req.params;
   const body = req.body && typeof req.body === "object" ? req.body : {};
-  const { name, rtspUrl, isActive } = body as any;
+  const { name, rtspUrl, rtspMainUrl, isActive } = body as any;
 
   const existing = await findCameraByAnyId(String(anyId), companyId);
   if (!existing) return res.status(404).json({ error: "Camera not found" });
@@ -157,6 +174,11 @@ r.put("/:id", async (req, res) => {
     ? Number((body as any).jpegQuality)
     : undefined;
 
+  const roi = "roi" in body ? normalizeRoi((body as any).roi) : undefined;
+  if ("roi" in body && roi === undefined) {
+    return res.status(400).json({ error: "Invalid roi" });
+  }
+
   const data: any = {
     camId,
     name: name !== undefined ? String(name) : undefined,
@@ -165,6 +187,7 @@ r.put("/:id", async (req, res) => {
     ...(sendWidth !== undefined ? { sendWidth } : {}),
     ...(sendHeight !== undefined ? { sendHeight } : {}),
     ...(jpegQuality !== undefined ? { jpegQuality } : {}),
+    ...(roi !== undefined ? { roi: roi ?? Prisma.DbNull } : {}),
   };
 
   // If switching or setting relay agent
@@ -219,6 +242,7 @@ r.put("/:id", async (req, res) => {
 
       data.relayAgentId = rid;
       data.rtspUrl = relayPlaceholder(existing.id); // placeholder
+      data.rtspMainUrl = null; // relay cameras never store plaintext RTSP
     } else {
       // removing relay -> direct mode
       if (rtspUrl === undefined) {
@@ -232,12 +256,18 @@ r.put("/:id", async (req, res) => {
       if (rtspUrl !== undefined) {
         data.rtspUrl = String(rtspUrl).trim();
       }
+      if (rtspMainUrl !== undefined) {
+        data.rtspMainUrl = String(rtspMainUrl ?? "").trim() || null;
+      }
     }
   } else {
     // no relay change; allow direct rtsp update ONLY if currently direct
     if (!existing.relayAgentId && rtspUrl !== undefined) {
       data.rtspUrl = String(rtspUrl).trim();
     }
+    if (!existing.relayAgentId && rtspMainUrl !== undefined) {
+      data.rtspMainUrl = String(rtspMainUrl ?? "").trim() || null;
+    }
     // If currently relay and they send rtspUrl without changing relayAgentId, ignore storing plaintext.
     if (existing.relayAgentId && rtspUrl !== undefined) {
       // optional: allow re-encrypt if they want to rotate RTSP without changing agent
@@ -258,6 +288,14 @@ r.put("/:id", async (req, res) => {
     data,
   });
 
+  // Running camera: apply the new detection regions right away (best effort;
+  // the next /camera/start sends them anyway)
+  if (roi !== undefined && cam.isActive) {
+    axios
+      .post(`${AI_BASE}/camera/roi`, { roi }, { params: { camera_id: cam.id } })
+      .catch((e) => console.error("AI ROI UPDATE FAILED:", e?.message ?? e));
+  }
+
   res.json(cam);
 });
 
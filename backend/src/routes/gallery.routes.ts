@@ -1,12 +1,14 @@
 import { Router } from "express";
 import {
   getTemplates,
+  getTemplatesBin,
   upsertTemplate,
 } from "../controllers/gallery.controller";
 
 const router = Router();
 
 router.get("/templates", getTemplates);
+router.get("/templates.bin", getTemplatesBin);
 router.post("/templates", upsertTemplate);
 
 export default router;
@@ -22,3 +22,48 @@ export function cameraPublicId(c: { id: string; camId?: string | null }) {
   return v || c.id;
 }
 
+
+type RoiRegion =
+  | { x0: number; y0: number; x1: number; y1: number }
+  | { points: [number, number][] };
+
+const unit = (v: unknown) =>
+  typeof v === "number" && Number.isFinite(v) && v >= 0 && v <= 1;
+
+/**
+ * Detection regions of a camera, normalized [0..1] frame coordinates:
+ * rects {x0,y0,x1,y1} or polygons {points:[[x,y],...]} (>= 3 points).
+ * Returns null for "no ROI" (null / empty list), undefined when invalid.
+ */
+export function normalizeRoi(value: unknown): RoiRegion[] | null | undefined {
+  if (value === null || value === "") return null;
+  const list = typeof value === "string" ? safeJson(value) : value;
+  if (!Array.isArray(list)) return undefined;
+  if (list.length === 0) return null;
+
+  const out: RoiRegion[] = [];
+  for (const r of list as any[]) {
+    if (r && ["x0", "y0", "x1", "y1"].every((k) => unit(r[k]))) {
+      if (r.x0 === r.x1 || r.y0 === r.y1) return undefined;
+      out.push({ x0: r.x0, y0: r.y0, x1: r.x1, y1: r.y1 });
+    } else if (
+      r &&
+      Array.isArray(r.points) &&
+      r.points.length >= 3 &&
+      r.points.every((p: any) => Array.isArray(p) && unit(p[0]) && unit(p[1]))
+    ) {
+      out.push({ points: r.points.map((p: any) => [p[0], p[1]]) });
+    } else {
+      return undefined;
+    }
+  }
+  return out;
+}
+
+function safeJson(s: string): unknown {
+  try {
+    return JSON.parse(s);
+  } catch {
+    return undefined;
+  }
+}